@@ -60,11 +60,15 @@ MIDDLEWARE = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.CachedJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'events.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
 
 from datetime import timedelta
@@ -74,6 +78,32 @@ SIMPLE_JWT = {
     'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': True,
 }
+# Seconds an authenticated user is served from the in-process cache; 0 looks it up every request
+AUTH_USER_CACHE_TTL = 30
+# Most users kept in that cache
+AUTH_USER_CACHE_MAX_ENTRIES = 10000
+# Recurring events are materialized into the occurrence index this far ahead
+EVENT_OCCURRENCE_HORIZON_DAYS = 365
+# Count-limited series still running after this many days are treated as open-ended
+EVENT_SERIES_SCAN_DAYS = 365 * 100
+# Expanded occurrence windows cache; use events.cache.DjangoCacheBackend to share it through CACHES
+EVENT_OCCURRENCE_CACHE = {
+    'BACKEND': 'events.cache.LRUBackend',
+    'OPTIONS': {'max_entries': 10000},
+}
+# Worker processes used to expand large batches (free/busy); 0 expands in the request thread
+EVENT_EXPANSION_WORKERS = 0
+# Fewer uncached series than this are expanded serially even when workers are configured
+EVENT_PARALLEL_MIN_SERIES = 500
+# Threads expanding and serializing occurrences for the async (ASGI) views
+EVENT_ASYNC_EXPANSION_THREADS = 4
+# Largest number of events accepted by one call to the bulk endpoint
+EVENT_BULK_MAX_ITEMS = 5000
+# Most changes returned by one call to the delta sync endpoint
+EVENT_SYNC_PAGE_SIZE = 1000
+# Tombstones of deletions are kept this long; older change tokens must resync
+EVENT_TOMBSTONE_RETENTION_DAYS = 90
+
 SWAGGER_SETTINGS = {
     'SECURITY_DEFINITIONS': {
         'Bearer': {
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Event, RecurrenceRule
+from .models import Event, RecurrenceRule, Occurrence, OccurrenceException
 # Register your models here.
 
-admin.site.register([Event, RecurrenceRule])
\ No newline at end of file
+admin.site.register([Event, RecurrenceRule, Occurrence, OccurrenceException])
\ No newline at end of file
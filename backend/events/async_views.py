@@ -0,0 +1,213 @@
+"""
+Async (ASGI) read path for events.
+
+Native async versions of the event list, the occurrence feed and
+``upcoming``. Queries go through Django's async ORM, while rrule expansion and
+serialization, which are CPU-bound, run on a bounded thread pool, so one
+ASGI worker keeps serving other requests while a calendar is being expanded.
+Responses match the ``EventViewSet`` actions they mirror.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import islice
+
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.translation import gettext_lazy as _
+from django.views import View
+from rest_framework import status
+from rest_framework.exceptions import APIException, AuthenticationFailed, NotAuthenticated
+from rest_framework.request import Request
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from users.authentication import CachedJWTAuthentication, user_cache
+
+from .pagination import KeysetPagination, OccurrenceCursorPagination
+from .renderers import FastJSONRenderer
+from .serializers import EventRowSerializer, EventSerializer
+from .services import RecurrenceService
+from .views import (
+    EventViewSet, acollection_version, collection_validators, occurrence_rows, parse_date_window,
+    parse_upcoming_window, set_validators, stream_json_array
+)
+
+_executor = None
+
+
+def expansion_executor():
+    """The process-wide pool CPU-bound work of async views runs on."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.EVENT_ASYNC_EXPANSION_THREADS,
+            thread_name_prefix='expansion'
+        )
+    return _executor
+
+
+async def run_expansion(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(expansion_executor(), func, *args)
+
+
+async def iterate_in_executor(iterator):
+    """Pull each item of a CPU-bound iterator on the expansion pool."""
+    done = object()
+    while True:
+        item = await run_expansion(next, iterator, done)
+        if item is done:
+            return
+        yield item
+
+
+class AsyncJWTAuthentication(CachedJWTAuthentication):
+    """``CachedJWTAuthentication`` looking uncached users up through the async ORM."""
+
+    async def aauthenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        user_id = self.get_user_id(validated_token)
+        user = user_cache.get(user_id)
+        if user is None:
+            user = await self.user_model.objects.filter(**{jwt_settings.USER_ID_FIELD: user_id}).afirst()
+            if user is None:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found")
+            user_cache.set(user_id, user)
+        return self.check_user(user, validated_token)
+
+
+def json_response(data, status=status.HTTP_200_OK):
+    return HttpResponse(FastJSONRenderer().render(data), status=status, content_type='application/json')
+
+
+class AsyncEventView(View):
+    """
+    Base of the async event views: authenticates the request with a JWT and
+    exposes it as a DRF ``Request`` with an ``EventViewSet`` to build the
+    same querysets as the sync endpoints.
+    """
+    authenticator = AsyncJWTAuthentication()
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            authenticated = await self.authenticator.aauthenticate(request)
+            if authenticated is None:
+                raise NotAuthenticated()
+            self.request = Request(request)
+            self.request.user = authenticated[0]
+            self.viewset = EventViewSet(request=self.request, format_kwarg=None, action=None)
+            return await super().dispatch(self.request, *args, **kwargs)
+        except APIException as exc:
+            response = json_response(
+                exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail},
+                status=exc.status_code
+            )
+            if exc.status_code == status.HTTP_401_UNAUTHORIZED:
+                response['WWW-Authenticate'] = self.authenticator.authenticate_header(request)
+            return response
+
+    async def check_not_modified(self, *parts, as_of=None):
+        """Async counterpart of ``EventViewSet.check_not_modified``."""
+        request = self.request
+        validators = collection_validators(
+            request.user,
+            await acollection_version(request.user),
+            request.get_full_path(),
+            'json',
+            *parts,
+            as_of=as_of
+        )
+        return validators, get_conditional_response(request._request, **validators)
+
+    async def window_rows(self, start_date, end_date):
+        """Async counterpart of ``EventViewSet.window_occurrences``."""
+        past_horizon_ids = await RecurrenceService.aprepare_window(self.request.user, start_date, end_date)
+        queryset = self.viewset.filter_window(
+            self.viewset.get_base_queryset(), start_date, end_date, past_horizon_ids
+        )
+        return occurrence_rows([event async for event in queryset], start_date, end_date)
+
+    def serialize(self, events):
+        return EventSerializer(events, many=True, context=self.viewset.get_serializer_context()).data
+
+
+class AsyncEventListView(AsyncEventView):
+    async def get(self, request):
+        validators, not_modified = await self.check_not_modified()
+        if not_modified is not None:
+            return not_modified
+
+        # Sparse fieldsets apply as they do to the list action
+        self.viewset.action = 'list'
+        fieldset = self.viewset.get_fieldset()
+        start_date, end_date = parse_date_window(request.query_params)
+        past_horizon_ids = None
+        if start_date and end_date:
+            past_horizon_ids = await RecurrenceService.aprepare_window(request.user, start_date, end_date)
+        queryset = self.viewset.get_queryset(past_horizon_ids)
+        serialize = self.serialize
+        if self.viewset.get_serializer_context()['occurrence_window'] is None:
+            queryset = EventRowSerializer.values(queryset, fieldset)
+            serialize = partial(EventRowSerializer.to_representation, fieldset=fieldset)
+        paginator = KeysetPagination()
+        page = await paginator.apaginate_queryset(queryset, request)
+        if page is not None:
+            data = await run_expansion(serialize, page)
+            return set_validators(json_response(paginator.get_paginated_response(data).data), validators)
+
+        events = [event async for event in queryset]
+        return set_validators(json_response(await run_expansion(serialize, events)), validators)
+
+
+class AsyncOccurrenceFeedView(AsyncEventView):
+    async def get(self, request):
+        start_date, end_date = parse_date_window(request.query_params)
+        if not start_date or not end_date:
+            return json_response(
+                {'error': 'start_date and end_date are required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        validators, not_modified = await self.check_not_modified()
+        if not_modified is not None:
+            return not_modified
+
+        paginator = OccurrenceCursorPagination()
+        paginated = paginator.is_requested(request)
+        if paginated:
+            start_date = paginator.get_window_start(request, start_date)
+
+        occurrences = await self.window_rows(start_date, end_date)
+        if paginated:
+            page = await run_expansion(paginator.paginate_occurrences, occurrences, request)
+            return set_validators(json_response(paginator.get_paginated_response(page).data), validators)
+        return set_validators(
+            StreamingHttpResponse(
+                iterate_in_executor(stream_json_array(occurrences)),
+                content_type='application/json'
+            ),
+            validators
+        )
+
+
+class AsyncUpcomingView(AsyncEventView):
+    async def get(self, request):
+        now, end_date, limit = parse_upcoming_window(request.query_params)
+        validators, not_modified = await self.check_not_modified(now.isoformat(), as_of=now)
+        if not_modified is not None:
+            return not_modified
+
+        occurrences = await self.window_rows(now, end_date)
+        # The merge is lazy, so only the first ``limit`` occurrences are ever expanded
+        return set_validators(json_response(await run_expansion(lambda: list(islice(occurrences, limit)))), validators)
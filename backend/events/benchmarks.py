@@ -0,0 +1,561 @@
+"""
+Benchmark scenarios for the events app, run through ``manage.py bench``.
+
+Each scenario takes the parsed command options and returns JSON-serializable
+results so runs can be diffed between commits. Scenarios that need data run
+against a throwaway test database, never the configured one.
+"""
+import asyncio
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, reset_queries
+from django.test import AsyncClient, Client, override_settings
+from django.test.utils import (
+    CaptureQueriesContext, setup_databases, setup_test_environment,
+    teardown_databases, teardown_test_environment
+)
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .cache import occurrence_cache
+from .models import Event, RecurrenceRule, FrequencyType, MonthWeek
+from .renderers import FastJSONRenderer
+from .rules import compile_rule, compiled_rules
+from .serializers import EventRowSerializer, EventSerializer
+from .services import RecurrenceService
+from .timezones import get_zone, transitions, wall_table
+
+# Rule shapes cycled through when seeding recurring events
+RECURRING_TEMPLATES = [
+    {'frequency': FrequencyType.DAILY},
+    {'frequency': FrequencyType.DAILY, 'interval': 3, 'count': 2000},
+    {'frequency': FrequencyType.WEEKLY, 'weekdays': '0,2,4'},
+    {'frequency': FrequencyType.WEEKLY, 'interval': 2},
+    {'frequency': FrequencyType.WEEKLY, 'weekdays': '1,3', 'count': 1500},
+    {'frequency': FrequencyType.MONTHLY, 'month_day': 15},
+    {'frequency': FrequencyType.MONTHLY, 'week_of_month': 2, 'weekday_of_month': 3},
+    {'frequency': FrequencyType.MONTHLY, 'week_of_month': MonthWeek.LAST, 'weekday_of_month': 4},
+    {'frequency': FrequencyType.YEARLY, 'month': 6},
+]
+
+
+def timed(func, repeat):
+    """Best wall-clock time of ``repeat`` runs of ``func``, in milliseconds."""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return round(best * 1000, 4)
+
+
+def build_series(start_time, frequency, tzid='UTC', **rule_fields):
+    """An unsaved recurring event with its rule attached, for pure expansion runs."""
+    event = Event(
+        title=f"{frequency} series",
+        start_time=start_time,
+        end_time=start_time + timedelta(hours=1),
+        is_recurring=True,
+        tzid=tzid
+    )
+    RecurrenceRule(event=event, frequency=frequency, **rule_fields)
+    return event
+
+
+@contextmanager
+def benchmark_database():
+    """Run the body against a fresh test database that is destroyed afterwards."""
+    setup_test_environment()
+    old_config = setup_databases(verbosity=0, interactive=False)
+    try:
+        yield
+    finally:
+        teardown_databases(old_config, verbosity=0)
+        teardown_test_environment()
+
+
+def seed_user(index, rnd, one_off, recurring, max_age_years):
+    """Create a user with a mix of one-off and recurring events, written like the API would."""
+    user = get_user_model().objects.create_user(
+        email=f'bench{index}@example.com', username=f'bench{index}', password='bench'
+    )
+    now = timezone.now().replace(second=0, microsecond=0)
+    for _ in range(one_off):
+        start_time = now + timedelta(days=rnd.randint(-365, 365), hours=rnd.randint(0, 23))
+        event = Event.objects.create(
+            user=user, title='One-off', start_time=start_time,
+            end_time=start_time + timedelta(hours=1), is_recurring=False
+        )
+        RecurrenceService.refresh_series_end(event)
+    for number in range(recurring):
+        start_time = now - timedelta(days=rnd.randint(0, 365 * max_age_years), hours=rnd.randint(0, 23))
+        event = Event.objects.create(
+            user=user, title='Series', start_time=start_time,
+            end_time=start_time + timedelta(minutes=45), is_recurring=True
+        )
+        RecurrenceRule.objects.create(event=event, **RECURRING_TEMPLATES[number % len(RECURRING_TEMPLATES)])
+        RecurrenceService.refresh_series_end(event)
+        RecurrenceService.refresh_occurrence_index(event)
+    return user
+
+
+def measure_request(client, url, repeat):
+    """Best latency of ``url`` and the number of queries one request issues."""
+    def fetch():
+        response = client.get(url)
+        assert response.status_code == 200, (url, response.status_code)
+        b''.join(getattr(response, 'streaming_content', []))
+
+    # Seeding can fill the bounded query log, which would hide new entries
+    reset_queries()
+    with CaptureQueriesContext(connection) as context:
+        fetch()
+    return {'url': url, 'ms': timed(fetch, repeat), 'queries': len(context.captured_queries)}
+
+
+def bench_api(options):
+    """Expansion throughput and endpoint latency/query counts over seeded users."""
+    rnd = random.Random(options['seed'])
+    with benchmark_database():
+        started = time.perf_counter()
+        users = [
+            seed_user(index, rnd, options['one_off'], options['recurring'], options['max_age_years'])
+            for index in range(options['users'])
+        ]
+        seed_ms = round((time.perf_counter() - started) * 1000, 1)
+
+        today = timezone.now().date()
+        window_start = timezone.now()
+        window_end = window_start + timedelta(days=30)
+        events = list(
+            Event.objects.filter(user=users[0]).select_related('recurrence_rule').prefetch_related('exceptions')
+        )
+
+        def expand_all():
+            occurrence_cache.clear()
+            return sum(
+                len(RecurrenceService.generate_occurrences(event, window_start, window_end))
+                for event in events
+            )
+
+        occurrences = expand_all()
+        expand_ms = timed(expand_all, options['repeat'])
+
+        client = APIClient()
+        client.force_authenticate(users[0])
+        window = f'start_date={today}&end_date={today + timedelta(days=30)}'
+        urls = [
+            '/api/events/',
+            f'/api/events/?{window}',
+            f'/api/events/?show_occurrences=true&{window}',
+            '/api/events/?page_size=50',
+            '/api/events/upcoming/',
+            f'/api/events/occurrences/?{window}',
+        ]
+        occurrence_cache.reset_stats()
+        endpoints = [measure_request(client, url, options['repeat']) for url in urls]
+
+        return {
+            'config': {
+                key: options[key] for key in ('users', 'one_off', 'recurring', 'max_age_years', 'seed', 'repeat')
+            },
+            'seed_ms': seed_ms,
+            'expansion': {
+                'events': len(events),
+                'occurrences': occurrences,
+                'ms': expand_ms,
+                'occurrences_per_second': round(occurrences / expand_ms * 1000) if expand_ms else None,
+            },
+            'endpoints': endpoints,
+            'occurrence_cache': occurrence_cache.stats(),
+        }
+
+
+def bench_freebusy(options):
+    """Free/busy latency for a team of ``--team`` users over a one-month window."""
+    rnd = random.Random(options['seed'])
+    with benchmark_database():
+        # A lighter calendar per member than the api scenario keeps seeding a big team fast
+        users = [seed_user(index, rnd, 20, 5, options['max_age_years']) for index in range(options['team'])]
+        user_ids = [user.id for user in users]
+        start_date = timezone.now()
+        end_date = start_date + timedelta(days=30)
+
+        def free_busy(workers):
+            occurrence_cache.clear()
+            busy = RecurrenceService.busy_intervals(user_ids, start_date, end_date, workers)
+            return RecurrenceService.free_slots(busy.values(), start_date, end_date)
+
+        client = APIClient()
+        client.force_authenticate(users[0])
+        today = start_date.date()
+        url = (
+            f"/api/events/free_busy/?users={','.join(map(str, user_ids))}"
+            f"&start_date={today}&end_date={today + timedelta(days=30)}"
+        )
+        return {
+            'team': options['team'],
+            'serial_ms': timed(lambda: free_busy(None), options['repeat']),
+            'pool_ms': timed(lambda: free_busy(options['workers']), options['repeat']),
+            'workers': options['workers'],
+            'endpoint': measure_request(client, url, options['repeat']),
+        }
+
+
+def event_payloads(count, rnd):
+    """API payloads for ``count`` events, one in five recurring."""
+    now = timezone.now().replace(second=0, microsecond=0)
+    payloads = []
+    for number in range(count):
+        start_time = now + timedelta(days=rnd.randint(-365, 365), hours=rnd.randint(0, 23))
+        payload = {
+            'title': f'Imported {number}',
+            'start_time': start_time.isoformat(),
+            'end_time': (start_time + timedelta(hours=1)).isoformat(),
+            'is_recurring': number % 5 == 0,
+        }
+        if payload['is_recurring']:
+            rule = dict(RECURRING_TEMPLATES[number % len(RECURRING_TEMPLATES)])
+            payload['recurrence_rule'] = {key: getattr(value, 'value', value) for key, value in rule.items()}
+        payloads.append(payload)
+    return payloads
+
+
+def bench_bulk(options):
+    """Import throughput of the bulk endpoint against one POST per event."""
+    rnd = random.Random(options['seed'])
+    with benchmark_database():
+        user = get_user_model().objects.create_user(email='bulk@example.com', username='bulk', password='bench')
+        client = APIClient()
+        client.force_authenticate(user)
+        payloads = event_payloads(options['batch'], rnd)
+        # One request per event is slow enough that a sample gives a stable rate
+        sample = payloads[:min(len(payloads), 200)]
+
+        def per_item():
+            for payload in sample:
+                assert client.post('/api/events/', payload, format='json').status_code == 201
+
+        def bulk():
+            assert client.post('/api/events/bulk/', payloads, format='json').status_code == 201
+
+        def bulk_update():
+            changes = [{'id': pk, 'title': 'Renamed'} for pk in Event.objects.filter(user=user).values_list('pk', flat=True)[:len(payloads)]]
+            assert client.patch('/api/events/bulk/', changes, format='json').status_code == 200
+
+        with CaptureQueriesContext(connection) as context:
+            bulk()
+        bulk_queries = len(context.captured_queries)
+        per_item_ms = timed(per_item, options['repeat'])
+        bulk_ms = timed(bulk, options['repeat'])
+        update_ms = timed(bulk_update, options['repeat'])
+        return {
+            'batch': len(payloads),
+            'per_item_events_per_second': round(len(sample) / per_item_ms * 1000),
+            'bulk_create_ms': bulk_ms,
+            'bulk_create_events_per_second': round(len(payloads) / bulk_ms * 1000),
+            'bulk_create_queries': bulk_queries,
+            'bulk_update_ms': update_ms,
+        }
+
+
+def bench_compile(options):
+    """Cost of compiling rules cold and from the memo, next to a one-day expansion."""
+    now = timezone.now().replace(microsecond=0)
+    events = []
+    for number in range(options['events']):
+        event = build_series(now - timedelta(days=number % 700), **RECURRING_TEMPLATES[number % len(RECURRING_TEMPLATES)])
+        # Ids and a timestamp make the rules memoizable without a database
+        event.pk = number + 1
+        rule = event.recurrence_rule
+        rule.pk = rule.event_id = event.pk
+        rule.updated_at = now
+        rule.refresh_derived_fields()
+        events.append(event)
+    rules = [event.recurrence_rule for event in events]
+    window_end = now + timedelta(days=1)
+
+    def compile_cold():
+        compiled_rules.clear()
+        for rule in rules:
+            compile_rule(rule)
+
+    def compile_warm():
+        for rule in rules:
+            compile_rule(rule)
+
+    def expand():
+        for event in events:
+            list(RecurrenceService.iter_series(event, now, window_end, vectorized=False))
+
+    cold_ms = timed(compile_cold, options['repeat'])
+    compile_warm()
+    warm_ms = timed(compile_warm, options['repeat'])
+    expand_ms = timed(expand, options['repeat'])
+    return {
+        'events': len(events),
+        'compile_us_per_rule': round(cold_ms * 1000 / len(events), 2),
+        'memoized_us_per_rule': round(warm_ms * 1000 / len(events), 2),
+        'one_day_expansion_us_per_event': round(expand_ms * 1000 / len(events), 2),
+    }
+
+
+def bench_seek(options):
+    """Cost of expanding a one-week window as a function of series age."""
+    now = timezone.now().replace(microsecond=0)
+    window_end = now + timedelta(days=7)
+    rows = []
+    for age_days in options['ages']:
+        for frequency in FrequencyType.values:
+            event = build_series(now - timedelta(days=age_days), frequency)
+            scan = timed(
+                lambda: RecurrenceService.generate_occurrences(event, now, window_end, seek=False),
+                options['repeat']
+            )
+            seek = timed(
+                lambda: RecurrenceService.generate_occurrences(event, now, window_end),
+                options['repeat']
+            )
+            rows.append({
+                'frequency': frequency,
+                'age_days': age_days,
+                'scan_from_dtstart_ms': scan,
+                'seek_ms': seek,
+                'speedup': round(scan / seek, 1) if seek else None,
+            })
+    return rows
+
+
+def bench_vectorized(options):
+    """NumPy vs dateutil expansion of multi-year windows for the simple rule shapes."""
+    now = timezone.now().replace(microsecond=0)
+    shapes = {
+        'daily': {'frequency': FrequencyType.DAILY},
+        'weekly_mon_wed_fri': {'frequency': FrequencyType.WEEKLY, 'weekdays': '0,2,4'},
+        'monthly_day_15': {'frequency': FrequencyType.MONTHLY, 'month_day': 15},
+    }
+    rows = []
+    for years in options['window_years']:
+        window_end = now + timedelta(days=365 * years)
+        for shape, rule_fields in shapes.items():
+            event = build_series(now, **rule_fields)
+            dateutil_ms = timed(
+                lambda: RecurrenceService.generate_occurrences(event, now, window_end, vectorized=False),
+                options['repeat']
+            )
+            numpy_ms = timed(
+                lambda: RecurrenceService.generate_occurrences(event, now, window_end),
+                options['repeat']
+            )
+            rows.append({
+                'rule': shape,
+                'window_years': years,
+                'occurrences': len(RecurrenceService.generate_occurrences(event, now, window_end)),
+                'dateutil_ms': dateutil_ms,
+                'numpy_ms': numpy_ms,
+                'speedup': round(dateutil_ms / numpy_ms, 1) if numpy_ms else None,
+            })
+    return rows
+
+
+def bench_timezone(options):
+    """
+    Per-occurrence cost of expanding daily series in local wall time, against
+    the same series in UTC. ``cold_ms`` includes resolving the zone and
+    building its transition tables.
+    """
+    now = timezone.now().replace(microsecond=0)
+    rows = []
+    for years in options['window_years']:
+        window_end = now + timedelta(days=365 * years)
+        for tzid in ('UTC', 'America/New_York', 'Australia/Lord_Howe'):
+            event = build_series(now, FrequencyType.DAILY, tzid=tzid)
+            for backend, vectorized in (('dateutil', False), ('numpy', True)):
+                expand = lambda: RecurrenceService.generate_occurrences(
+                    event, now, window_end, vectorized=vectorized
+                )
+                get_zone.cache_clear()
+                wall_table.cache_clear()
+                transitions.cache_clear()
+                cold_ms = timed(expand, 1)
+                warm_ms = timed(expand, options['repeat'])
+                occurrences = len(expand())
+                rows.append({
+                    'tzid': tzid,
+                    'backend': backend,
+                    'window_years': years,
+                    'occurrences': occurrences,
+                    'cold_ms': cold_ms,
+                    'warm_ms': warm_ms,
+                    'ns_per_occurrence': round(warm_ms * 1e6 / occurrences) if occurrences else None,
+                })
+    return rows
+
+
+def bench_parallel(options):
+    """
+    Scaling of ``generate_many`` across worker processes on a one-year window,
+    for batches around and above ``EVENT_PARALLEL_MIN_SERIES``. The pool is
+    forced at every size here; ``speedup`` is against one process.
+    """
+    now = timezone.now().replace(microsecond=0)
+    window_end = now + timedelta(days=365)
+    worker_counts = [1]
+    while worker_counts[-1] * 2 <= options['workers']:
+        worker_counts.append(worker_counts[-1] * 2)
+    sizes = sorted({100, settings.EVENT_PARALLEL_MIN_SERIES, options['events']})
+
+    rows = []
+    with override_settings(EVENT_PARALLEL_MIN_SERIES=0):
+        for size in sizes:
+            events = []
+            for number in range(size):
+                start_time = now - timedelta(days=number % 700)
+                # Yearly June rules starting on a 31st never match and scan to year 9999
+                start_time = start_time.replace(day=min(start_time.day, 28))
+                events.append(build_series(start_time, **RECURRING_TEMPLATES[number % len(RECURRING_TEMPLATES)]))
+            serial_ms = None
+            for workers in worker_counts:
+                # A first run starts the pool, which is then reused like in a server process
+                RecurrenceService.generate_many(events, now, window_end, workers)
+                elapsed_ms = timed(
+                    lambda: RecurrenceService.generate_many(events, now, window_end, workers),
+                    options['repeat']
+                )
+                serial_ms = serial_ms or elapsed_ms
+                rows.append({
+                    'series': size,
+                    'workers': workers,
+                    'ms': elapsed_ms,
+                    'speedup': round(serial_ms / elapsed_ms, 2),
+                })
+    return {'cpu_count': os.cpu_count(), 'runs': rows}
+
+
+def latency_row(path, concurrency, elapsed, latencies):
+    latencies = sorted(latencies)
+    return {
+        'path': path,
+        'concurrency': concurrency,
+        'requests': len(latencies),
+        'requests_per_second': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(latencies[len(latencies) // 2] * 1000, 2),
+        'p95_ms': round(latencies[int(len(latencies) * 0.95)] * 1000, 2),
+    }
+
+
+def bench_asgi(options):
+    """
+    In-process load test of calendar loads (the occurrence feed over a month)
+    at increasing concurrency: the sync views behind a pool of WSGI threads,
+    one per request in flight, against the async views on a single ASGI
+    event loop.
+    """
+    rnd = random.Random(options['seed'])
+    with benchmark_database():
+        users = [
+            seed_user(index, rnd, options['one_off'], options['recurring'], options['max_age_years'])
+            for index in range(options['users'])
+        ]
+        headers = [{'Authorization': f'Bearer {AccessToken.for_user(user)}'} for user in users]
+        today = timezone.now().date()
+        path = f'events/occurrences/?start_date={today}&end_date={today + timedelta(days=30)}'
+
+        def wsgi_request(index):
+            started = time.perf_counter()
+            response = Client().get(f'/api/{path}', headers=headers[index % len(headers)])
+            b''.join(response.streaming_content)
+            return time.perf_counter() - started
+
+        async def asgi_load(concurrency):
+            client = AsyncClient()
+            slots = asyncio.Semaphore(concurrency)
+
+            async def request(index):
+                async with slots:
+                    started = time.perf_counter()
+                    response = await client.get(f'/api/async/{path}', headers=headers[index % len(headers)])
+                    async for _ in response.streaming_content:
+                        pass
+                    return time.perf_counter() - started
+
+            return await asyncio.gather(*(request(index) for index in range(options['requests'])))
+
+        rows = []
+        for concurrency in options['concurrency']:
+            occurrence_cache.clear()
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                latencies = list(pool.map(wsgi_request, range(options['requests'])))
+            rows.append(latency_row('wsgi', concurrency, time.perf_counter() - started, latencies))
+
+            occurrence_cache.clear()
+            started = time.perf_counter()
+            latencies = asyncio.run(asgi_load(concurrency))
+            rows.append(latency_row('asgi', concurrency, time.perf_counter() - started, latencies))
+        return rows
+
+
+def bench_serialize(options):
+    """
+    Per-event cost of rendering a ``--batch`` event list: ``EventSerializer``
+    with DRF's JSON renderer against ``.values()`` rows with the fast
+    renderer, split into reading, serializing and rendering.
+    """
+    rnd = random.Random(options['seed'])
+    with benchmark_database():
+        user = get_user_model().objects.create_user(email='list@example.com', username='list', password='bench')
+        client = APIClient()
+        client.force_authenticate(user)
+        assert client.post('/api/events/bulk/', event_payloads(options['batch'], rnd), format='json').status_code == 201
+        queryset = Event.objects.filter(user=user).select_related('recurrence_rule').order_by('start_time')
+        events = list(queryset.prefetch_related('exceptions'))
+        rows = list(EventRowSerializer.values(queryset))
+        data = EventSerializer(events, many=True).data
+        repeat = options['repeat']
+
+        def per_event_us(func):
+            return round(timed(func, repeat) * 1000 / len(events), 3)
+
+        paths = {
+            'model_serializer': {
+                'read': lambda: list(queryset.prefetch_related('exceptions')),
+                'serialize': lambda: EventSerializer(events, many=True).data,
+                'render': lambda: JSONRenderer().render(data),
+            },
+            'values_rows': {
+                'read': lambda: list(EventRowSerializer.values(queryset)),
+                'serialize': lambda: EventRowSerializer.to_representation(rows),
+                'render': lambda: FastJSONRenderer().render(data),
+            },
+        }
+        results = {'events': len(events)}
+        for name, stages in paths.items():
+            results[name] = {f'{stage}_us_per_event': per_event_us(func) for stage, func in stages.items()}
+            results[name]['total_us_per_event'] = round(sum(results[name].values()), 3)
+        results['endpoint'] = measure_request(client, '/api/events/', repeat)
+        return results
+
+
+SCENARIOS = {
+    'api': bench_api,
+    'asgi': bench_asgi,
+    'bulk': bench_bulk,
+    'compile': bench_compile,
+    'freebusy': bench_freebusy,
+    'parallel': bench_parallel,
+    'seek': bench_seek,
+    'serialize': bench_serialize,
+    'timezone': bench_timezone,
+    'vectorized': bench_vectorized,
+}
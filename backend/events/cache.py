@@ -0,0 +1,188 @@
+"""
+Cache of expanded occurrence windows.
+
+Entries are keyed by ``(event_id, event.updated_at, window)`` so a stale entry
+can never be served for an edited event, and are also dropped eagerly by the
+signal handlers in ``events.signals`` whenever an event, its rule or its
+exceptions change. The storage backend is configured through the
+``EVENT_OCCURRENCE_CACHE`` setting.
+"""
+import threading
+from collections import OrderedDict, defaultdict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+
+
+class LRUBackend:
+    """Bounded in-process LRU; evicts the least recently used window when full."""
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._keys_by_event = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def get(self, event_id, key):
+        with self._lock:
+            try:
+                self._entries.move_to_end(key)
+            except KeyError:
+                return None
+            return self._entries[key]
+
+    def set(self, event_id, key, value):
+        """Store ``value`` and return the number of entries evicted to make room."""
+        evicted = 0
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            self._keys_by_event[event_id].add(key)
+            while len(self._entries) > self.max_entries:
+                old_key, _ = self._entries.popitem(last=False)
+                self._discard_key(old_key)
+                evicted += 1
+        return evicted
+
+    def invalidate(self, event_id):
+        with self._lock:
+            for key in self._keys_by_event.pop(event_id, ()):
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_event.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _discard_key(self, key):
+        event_id = key[0]
+        keys = self._keys_by_event.get(event_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_event[event_id]
+
+
+class DjangoCacheBackend:
+    """
+    Store windows in one of Django's configured caches (e.g. Redis or memcached).
+
+    Shared caches cannot enumerate an event's keys, so each event has a version
+    number that is bumped to invalidate them all. Entries are stored along
+    with the version they were computed under, so a lookup reads the version
+    and the entry in one ``get_many`` round trip. Evictions happen inside the
+    cache server and are not counted here.
+    """
+
+    def __init__(self, alias='default', timeout=3600, key_prefix='occurrences'):
+        self.alias = alias
+        self.timeout = timeout
+        self.key_prefix = key_prefix
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def _version_key(self, event_id):
+        return f'{self.key_prefix}:version:{event_id}'
+
+    def _entry_key(self, event_id, key):
+        # ISO 8601 without spaces: memcached refuses keys containing whitespace
+        return f'{self.key_prefix}:{event_id}:' + ':'.join(
+            part.isoformat() if part is not None else '-' for part in key[1:]
+        )
+
+    def get(self, event_id, key):
+        version_key = self._version_key(event_id)
+        entry_key = self._entry_key(event_id, key)
+        found = self.cache.get_many([version_key, entry_key])
+        entry = found.get(entry_key)
+        if entry is None or entry[0] != found.get(version_key, 0):
+            return None
+        return entry[1]
+
+    def set(self, event_id, key, value):
+        version = self.cache.get(self._version_key(event_id), 0)
+        self.cache.set(self._entry_key(event_id, key), (version, value), self.timeout)
+        return 0
+
+    def invalidate(self, event_id):
+        version_key = self._version_key(event_id)
+        try:
+            self.cache.incr(version_key)
+        except ValueError:
+            self.cache.set(version_key, 1, None)
+
+    def clear(self):
+        self.cache.clear()
+
+
+class OccurrenceCache:
+    """Front end over a backend that keeps hit/miss/eviction counters for sizing."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    @classmethod
+    def from_settings(cls):
+        config = getattr(settings, 'EVENT_OCCURRENCE_CACHE', {})
+        backend_class = import_string(config.get('BACKEND', 'events.cache.LRUBackend'))
+        return cls(backend_class(**config.get('OPTIONS', {})))
+
+    @staticmethod
+    def make_key(event, start_date, end_date):
+        return (event.pk, event.updated_at, start_date, end_date)
+
+    def get(self, event, start_date, end_date):
+        """The cached window for ``event``, or ``None``."""
+        value = self.backend.get(event.pk, self.make_key(event, start_date, end_date))
+        self._count('hits' if value is not None else 'misses')
+        return value
+
+    def set(self, event, start_date, end_date, value):
+        evicted = self.backend.set(event.pk, self.make_key(event, start_date, end_date), value)
+        if evicted:
+            self._count('evictions', evicted)
+
+    def get_or_compute(self, event, start_date, end_date, compute):
+        """Return the cached window for ``event`` or compute and store it."""
+        value = self.get(event, start_date, end_date)
+        if value is None:
+            value = compute()
+            self.set(event, start_date, end_date, value)
+        return value
+
+    def invalidate(self, event_id):
+        if event_id is None:
+            return
+        self._count('invalidations')
+        self.backend.invalidate(event_id)
+
+    def clear(self):
+        self.backend.clear()
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else None
+        if hasattr(self.backend, '__len__'):
+            stats['entries'] = len(self.backend)
+        return stats
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+
+occurrence_cache = OccurrenceCache.from_settings()
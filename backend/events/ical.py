@@ -0,0 +1,399 @@
+"""
+Streaming iCalendar (RFC 5545) export and import.
+
+Export writes one VEVENT per event with its recurrence rule as a native RRULE
+(plus EXDATE lines and RECURRENCE-ID overrides for its exceptions), so its
+cost grows with the number of events, never with the number of occurrences.
+Import reads a file line by line and yields one component at a time, so the
+memory it needs does not depend on the size of the file.
+"""
+import re
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from zoneinfo import ZoneInfoNotFoundError
+
+from django.utils import timezone
+from itertools import islice
+
+from .cache import occurrence_cache
+from .models import ChangeSequence, Event, FrequencyType, MonthWeek, Occurrence, OccurrenceException, RRULE_WEEKDAYS
+from .serializers import EventSerializer
+from .services import RecurrenceService
+from .timezones import get_zone, is_valid_zone
+
+PRODID = '-//Event Scheduler//Event Scheduler//EN'
+
+DURATION_PATTERN = re.compile(
+    r'^(?P<sign>[+-])?P(?:(?P<weeks>\d+)W)?(?:(?P<days>\d+)D)?'
+    r'(?:T(?:(?P<hours>\d+)H)?(?:(?P<minutes>\d+)M)?(?:(?P<seconds>\d+)S)?)?$'
+)
+
+BYDAY_PATTERN = re.compile(r'^(?P<ordinal>[+-]?\d+)?(?P<weekday>MO|TU|WE|TH|FR|SA|SU)$')
+
+
+class ICalendarError(ValueError):
+    """A component that cannot be represented by the event model."""
+
+
+# Export
+
+def format_datetime(value):
+    return value.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def datetime_property(name, value, tzid):
+    """A DATE-TIME property in UTC, or as local time with a TZID parameter for zoned events."""
+    zone = get_zone(tzid)
+    if zone is None:
+        return f'{name}:{format_datetime(value)}'
+    return f"{name};TZID={tzid}:{value.astimezone(zone).strftime('%Y%m%dT%H%M%S')}"
+
+
+def escape_text(value):
+    return (
+        value.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+        .replace('\r\n', '\\n').replace('\n', '\\n')
+    )
+
+
+def fold(line):
+    """Split a content line into 75-octet pieces joined by CRLF and a space."""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line + '\r\n'
+    pieces = []
+    while encoded:
+        limit = 75 if not pieces else 74
+        # Never cut a multi-byte character in half
+        while limit < len(encoded) and (encoded[limit] & 0xC0) == 0x80:
+            limit -= 1
+        pieces.append(encoded[:limit].decode('utf-8'))
+        encoded = encoded[limit:]
+    return '\r\n '.join(pieces) + '\r\n'
+
+
+def event_lines(event, uid_domain):
+    """Content lines of ``event`` and of the overridden occurrences of its series."""
+    uid = f'{event.pk}@{uid_domain}'
+    yield 'BEGIN:VEVENT'
+    yield f'UID:{uid}'
+    yield f'DTSTAMP:{format_datetime(event.updated_at)}'
+    yield datetime_property('DTSTART', event.start_time, event.tzid)
+    yield datetime_property('DTEND', event.end_time, event.tzid)
+    yield f'SUMMARY:{escape_text(event.title)}'
+    if event.description:
+        yield f'DESCRIPTION:{escape_text(event.description)}'
+
+    exceptions = []
+    if event.is_recurring:
+        rule = getattr(event, 'recurrence_rule', None)
+        if rule is not None:
+            # Rules saved before the canonical string existed are rendered on the fly
+            yield f'RRULE:{rule.rrule or rule.build_rrule()}'
+        exceptions = list(event.exceptions.all())
+        for exception in exceptions:
+            if exception.is_cancelled:
+                yield datetime_property('EXDATE', exception.original_start, event.tzid)
+    yield 'END:VEVENT'
+
+    duration = event.end_time - event.start_time
+    for exception in exceptions:
+        if exception.is_cancelled:
+            continue
+        start_time = exception.start_time or exception.original_start
+        yield 'BEGIN:VEVENT'
+        yield f'UID:{uid}'
+        yield f'DTSTAMP:{format_datetime(event.updated_at)}'
+        yield datetime_property('RECURRENCE-ID', exception.original_start, event.tzid)
+        yield datetime_property('DTSTART', start_time, event.tzid)
+        yield datetime_property('DTEND', exception.end_time or start_time + duration, event.tzid)
+        yield f'SUMMARY:{escape_text(exception.title or event.title)}'
+        yield 'END:VEVENT'
+
+
+def iter_calendar(events, uid_domain='event-scheduler'):
+    """Yield a whole VCALENDAR for ``events`` as folded CRLF-terminated lines."""
+    yield fold('BEGIN:VCALENDAR')
+    yield fold('VERSION:2.0')
+    yield fold(f'PRODID:{PRODID}')
+    yield fold('CALSCALE:GREGORIAN')
+    for event in events:
+        for line in event_lines(event, uid_domain):
+            yield fold(line)
+    yield fold('END:VCALENDAR')
+
+
+# Import
+
+def unfold(lines):
+    """Join folded continuation lines; accepts bytes or text lines."""
+    current = None
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8', errors='replace')
+        line = line.rstrip('\r\n')
+        if line[:1] in (' ', '\t') and current is not None:
+            current += line[1:]
+            continue
+        if current:
+            yield current
+        current = line
+    if current:
+        yield current
+
+
+def parse_line(line):
+    """Split a content line into ``(NAME, {PARAM: value}, value)``."""
+    head, _, value = line.partition(':')
+    name, *params = head.split(';')
+    return name.upper(), dict(
+        (key.upper(), param_value.strip('"'))
+        for key, _, param_value in (param.partition('=') for param in params)
+    ), value
+
+
+def unescape_text(value):
+    return re.sub(r'\\([\\;,nN])', lambda match: '\n' if match.group(1) in 'nN' else match.group(1), value)
+
+
+def iter_vevents(lines):
+    """
+    Yield every VEVENT as a ``{NAME: [(params, value), ...]}`` dict, one at a
+    time. Input that does not open with a VCALENDAR is refused outright.
+    """
+    component = None
+    depth = 0
+    calendar = False
+    for line in unfold(lines):
+        name, params, value = parse_line(line)
+        if not calendar:
+            if (name.lstrip('\ufeff'), value.upper()) != ('BEGIN', 'VCALENDAR'):
+                break
+            calendar = True
+            continue
+        if name == 'BEGIN':
+            if value.upper() == 'VEVENT' and component is None:
+                component = {}
+            elif component is not None:
+                # Nested components such as VALARM are skipped
+                depth += 1
+        elif name == 'END':
+            if depth:
+                depth -= 1
+            elif value.upper() == 'VEVENT' and component is not None:
+                yield component
+                component = None
+        elif component is not None and not depth:
+            component.setdefault(name, []).append((params, value))
+    if not calendar:
+        raise ICalendarError('Not an iCalendar file: it must start with BEGIN:VCALENDAR')
+
+
+def parse_datetime(value, params):
+    """Parse DATE, UTC, TZID-qualified or floating DATE-TIME values into aware datetimes."""
+    try:
+        if params.get('VALUE') == 'DATE' or len(value) == 8:
+            parsed = datetime.combine(datetime.strptime(value, '%Y%m%d').date(), time.min)
+            return timezone.make_aware(parsed)
+        if value.endswith('Z'):
+            return datetime.strptime(value, '%Y%m%dT%H%M%SZ').replace(tzinfo=dt_timezone.utc)
+        parsed = datetime.strptime(value, '%Y%m%dT%H%M%S')
+    except ValueError:
+        raise ICalendarError(f'Invalid date or date-time: {value}')
+    if 'TZID' in params:
+        try:
+            return parsed.replace(tzinfo=get_zone(params['TZID']) or dt_timezone.utc)
+        except ZoneInfoNotFoundError:
+            raise ICalendarError(f"Unknown time zone: {params['TZID']}")
+    return timezone.make_aware(parsed)
+
+
+def parse_duration(value):
+    match = DURATION_PATTERN.match(value)
+    if not match:
+        raise ICalendarError(f'Invalid duration: {value}')
+    duration = timedelta(
+        weeks=int(match['weeks'] or 0), days=int(match['days'] or 0), hours=int(match['hours'] or 0),
+        minutes=int(match['minutes'] or 0), seconds=int(match['seconds'] or 0)
+    )
+    return -duration if match['sign'] == '-' else duration
+
+
+def recurrence_rule_data(value):
+    """Map an RRULE value onto ``RecurrenceRule`` fields, refusing parts the model cannot express."""
+    parts = dict(part.partition('=')[::2] for part in value.upper().split(';') if part)
+    frequency = parts.pop('FREQ', None)
+    if frequency not in FrequencyType.values:
+        raise ICalendarError(f'Unsupported frequency: {frequency}')
+    data = {'frequency': frequency}
+    if parts.pop('WKST', 'MO') != 'MO':
+        raise ICalendarError('Only weeks starting on Monday are supported')
+    if 'INTERVAL' in parts:
+        data['interval'] = int(parts.pop('INTERVAL'))
+    if 'COUNT' in parts:
+        data['count'] = int(parts.pop('COUNT'))
+    if 'UNTIL' in parts:
+        until = parts.pop('UNTIL')
+        data['until'] = parse_datetime(until, {})
+        if len(until) == 8:
+            # A DATE until includes the whole day; a DATE-TIME one, even at midnight, ends there
+            data['until'] += timedelta(days=1, microseconds=-1)
+
+    days = [BYDAY_PATTERN.match(day) for day in parts.pop('BYDAY', '').split(',') if day]
+    if not all(days):
+        raise ICalendarError('Invalid BYDAY')
+    setpos = parts.pop('BYSETPOS', None)
+    if days and frequency == FrequencyType.WEEKLY and not setpos and not any(day['ordinal'] for day in days):
+        data['weekdays'] = ','.join(str(RRULE_WEEKDAYS.index(day['weekday'])) for day in days)
+    elif days and frequency == FrequencyType.MONTHLY and len(days) == 1 and bool(days[0]['ordinal']) != bool(setpos):
+        week = int(days[0]['ordinal'] or setpos)
+        if week not in MonthWeek.values:
+            raise ICalendarError(f'Unsupported week of month: {week}')
+        data['week_of_month'] = week
+        data['weekday_of_month'] = RRULE_WEEKDAYS.index(days[0]['weekday'])
+    elif days or setpos:
+        raise ICalendarError(f'Unsupported BYDAY/BYSETPOS for {frequency}')
+
+    if 'BYMONTHDAY' in parts and frequency == FrequencyType.MONTHLY and ',' not in parts['BYMONTHDAY']:
+        data['month_day'] = int(parts.pop('BYMONTHDAY'))
+    if 'BYMONTH' in parts and frequency == FrequencyType.YEARLY and ',' not in parts['BYMONTH']:
+        data['month'] = int(parts.pop('BYMONTH'))
+    if parts:
+        raise ICalendarError(f"Unsupported RRULE parts: {', '.join(sorted(parts))}")
+    return data
+
+
+def component_to_event(component):
+    """
+    Turn a parsed VEVENT into ``(uid, event_data, exdates, recurrence_id)``,
+    where ``event_data`` is a payload for ``EventSerializer``.
+    """
+    def first(name):
+        values = component.get(name)
+        return values[0] if values else (None, None)
+
+    uid = first('UID')[1]
+    params, value = first('DTSTART')
+    if value is None:
+        raise ICalendarError('DTSTART is required')
+    start_time = parse_datetime(value, params)
+    params, value = first('DTEND')
+    if value is not None:
+        end_time = parse_datetime(value, params)
+    elif first('DURATION')[1] is not None:
+        end_time = start_time + parse_duration(first('DURATION')[1])
+    else:
+        # RFC 5545: a DATE start lasts one day, a DATE-TIME start has no duration
+        end_time = start_time + timedelta(days=1) if len(first('DTSTART')[1]) == 8 else start_time
+
+    event_data = {
+        'title': unescape_text(first('SUMMARY')[1] or '')[:200] or 'Untitled',
+        'start_time': start_time,
+        'end_time': end_time,
+        'is_recurring': False,
+    }
+    if first('DESCRIPTION')[1] is not None:
+        event_data['description'] = unescape_text(first('DESCRIPTION')[1])
+    tzid = first('DTSTART')[0].get('TZID')
+    if tzid and is_valid_zone(tzid):
+        # Recurrences follow the wall time of the zone the series was written in
+        event_data['tzid'] = tzid
+    rrule = first('RRULE')[1]
+    if rrule:
+        event_data['is_recurring'] = True
+        event_data['recurrence_rule'] = recurrence_rule_data(rrule)
+
+    exdates = [
+        parse_datetime(exdate, params)
+        for params, value in component.get('EXDATE', [])
+        for exdate in value.split(',') if exdate
+    ]
+    params, value = first('RECURRENCE-ID')
+    recurrence_id = parse_datetime(value, params) if value else None
+    return uid, event_data, exdates, recurrence_id
+
+
+def import_calendar(lines, context, batch_size=1000, max_errors=100):
+    """
+    Import the VEVENTs read from ``lines`` for the requesting user in
+    ``context``. Components are validated and written ``batch_size`` at a
+    time through the bulk serializer; invalid ones are reported and skipped.
+    Only the ids of imported series are kept between batches, so overrides
+    (RECURRENCE-ID) can find their series when it came earlier in the file.
+    """
+    user = context['request'].user
+    series_ids = {}
+    summary = {'created': 0, 'exceptions': 0, 'failed': 0, 'errors': []}
+
+    def fail(index, uid, errors):
+        summary['failed'] += 1
+        if len(summary['errors']) < max_errors:
+            summary['errors'].append({'index': index, 'uid': uid, 'errors': errors})
+
+    components = enumerate(iter_vevents(lines))
+    while True:
+        batch = list(islice(components, batch_size))
+        if not batch:
+            break
+
+        items, overrides = [], []
+        for index, component in batch:
+            try:
+                uid, event_data, exdates, recurrence_id = component_to_event(component)
+            except (ICalendarError, ValueError, OverflowError) as exc:
+                fail(index, component.get('UID', [(None, None)])[0][1], [str(exc)])
+                continue
+            if recurrence_id is not None:
+                overrides.append((index, uid, recurrence_id, event_data))
+            else:
+                items.append((index, uid, event_data, exdates))
+
+        serializer = EventSerializer(data=[item[2] for item in items], many=True, context=context)
+        if not serializer.is_valid():
+            for (index, uid, _, _), errors in zip(items, serializer.errors):
+                if errors:
+                    fail(index, uid, errors)
+            items = [item for item, errors in zip(items, serializer.errors) if not errors]
+            serializer = EventSerializer(data=[item[2] for item in items], many=True, context=context)
+            serializer.is_valid(raise_exception=True)
+        events = serializer.save() if items else []
+        summary['created'] += len(events)
+
+        exceptions = []
+        for (index, uid, _, exdates), event in zip(items, events):
+            if event.is_recurring:
+                if uid:
+                    series_ids[uid] = event.pk
+                exceptions.extend(
+                    OccurrenceException(event=event, original_start=exdate, is_cancelled=True)
+                    for exdate in exdates
+                )
+        for index, uid, recurrence_id, event_data in overrides:
+            if uid not in series_ids:
+                fail(index, uid, ['RECURRENCE-ID refers to a series that was not imported before it'])
+                continue
+            exceptions.append(OccurrenceException(
+                event_id=series_ids[uid],
+                original_start=recurrence_id,
+                start_time=event_data['start_time'],
+                end_time=event_data['end_time'],
+                title=event_data['title']
+            ))
+        if exceptions:
+            OccurrenceException.objects.bulk_create(exceptions, ignore_conflicts=True)
+            summary['exceptions'] += len(exceptions)
+            reindex_series(user, {exception.event_id for exception in exceptions})
+    return summary
+
+
+def reindex_series(user, event_ids):
+    """Rebuild the occurrence index of series of ``user`` whose exceptions were written in bulk."""
+    events = list(
+        Event.objects.filter(pk__in=event_ids).select_related('recurrence_rule').prefetch_related('exceptions')
+    )
+    Occurrence.objects.filter(event_id__in=event_ids).delete()
+    RecurrenceService.index_many(events)
+    Event.objects.filter(pk__in=event_ids).update(
+        updated_at=timezone.now(), sequence=ChangeSequence.allocate(user.pk)
+    )
+    for event_id in event_ids:
+        occurrence_cache.invalidate(event_id)
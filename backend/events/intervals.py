@@ -0,0 +1,75 @@
+"""
+Static interval index used for conflict detection.
+
+A centered interval tree: every node stores the intervals that contain its
+center point twice, sorted by start and by end, so a range query only walks
+one root-to-leaf path plus the nodes whose intervals actually overlap, i.e.
+O(log n + k). Intervals are half-open, so back-to-back events do not overlap.
+"""
+from operator import itemgetter
+
+
+class _Node:
+    __slots__ = ('center', 'by_start', 'by_end', 'left', 'right')
+
+    def __init__(self, center, overlapping, left, right):
+        self.center = center
+        self.by_start = sorted(overlapping, key=itemgetter(0))
+        self.by_end = sorted(overlapping, key=itemgetter(1), reverse=True)
+        self.left = left
+        self.right = right
+
+
+class IntervalIndex:
+    """Index of ``(start, end, item)`` triples answering overlap queries."""
+
+    def __init__(self, intervals=()):
+        # Empty intervals cannot overlap anything and would never settle on a node
+        intervals = [interval for interval in intervals if interval[0] < interval[1]]
+        self._size = len(intervals)
+        self._root = self._build(sorted(intervals, key=itemgetter(0)))
+
+    def __len__(self):
+        return self._size
+
+    @classmethod
+    def _build(cls, intervals):
+        """Build the subtree for ``intervals``, which must be sorted by start."""
+        if not intervals:
+            return None
+        # The median start always lands in this node, so each level shrinks
+        center = intervals[len(intervals) // 2][0]
+        left, overlapping, right = [], [], []
+        for interval in intervals:
+            if interval[1] <= center:
+                left.append(interval)
+            elif interval[0] > center:
+                right.append(interval)
+            else:
+                overlapping.append(interval)
+        return _Node(center, overlapping, cls._build(left), cls._build(right))
+
+    def overlapping(self, start, end):
+        """Yield every indexed interval overlapping ``[start, end)``."""
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            if node is None:
+                continue
+            if end <= node.center:
+                for interval in node.by_start:
+                    if interval[0] >= end:
+                        break
+                    yield interval
+                stack.append(node.left)
+            elif start > node.center:
+                for interval in node.by_end:
+                    if interval[1] <= start:
+                        break
+                    yield interval
+                stack.append(node.right)
+            else:
+                # The query contains the center, and so does every interval here
+                yield from node.by_start
+                stack.append(node.left)
+                stack.append(node.right)
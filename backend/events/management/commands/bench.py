@@ -0,0 +1,63 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from events.benchmarks import SCENARIOS
+
+
+class Command(BaseCommand):
+    help = "Run the events benchmark scenarios and print the results as JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'scenarios',
+            nargs='*',
+            help=f"Scenarios to run: {', '.join(sorted(SCENARIOS))} (default: all)"
+        )
+        parser.add_argument('--repeat', type=int, default=5, help="Runs per measurement; the best is kept")
+        parser.add_argument(
+            '--ages',
+            type=int,
+            nargs='+',
+            default=[30, 365, 365 * 5, 365 * 20],
+            help="Series ages in days for the seek scenario"
+        )
+        parser.add_argument(
+            '--window-years',
+            type=int,
+            nargs='+',
+            default=[1, 5],
+            help="Window lengths in years for the vectorized and timezone scenarios"
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            nargs='+',
+            default=[1, 8, 32],
+            help="Requests in flight for the asgi scenario"
+        )
+        parser.add_argument('--requests', type=int, default=64, help="Requests per concurrency level in the asgi scenario")
+        parser.add_argument('--users', type=int, default=3, help="Synthetic users seeded for the api and asgi scenarios")
+        parser.add_argument('--one-off', type=int, default=200, help="One-off events per seeded user")
+        parser.add_argument('--recurring', type=int, default=50, help="Recurring events per seeded user")
+        parser.add_argument('--max-age-years', type=int, default=5, help="Oldest start of a seeded series")
+        parser.add_argument('--team', type=int, default=200, help="Users in the freebusy scenario")
+        parser.add_argument('--workers', type=int, default=4, help="Most worker processes for pooled expansion")
+        parser.add_argument('--batch', type=int, default=1000, help="Events per request in the bulk and serialize scenarios")
+        parser.add_argument('--events', type=int, default=5000, help="Series expanded in the compile and parallel scenarios")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed for reproducible data")
+        parser.add_argument('--output', help="Also write the JSON results to this file")
+
+    def handle(self, *args, **options):
+        unknown = set(options['scenarios']) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+        results = {
+            name: SCENARIOS[name](options)
+            for name in options['scenarios'] or sorted(SCENARIOS)
+        }
+        payload = json.dumps(results, indent=2, default=str)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                output.write(payload)
+        self.stdout.write(payload)
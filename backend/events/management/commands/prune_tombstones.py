@@ -0,0 +1,23 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from events.sync import prune_tombstones
+
+
+class Command(BaseCommand):
+    help = "Delete delta sync tombstones older than the retention period."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=settings.EVENT_TOMBSTONE_RETENTION_DAYS,
+            help="Keep tombstones this many days (default: EVENT_TOMBSTONE_RETENTION_DAYS)"
+        )
+
+    def handle(self, *args, **options):
+        pruned = prune_tombstones(timezone.now() - timedelta(days=options['days']))
+        self.stdout.write(f"Pruned {pruned} tombstones")
@@ -1,7 +1,8 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
+from datetime import timezone as dt_timezone
 from dateutil.rrule import rrule, DAILY, WEEKLY, MONTHLY, YEARLY
 import dateutil.parser
 from enum import Enum
@@ -37,6 +38,9 @@ class Month(models.IntegerChoices):
     NOVEMBER = 11, 'November'
     DECEMBER = 12, 'December'
 
+# RFC 5545 weekday codes, indexed by Weekday
+RRULE_WEEKDAYS = ['MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU']
+
 class MonthWeek(models.IntegerChoices):
     FIRST = 1, 'First'
     SECOND = 2, 'Second'
@@ -44,6 +48,29 @@ class MonthWeek(models.IntegerChoices):
     FOURTH = 4, 'Fourth'
     LAST = -1, 'Last'
 
+class ChangeSequence(models.Model):
+    """Per-user counter numbering every write to the user's events, for delta sync and ETags."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='event_sequence')
+    value = models.PositiveBigIntegerField(default=0)
+    pruned_through = models.PositiveBigIntegerField(default=0)  # Tombstones up to here were pruned
+    changed_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Change sequence of {self.user} ({self.value})"
+
+    @classmethod
+    def allocate(cls, user_id):
+        """
+        Take the next sequence number of ``user_id``. The counter row stays
+        locked until the caller's transaction commits, so a user's changes
+        become visible in sequence order.
+        """
+        with transaction.atomic():
+            counter, _ = cls.objects.select_for_update().get_or_create(user_id=user_id)
+            counter.value += 1
+            counter.save(update_fields=['value', 'changed_at'])
+        return counter.value
+
 class Event(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='events')
     title = models.CharField(max_length=200)
@@ -51,15 +78,34 @@ class Event(models.Model):
     start_time = models.DateTimeField()
     end_time = models.DateTimeField()
     is_recurring = models.BooleanField(default=False)
+    tzid = models.CharField(max_length=64, default='UTC')  # IANA zone the series repeats in
+    series_end = models.DateTimeField(null=True, blank=True, editable=False)  # Start of the last occurrence; null if open-ended
+    indexed_until = models.DateTimeField(null=True, blank=True, editable=False)  # Occurrences materialized up to here
+    sequence = models.PositiveBigIntegerField(default=0, editable=False)  # Owner's change sequence at the last write
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['start_time']
+        indexes = [
+            models.Index(fields=['user', 'start_time'], name='event_user_start_idx'),
+            models.Index(fields=['user', 'is_recurring'], name='event_user_recurring_idx'),
+            models.Index(fields=['user', 'sequence'], name='event_user_sequence_idx'),
+        ]
+        permissions = [
+            ('view_free_busy', "Can view the free/busy times of other users"),
+        ]
 
     def __str__(self):
         return f"{self.title} ({self.start_time})"
 
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            self.sequence = ChangeSequence.allocate(self.user_id)
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'sequence'}
+            super().save(*args, **kwargs)
+
 class RecurrenceRule(models.Model):
     event = models.OneToOneField(
         Event, 
@@ -99,6 +145,115 @@ class RecurrenceRule(models.Model):
         blank=True,
         choices=Weekday.choices
     )
+    weekday_mask = models.PositiveSmallIntegerField(default=0, editable=False)  # Bit n set for Weekday n
+    rrule = models.CharField(max_length=255, blank=True, default='', editable=False)  # Canonical RRULE value
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Recurrence for {self.event.title}"
+
+    def save(self, *args, **kwargs):
+        self.refresh_derived_fields()
+        super().save(*args, **kwargs)
+
+    def refresh_derived_fields(self):
+        """Recompute weekday_mask and rrule; bulk writes bypass save() and must call this."""
+        self.weekday_mask = self.mask_for(self.weekdays)
+        self.rrule = self.build_rrule()
+
+    @staticmethod
+    def mask_for(weekdays):
+        mask = 0
+        for day in (weekdays or '').split(','):
+            if day.strip():
+                if int(day) not in Weekday.values:
+                    raise ValueError(f'Invalid weekday: {day}')
+                mask |= 1 << int(day)
+        return mask
+
+    def weekday_list(self):
+        """Weekdays of a weekly rule in Monday-first order, read from the mask when it is set."""
+        mask = self.weekday_mask or self.mask_for(self.weekdays)
+        return [day for day in range(7) if mask >> day & 1]
+
+    def build_rrule(self):
+        """The RFC 5545 RRULE value describing how this rule is expanded."""
+        parts = [f'FREQ={self.frequency}']
+        if self.interval and self.interval > 1:
+            parts.append(f'INTERVAL={self.interval}')
+        if self.count:
+            parts.append(f'COUNT={self.count}')
+        if self.until:
+            parts.append(f"UNTIL={self.until.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')}")
+        if self.frequency == FrequencyType.WEEKLY and self.weekday_list():
+            parts.append('BYDAY=' + ','.join(RRULE_WEEKDAYS[day] for day in self.weekday_list()))
+        if self.frequency == FrequencyType.MONTHLY:
+            if self.month_day:
+                parts.append(f'BYMONTHDAY={self.month_day}')
+            if self.week_of_month is not None and self.weekday_of_month is not None:
+                parts.append(f'BYDAY={RRULE_WEEKDAYS[self.weekday_of_month]}')
+                parts.append(f'BYSETPOS={self.week_of_month}')
+        if self.frequency == FrequencyType.YEARLY and self.month:
+            parts.append(f'BYMONTH={self.month}')
+        return ';'.join(parts)
+
+class Occurrence(models.Model):
+    event = models.ForeignKey(
+        Event,
+        on_delete=models.CASCADE,
+        related_name='indexed_occurrences'
+    )
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    start_time = models.DateTimeField()
+    end_time = models.DateTimeField()
+
+    class Meta:
+        ordering = ['start_time']
+        indexes = [
+            models.Index(fields=['user', 'start_time']),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['event', 'start_time'], name='unique_indexed_occurrence'),
+        ]
+
+    def __str__(self):
+        return f"{self.event.title} ({self.start_time})"
+
+
+class OccurrenceException(models.Model):
+    """A cancelled or overridden occurrence of a recurring event."""
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='exceptions')
+    original_start = models.DateTimeField()  # Start of the occurrence the rule generates
+    is_cancelled = models.BooleanField(default=False)
+    start_time = models.DateTimeField(null=True, blank=True)
+    end_time = models.DateTimeField(null=True, blank=True)
+    title = models.CharField(max_length=200, blank=True, null=True)
+
+    class Meta:
+        ordering = ['original_start']
+        constraints = [
+            models.UniqueConstraint(fields=['event', 'original_start'], name='unique_occurrence_exception'),
+        ]
+
+    def __str__(self):
+        return f"Exception for {self.event.title} ({self.original_start})"
+
+
+class Tombstone(models.Model):
+    """
+    A deleted event, or a cancelled occurrence of one when ``original_start``
+    is set, kept so delta sync can report it.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='event_tombstones')
+    event_id = models.BigIntegerField()  # Not a foreign key: the event may be gone
+    original_start = models.DateTimeField(null=True, blank=True)
+    sequence = models.PositiveBigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'sequence'], name='tombstone_user_sequence_idx'),
+        ]
 
     def __str__(self):
-        return f"Recurrence for {self.event.title}"
\ No newline at end of file
+        return f"Tombstone of event {self.event_id} ({self.original_start or 'deleted'})"
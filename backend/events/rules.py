@@ -0,0 +1,90 @@
+"""
+Compiled recurrence rules.
+
+Turning a ``RecurrenceRule`` into rrule keyword arguments (frequency and
+weekday constants, by-rules) only depends on the rule itself, so it is done
+once per ``(rule id, updated_at)`` and the immutable result is shared by every
+expansion of that rule in this process.
+"""
+from types import MappingProxyType
+
+from dateutil.rrule import DAILY, WEEKLY, MONTHLY, YEARLY, MO, TU, WE, TH, FR, SA, SU
+
+from .cache import LRUBackend
+from .models import FrequencyType
+
+FREQUENCIES = {
+    FrequencyType.DAILY: DAILY,
+    FrequencyType.WEEKLY: WEEKLY,
+    FrequencyType.MONTHLY: MONTHLY,
+    FrequencyType.YEARLY: YEARLY,
+}
+
+# dateutil weekday constants, indexed by Weekday
+WEEKDAYS = (MO, TU, WE, TH, FR, SA, SU)
+
+
+class CompiledRule:
+    """Read-only expansion parameters of a rule; ``params`` holds the rrule keyword arguments."""
+    __slots__ = ('params', 'rrule')
+
+    def __init__(self, params, rrule=''):
+        object.__setattr__(self, 'params', MappingProxyType(params))
+        object.__setattr__(self, 'rrule', rrule)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('CompiledRule is immutable')
+
+    def __reduce__(self):
+        # Compiled rules are shipped to expansion worker processes
+        return CompiledRule, (dict(self.params), self.rrule)
+
+    def __repr__(self):
+        return f'<CompiledRule {self.rrule}>'
+
+
+def build(rule):
+    byweekday = None
+    if rule.frequency == FrequencyType.WEEKLY:
+        weekdays = rule.weekday_list()
+        if weekdays:
+            byweekday = tuple(WEEKDAYS[day] for day in weekdays)
+
+    bymonthday = rule.month_day if rule.frequency == FrequencyType.MONTHLY and rule.month_day else None
+
+    # Relative weekdays (e.g., 2nd Friday of the month, or the last one with MonthWeek.LAST = -1)
+    bysetpos = None
+    if (rule.frequency == FrequencyType.MONTHLY and
+            rule.week_of_month is not None and rule.weekday_of_month is not None):
+        byweekday = WEEKDAYS[rule.weekday_of_month]
+        bysetpos = rule.week_of_month
+
+    params = {
+        'freq': FREQUENCIES[rule.frequency],
+        'interval': rule.interval,
+        'count': rule.count or None,
+        'byweekday': byweekday,
+        'bymonthday': bymonthday,
+        'bysetpos': bysetpos,
+        'bymonth': rule.month if rule.frequency == FrequencyType.YEARLY and rule.month else None,
+    }
+    return CompiledRule(params, rule.rrule or rule.build_rrule())
+
+
+compiled_rules = LRUBackend(max_entries=10000)
+
+
+def compile_rule(rule):
+    """
+    The memoized ``CompiledRule`` of ``rule``; unsaved rules are compiled every
+    time. Code that edits a saved rule in memory must bump ``updated_at``
+    before expanding it, as ``save()`` does.
+    """
+    if rule.pk is None or rule.updated_at is None:
+        return build(rule)
+    key = (rule.pk, rule.updated_at)
+    compiled = compiled_rules.get(rule.event_id, key)
+    if compiled is None:
+        compiled = build(rule)
+        compiled_rules.set(rule.event_id, key, compiled)
+    return compiled
@@ -1,8 +1,16 @@
-from rest_framework import serializers
-from .models import Event, RecurrenceRule, FrequencyType, Weekday, Month, MonthWeek
+from rest_framework import serializers, status
+from rest_framework.exceptions import APIException
+from django.db import transaction
+from django.db import models
+from django.db.models import prefetch_related_objects
+from .cache import occurrence_cache
+from .models import ChangeSequence, Event, Occurrence, RecurrenceRule, FrequencyType, Weekday, Month, MonthWeek
 from .services import RecurrenceService
+from .timezones import is_valid_zone
 from django.utils import timezone
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.conf import settings
+from itertools import islice
 from drf_yasg.utils import swagger_serializer_method
 
 class RecurrenceRuleSerializer(serializers.ModelSerializer):
@@ -43,17 +51,240 @@ class RecurrenceRuleSerializer(serializers.ModelSerializer):
             }
         }
 
+    def validate_weekdays(self, value):
+        if not value:
+            return value
+        days = [day.strip() for day in value.split(',')]
+        if not all(day.isdigit() and int(day) in Weekday.values for day in days):
+            raise serializers.ValidationError("Weekdays must be comma-separated numbers from 0 (Monday) to 6.")
+        return ','.join(days)
+
+class ConflictSerializer(serializers.Serializer):
+    event_id = serializers.IntegerField()
+    title = serializers.CharField()
+    start_time = serializers.DateTimeField()
+    end_time = serializers.DateTimeField()
+    candidate_start_time = serializers.DateTimeField()
+    candidate_end_time = serializers.DateTimeField()
+
+class ConflictError(APIException):
+    """
+    Refuses a write with ``reject_conflicts`` set, listing the conflicts.
+    Unlike a ValidationError, whose details all become strings, the
+    conflicts keep the types ``check_conflicts`` reports them with.
+    """
+    status_code = status.HTTP_400_BAD_REQUEST
+    default_detail = "The event overlaps existing events."
+    default_code = 'conflict'
+    
+    def __init__(self, conflicts):
+        super().__init__()
+        self.detail = {'conflicts': ConflictSerializer(conflicts, many=True).data}
+
+class ConflictCheckSerializer(serializers.Serializer):
+    start_time = serializers.DateTimeField(help_text="Start date and time of the candidate event")
+    end_time = serializers.DateTimeField(help_text="End date and time of the candidate event")
+    is_recurring = serializers.BooleanField(default=False, help_text="Whether the candidate repeats")
+    tzid = serializers.CharField(default='UTC', help_text="IANA time zone the candidate repeats in")
+    recurrence_rule = RecurrenceRuleSerializer(required=False, allow_null=True)
+    exclude_event = serializers.IntegerField(
+        required=False,
+        help_text="Id of an event to ignore, e.g. the one being edited"
+    )
+    start_date = serializers.DateTimeField(
+        required=False,
+        help_text="Only check occurrences of a recurring candidate from this time"
+    )
+    end_date = serializers.DateTimeField(
+        required=False,
+        help_text="Only check occurrences of a recurring candidate until this time"
+    )
+    limit = serializers.IntegerField(
+        default=100, min_value=1, max_value=1000,
+        help_text="Maximum number of conflicts to report"
+    )
+    
+    def validate_tzid(self, value):
+        if not is_valid_zone(value):
+            raise serializers.ValidationError("Unknown time zone.")
+        return value
+    
+    def validate(self, data):
+        if data['start_time'] >= data['end_time']:
+            raise serializers.ValidationError("End time must be after start time.")
+        
+        if data['is_recurring'] and not data.get('recurrence_rule'):
+            raise serializers.ValidationError("Recurrence rule is required for recurring events.")
+        
+        return data
+
+def parse_event_ids(values):
+    """
+    Coerce the event ids named by a bulk request to ints. Returns them along
+    with one error dict per item (empty when the id is fine), in request
+    order like the other bulk errors; an id named twice is an error too.
+    """
+    field = serializers.IntegerField(min_value=1)
+    ids, errors, seen = [], [], set()
+    for value in values:
+        try:
+            pk = field.run_validation(value)
+        except serializers.ValidationError as exc:
+            ids.append(None)
+            errors.append({'id': exc.detail})
+            continue
+        errors.append({'id': [f"Duplicate id {pk}."]} if pk in seen else {})
+        ids.append(pk)
+        seen.add(pk)
+    return ids, errors
+
+
+class BulkEventListSerializer(serializers.ListSerializer):
+    """
+    Writes many events at once: every insert and update goes through
+    bulk_create/bulk_update, so the number of queries does not grow with the
+    batch. Bulk writes bypass model signals, so the occurrence index, the
+    series end and the occurrence cache are maintained here explicitly.
+    """
+    
+    def to_representation(self, data):
+        window = self.child.context.get('occurrence_window')
+        if window is None:
+            return super().to_representation(data)
+        
+        events = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        expanded = RecurrenceService.generate_many(events, *window)
+        self.child.context['expanded_occurrences'] = {
+            event.pk: occurrences for event, occurrences in zip(events, expanded)
+        }
+        try:
+            return super().to_representation(events)
+        finally:
+            del self.child.context['expanded_occurrences']
+    
+    def to_internal_value(self, data):
+        if self.instance is not None and isinstance(data, list):
+            self.parsed_ids = iter(zip(*parse_event_ids(
+                item.get('id', serializers.empty) if isinstance(item, dict) else None for item in data
+            )))
+        return super().to_internal_value(data)
+    
+    def run_child_validation(self, data):
+        if self.instance is None:
+            return super().run_child_validation(data)
+        
+        # Updates name their event by id, parsed up front by to_internal_value
+        pk, error = next(self.parsed_ids)
+        if not isinstance(data, dict):
+            pk, error = None, {'id': ["Event not found."]}
+        if error:
+            raise serializers.ValidationError(error)
+        instance = self.instance.get(pk)
+        if instance is None:
+            raise serializers.ValidationError({'id': ["Event not found."]})
+        self.child.instance = instance
+        try:
+            return {**super().run_child_validation(data), 'id': pk}
+        finally:
+            self.child.instance = None
+    
+    def create(self, validated_data):
+        user = self.context['request'].user
+        events = []
+        rules = []
+        for data in validated_data:
+            recurrence_rule_data = data.pop('recurrence_rule', None)
+            event = Event(user=user, **data)
+            if event.is_recurring and recurrence_rule_data:
+                rule = RecurrenceRule(event=event, **recurrence_rule_data)
+                rule.refresh_derived_fields()
+                rules.append(rule)
+            # Unsaved events expand without touching the database
+            event.series_end = RecurrenceService.compute_series_end(event)
+            events.append(event)
+        
+        with transaction.atomic():
+            # The whole batch is one change for delta sync
+            sequence = ChangeSequence.allocate(user.pk)
+            for event in events:
+                event.sequence = sequence
+            Event.objects.bulk_create(events, batch_size=1000)
+            RecurrenceRule.objects.bulk_create(rules, batch_size=1000)
+            RecurrenceService.index_many(events, apply_exceptions=False)
+        # Caches the missing rules of one-off events so rendering them does not query per event
+        prefetch_related_objects(events, 'recurrence_rule')
+        return events
+    
+    def update(self, instance, validated_data):
+        events = [instance[data.pop('id')] for data in validated_data]
+        fields = {'updated_at', 'series_end', 'sequence'}
+        new_rules, changed_rules, dropped_rules = [], [], []
+        now = timezone.now()
+        for event, data in zip(events, validated_data):
+            recurrence_rule_data = data.pop('recurrence_rule', None)
+            for attr, value in data.items():
+                setattr(event, attr, value)
+            fields.update(data)
+            # bulk_update skips auto_now
+            event.updated_at = now
+            
+            rule = getattr(event, 'recurrence_rule', None)
+            if event.is_recurring and recurrence_rule_data:
+                if rule is None:
+                    rule = RecurrenceRule(event=event, **recurrence_rule_data)
+                    new_rules.append(rule)
+                else:
+                    for attr, value in recurrence_rule_data.items():
+                        setattr(rule, attr, value)
+                    # A new updated_at also retires the memoized compiled rule
+                    rule.updated_at = now
+                    changed_rules.append(rule)
+                rule.refresh_derived_fields()
+            elif not event.is_recurring and rule is not None:
+                dropped_rules.append(rule.pk)
+                event.recurrence_rule = None
+            event.series_end = RecurrenceService.compute_series_end(event)
+        
+        with transaction.atomic():
+            sequence = ChangeSequence.allocate(self.context['request'].user.pk)
+            for event in events:
+                event.sequence = sequence
+            Event.objects.bulk_update(events, fields, batch_size=1000)
+            RecurrenceRule.objects.filter(pk__in=dropped_rules).delete()
+            RecurrenceRule.objects.bulk_create(new_rules, batch_size=1000)
+            if changed_rules:
+                RecurrenceRule.objects.bulk_update(
+                    changed_rules,
+                    RecurrenceRuleSerializer.Meta.fields + ['weekday_mask', 'rrule', 'updated_at'],
+                    batch_size=1000
+                )
+            Occurrence.objects.filter(event__in=events).delete()
+            RecurrenceService.index_many(events)
+        
+        for event in events:
+            occurrence_cache.invalidate(event.pk)
+        prefetch_related_objects(events, 'recurrence_rule')
+        return events
+
 class EventSerializer(serializers.ModelSerializer):
     recurrence_rule = RecurrenceRuleSerializer(required=False, allow_null=True)
     occurrences = serializers.SerializerMethodField()
+    reject_conflicts = serializers.BooleanField(
+        write_only=True,
+        required=False,
+        default=False,
+        help_text="Refuse the write if the event overlaps an existing event"
+    )
     
     class Meta:
         model = Event
         fields = [
             'id', 'title', 'description', 'start_time', 'end_time',
-            'is_recurring', 'recurrence_rule', 'created_at', 'updated_at', 'occurrences'
+            'is_recurring', 'tzid', 'recurrence_rule', 'created_at', 'updated_at', 'occurrences',
+            'reject_conflicts'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at', 'occurrences']
+        list_serializer_class = BulkEventListSerializer
         extra_kwargs = {
             'title': {
                 'help_text': "Title of the event"
@@ -71,37 +302,85 @@ class EventSerializer(serializers.ModelSerializer):
             },
             'is_recurring': {
                 'help_text': "Whether the event repeats"
+            },
+            'tzid': {
+                'help_text': "IANA time zone the event repeats in, e.g. America/New_York (default UTC)"
             }
         }
     
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Sparse fieldsets of read requests, see EventViewSet.get_fieldset
+        fieldset = self.context.get('fieldset')
+        if fieldset is not None:
+            for field in set(self.fields) - fieldset:
+                del self.fields[field]
+    
     @swagger_serializer_method(serializer_or_field=serializers.ListField)
     def get_occurrences(self, obj):
-        request = self.context.get('request')
-        if request and request.query_params.get('show_occurrences') == 'true':
-            start_date = request.query_params.get('start_date')
-            end_date = request.query_params.get('end_date')
-            
-            start_date = timezone.datetime.strptime(start_date, '%Y-%m-%d').date() if start_date else None
-            end_date = timezone.datetime.strptime(end_date, '%Y-%m-%d').date() if end_date else None
-            
-            if start_date:
-                start_date = timezone.make_aware(timezone.datetime.combine(start_date, timezone.datetime.min.time()))
-            if end_date:
-                end_date = timezone.make_aware(timezone.datetime.combine(end_date, timezone.datetime.max.time()))
-            
-            return RecurrenceService.generate_occurrences(obj, start_date, end_date)
-        return None
+        # Lists expand every event up front in one batch
+        expanded = self.context.get('expanded_occurrences')
+        if expanded is not None and obj.pk in expanded:
+            return expanded[obj.pk]
+        # Parsed by the view (see events.views.occurrence_window)
+        window = self.context.get('occurrence_window')
+        if window is None:
+            return None
+        return RecurrenceService.generate_occurrences(obj, *window)
+    
+    def validate_tzid(self, value):
+        if not is_valid_zone(value):
+            raise serializers.ValidationError("Unknown time zone.")
+        return value
     
     def validate(self, data):
-        if data['start_time'] >= data['end_time']:
+        # Partial updates only carry the changed fields; the rest comes from the instance
+        start_time = data.get('start_time', getattr(self.instance, 'start_time', None))
+        end_time = data.get('end_time', getattr(self.instance, 'end_time', None))
+        is_recurring = data.get('is_recurring', getattr(self.instance, 'is_recurring', False))
+        tzid = data.get('tzid', getattr(self.instance, 'tzid', 'UTC'))
+        recurrence_rule = data.get('recurrence_rule')
+        if 'recurrence_rule' not in data and self.instance is not None:
+            recurrence_rule = getattr(self.instance, 'recurrence_rule', None)
+        
+        if start_time >= end_time:
             raise serializers.ValidationError("End time must be after start time.")
         
-        if data.get('is_recurring') and not data.get('recurrence_rule'):
+        if is_recurring and not recurrence_rule:
             raise serializers.ValidationError("Recurrence rule is required for recurring events.")
         
-        if not data.get('is_recurring') and data.get('recurrence_rule'):
+        if not is_recurring and data.get('recurrence_rule'):
             raise serializers.ValidationError("Recurrence rule should not be provided for non-recurring events.")
         
+        # Expanding the series must not run past the largest representable date
+        latest_start = (
+            datetime.max.replace(tzinfo=dt_timezone.utc) - timedelta(days=settings.EVENT_SERIES_SCAN_DAYS + 366)
+        )
+        if is_recurring and start_time > latest_start:
+            raise serializers.ValidationError(f"Recurring events must start before {latest_start.year}.")
+        
+        if data.pop('reject_conflicts', False):
+            if isinstance(recurrence_rule, RecurrenceRule):
+                recurrence_rule = {
+                    field: getattr(recurrence_rule, field) for field in RecurrenceRuleSerializer.Meta.fields
+                }
+            candidate = RecurrenceService.build_candidate(
+                self.context['request'].user,
+                start_time,
+                end_time,
+                is_recurring,
+                recurrence_rule,
+                tzid
+            )
+            conflicts = list(islice(
+                RecurrenceService.iter_conflicts(
+                    candidate, exclude_event_id=self.instance.pk if self.instance else None
+                ),
+                10
+            ))
+            if conflicts:
+                raise ConflictError(conflicts)
+        
         return data
     
     def create(self, validated_data):
@@ -113,6 +392,8 @@ class EventSerializer(serializers.ModelSerializer):
         if validated_data['is_recurring'] and recurrence_rule_data:
             RecurrenceRule.objects.create(event=event, **recurrence_rule_data)
         
+        RecurrenceService.refresh_series_end(event)
+        RecurrenceService.refresh_occurrence_index(event)
         return event
     
     def update(self, instance, validated_data):
@@ -134,4 +415,66 @@ class EventSerializer(serializers.ModelSerializer):
         elif hasattr(instance, 'recurrence_rule'):
             instance.recurrence_rule.delete()
         
-        return instance
\ No newline at end of file
+        RecurrenceService.refresh_series_end(instance)
+        RecurrenceService.refresh_occurrence_index(instance)
+        return instance
+
+
+class EventRowSerializer:
+    """
+    Read-only fast path of ``EventSerializer`` for event lists without
+    occurrences. Each representation is built straight from a ``.values()``
+    row of the event joined with its recurrence rule, with no model instances
+    and none of DRF's per-field machinery; the output is identical. A
+    ``fieldset`` limits both the columns read and the fields written.
+    """
+    fields = [field for field in EventSerializer.Meta.fields if field != 'reject_conflicts']
+    datetime_fields = {'start_time', 'end_time', 'created_at', 'updated_at'}
+    rule_fields = RecurrenceRuleSerializer.Meta.fields
+    rule_columns = ['recurrence_rule__' + field for field in rule_fields]
+    
+    @classmethod
+    def selected(cls, fieldset):
+        return cls.fields if fieldset is None else [field for field in cls.fields if field in fieldset]
+    
+    @classmethod
+    def values(cls, queryset, fieldset=None):
+        """The rows of ``queryset`` this serializer reads, in one query."""
+        selected = cls.selected(fieldset)
+        # Pagination cursors need id and start_time whatever is selected
+        columns = {'id', 'start_time', *selected} - {'recurrence_rule', 'occurrences'}
+        if 'recurrence_rule' in selected:
+            columns.update(['recurrence_rule__id', *cls.rule_columns])
+        return queryset.select_related(None).prefetch_related(None).values(*columns)
+    
+    @classmethod
+    def to_representation(cls, rows, fieldset=None):
+        selected = cls.selected(fieldset)
+        # DateTimeField renders in the current time zone, resolved once per list
+        zone = timezone.get_current_timezone()
+        
+        def datetime_value(value):
+            if value is None:
+                return None
+            value = value.astimezone(zone).isoformat()
+            return value[:-6] + 'Z' if value.endswith('+00:00') else value
+        
+        data = []
+        for row in rows:
+            item = {}
+            for field in selected:
+                if field in cls.datetime_fields:
+                    item[field] = datetime_value(row[field])
+                elif field == 'recurrence_rule':
+                    if row['recurrence_rule__id'] is None:
+                        item[field] = None
+                    else:
+                        rule = {name: row[column] for name, column in zip(cls.rule_fields, cls.rule_columns)}
+                        rule['until'] = datetime_value(rule['until'])
+                        item[field] = rule
+                elif field == 'occurrences':
+                    item[field] = None
+                else:
+                    item[field] = row[field]
+            data.append(item)
+        return data
@@ -1,10 +1,44 @@
 from dateutil.rrule import rrule, DAILY, WEEKLY, MONTHLY, YEARLY, MO, TU, WE, TH, FR, SA, SU
 from dateutil.relativedelta import relativedelta
-from datetime import datetime, timedelta
-from .models import FrequencyType, Weekday, MonthWeek
+from datetime import datetime, timedelta, timezone as dt_timezone
+from asgiref.sync import sync_to_async
+from .cache import occurrence_cache
+from .intervals import IntervalIndex
+from .models import Event, Occurrence, OccurrenceException, RecurrenceRule, Tombstone, FrequencyType, Weekday, MonthWeek
+from .rules import compile_rule
+from .timezones import get_zone, to_utc
+from concurrent.futures import ProcessPoolExecutor
+from django.conf import settings
+from django.db import models, transaction
 from django.utils import timezone
+from itertools import chain, repeat
+from array import array
+import calendar
+import heapq
 import math
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+# How far the occurrence index may lag the horizon before it is extended
+INDEX_EXTENSION_SLACK = timedelta(days=1)
+# Keys of every occurrence dict; overrides add original_start_time and title
+OCCURRENCE_KEYS = ('start_time', 'end_time', 'event_id', 'is_original')
+
+_pools = {}
+
+
+def expansion_pool(workers):
+    """A process pool of ``workers`` processes, started once and reused by later batches."""
+    if workers not in _pools:
+        _pools[workers] = ProcessPoolExecutor(max_workers=workers)
+    return _pools[workers]
+
+
 class RecurrenceService:
     @staticmethod
     def get_weekday_mapping():
@@ -19,105 +53,862 @@ class RecurrenceService:
         }
 
     @staticmethod
-    def generate_occurrences(event, start_date=None, end_date=None):
+    def generate_occurrences(event, start_date=None, end_date=None, seek=True, vectorized=True):
+        """
+        Expand ``event`` into a list of occurrences. Bounded windows of saved
+        events are served from the occurrence cache; the returned list is
+        shared and must not be mutated.
+        """
+        if event.pk is None or end_date is None:
+            # Open windows default to a horizon relative to now and cannot be cached
+            return list(RecurrenceService.iter_occurrences(event, start_date, end_date, seek, vectorized))
+        return occurrence_cache.get_or_compute(
+            event, start_date, end_date,
+            lambda: list(RecurrenceService.iter_occurrences(event, start_date, end_date, seek, vectorized))
+        )
+
+    @staticmethod
+    def series_payload(event):
+        """
+        What a worker process needs to expand a recurring event: its timing,
+        its compiled rule and its exceptions as plain tuples, which pickle far
+        smaller and faster than the model instances.
+        """
+        rule = event.recurrence_rule
+        exceptions = () if event.pk is None else tuple(
+            (exception.original_start, exception.start_time, exception.end_time,
+             exception.is_cancelled, exception.title)
+            for exception in event.exceptions.all()
+        )
+        return (
+            event.id, event.start_time, event.end_time, event.tzid,
+            rule.until, compile_rule(rule), exceptions
+        )
+
+    @staticmethod
+    def expand_payloads(payloads, start_date, end_date):
+        """Expand a chunk of ``series_payload`` tuples; the unit of work run by worker processes."""
+        results = []
+        for event_id, start_time, end_time, tzid, until, compiled, exceptions in payloads:
+            event = Event(id=event_id, start_time=start_time, end_time=end_time, is_recurring=True, tzid=tzid)
+            RecurrenceRule(event=event, until=until)
+            occurrences = RecurrenceService.iter_series(event, start_date, end_date, compiled=compiled)
+            if exceptions:
+                occurrences = RecurrenceService.apply_exceptions(
+                    event,
+                    occurrences,
+                    [
+                        OccurrenceException(
+                            original_start=original_start, start_time=exception_start,
+                            end_time=exception_end, is_cancelled=is_cancelled, title=title
+                        )
+                        for original_start, exception_start, exception_end, is_cancelled, title in exceptions
+                    ],
+                    start_date,
+                    end_date
+                )
+            results.append(RecurrenceService.pack_occurrences(occurrences))
+        return results
+
+    @staticmethod
+    def pack_occurrences(occurrences):
+        """
+        Occurrences as columns of microsecond timestamps, plus the extra keys
+        of overrides by position. Pickling aware datetimes one by one would
+        cost workers more than expanding them.
+        """
+        starts, ends, originals, extras = array('q'), array('q'), bytearray(), {}
+        for position, occurrence in enumerate(occurrences):
+            starts.append((occurrence['start_time'] - EPOCH) // MICROSECOND)
+            ends.append((occurrence['end_time'] - EPOCH) // MICROSECOND)
+            originals.append(occurrence['is_original'])
+            if len(occurrence) > len(OCCURRENCE_KEYS):
+                extras[position] = {
+                    key: value for key, value in occurrence.items() if key not in OCCURRENCE_KEYS
+                }
+        return starts, ends, bytes(originals), extras
+
+    @staticmethod
+    def unpack_occurrences(event_id, packed):
+        """Rebuild the occurrence dicts of one event from ``pack_occurrences`` columns."""
+        starts, ends, originals, extras = packed
+        if np is not None:
+            start_times = [EPOCH + offset for offset in np.frombuffer(starts, 'int64').astype('timedelta64[us]').tolist()]
+            end_times = [EPOCH + offset for offset in np.frombuffer(ends, 'int64').astype('timedelta64[us]').tolist()]
+        else:
+            start_times = [EPOCH + timedelta(microseconds=value) for value in starts]
+            end_times = [EPOCH + timedelta(microseconds=value) for value in ends]
+        occurrences = [
+            {'start_time': start_time, 'end_time': end_time, 'event_id': event_id, 'is_original': bool(is_original)}
+            for start_time, end_time, is_original in zip(start_times, end_times, originals)
+        ]
+        for position, extra in extras.items():
+            occurrences[position].update(extra)
+        return occurrences
+
+    @staticmethod
+    def generate_many(events, start_date, end_date, workers=None):
+        """
+        Expand many events over the same window, returning one occurrence list
+        per event in order.
+
+        Windows are served from the occurrence cache when possible. When at
+        least ``EVENT_PARALLEL_MIN_SERIES`` series are left to expand and
+        ``workers`` (default ``EVENT_EXPANSION_WORKERS``) is above one, their
+        payloads are shipped to a process pool in chunks and the results are
+        cached; smaller batches expand serially, since pickling and
+        dispatching them would cost more than the expansion itself.
+        """
+        if workers is None:
+            workers = settings.EVENT_EXPANSION_WORKERS
+        cacheable = end_date is not None
+        results = [None] * len(events)
+        pending = []
+        for index, event in enumerate(events):
+            if not event.is_recurring:
+                results[index] = list(RecurrenceService.iter_series(event, start_date, end_date))
+                continue
+            if cacheable and event.pk is not None:
+                results[index] = occurrence_cache.get(event, start_date, end_date)
+            if results[index] is None:
+                pending.append(index)
+
+        if not workers or workers < 2 or len(pending) < settings.EVENT_PARALLEL_MIN_SERIES:
+            for index in pending:
+                results[index] = list(RecurrenceService.iter_occurrences(events[index], start_date, end_date))
+        else:
+            payloads = [RecurrenceService.series_payload(events[index]) for index in pending]
+            chunk_size = -(-len(payloads) // (workers * 4))
+            chunks = [payloads[offset:offset + chunk_size] for offset in range(0, len(payloads), chunk_size)]
+            expanded = expansion_pool(workers).map(
+                RecurrenceService.expand_payloads, chunks, repeat(start_date), repeat(end_date)
+            )
+            for index, packed in zip(pending, (item for chunk in expanded for item in chunk)):
+                results[index] = RecurrenceService.unpack_occurrences(events[index].id, packed)
+
+        if cacheable:
+            for index in pending:
+                if events[index].pk is not None:
+                    occurrence_cache.set(events[index], start_date, end_date, results[index])
+        return results
+
+    @staticmethod
+    def iter_occurrences(event, start_date=None, end_date=None, seek=True, vectorized=True):
+        """
+        Lazily yield the occurrences of ``event`` in chronological order, with
+        its cancelled and overridden occurrences applied.
+        """
+        occurrences = RecurrenceService.iter_series(event, start_date, end_date, seek, vectorized)
+        if not event.is_recurring or event.pk is None:
+            return occurrences
+        
+        # Served from the prefetch cache when the caller used prefetch_related('exceptions')
+        exceptions = event.exceptions.all()
+        if not exceptions:
+            return occurrences
+        return RecurrenceService.apply_exceptions(event, occurrences, exceptions, start_date, end_date)
+
+    @staticmethod
+    def apply_exceptions(event, occurrences, exceptions, start_date=None, end_date=None):
+        """
+        Merge exceptions into an occurrence stream the way an rruleset applies
+        EXDATE/RDATE: every exception suppresses the generated occurrence it
+        replaces, and overrides are merged back in at their new time. Each
+        occurrence costs one dict lookup, whatever the number of exceptions.
+        """
+        by_original_start = {exception.original_start: exception for exception in exceptions}
+        duration = event.end_time - event.start_time
+        overrides = []
+        for exception in exceptions:
+            if exception.is_cancelled:
+                continue
+            start_time = exception.start_time or exception.original_start
+            if (start_date and start_time < start_date) or (end_date and start_time > end_date):
+                continue
+            override = {
+                'start_time': start_time,
+                'end_time': exception.end_time or start_time + duration,
+                'event_id': event.id,
+                'is_original': False,
+                'original_start_time': exception.original_start
+            }
+            if exception.title:
+                override['title'] = exception.title
+            overrides.append(override)
+        overrides.sort(key=lambda occurrence: occurrence['start_time'])
+        
+        remaining = (
+            occurrence for occurrence in occurrences
+            if occurrence['start_time'] not in by_original_start
+        )
+        return heapq.merge(remaining, overrides, key=lambda occurrence: occurrence['start_time'])
+
+    @staticmethod
+    def iter_series(event, start_date=None, end_date=None, seek=True, vectorized=True, compiled=None):
+        """
+        Lazily yield the occurrences generated by the recurrence rule alone.
+        ``compiled`` stands in for the event's rule where only it was shipped.
+        """
         if not event.is_recurring:
-            return [{
+            yield {
                 'start_time': event.start_time,
                 'end_time': event.end_time,
                 'event_id': event.id,
                 'is_original': True
-            }]
+            }
+            return
 
         rule = event.recurrence_rule
-        freq_mapping = {
-            FrequencyType.DAILY: DAILY,
-            FrequencyType.WEEKLY: WEEKLY,
-            FrequencyType.MONTHLY: MONTHLY,
-            FrequencyType.YEARLY: YEARLY,
-        }
-        
-        freq = freq_mapping[rule.frequency]
-        interval = rule.interval
-        dtstart = event.start_time
+        params = (compiled or compile_rule(rule)).params
+        # Series repeat in local wall time, so 9:00 stays 9:00 across DST changes
+        zone = get_zone(event.tzid)
+        dtstart = event.start_time.astimezone(zone or dt_timezone.utc)
         until = rule.until or end_date or (timezone.now() + timedelta(days=365*2))
+        duration = event.end_time - event.start_time
         
-        # Handle count if provided
-        count = rule.count if rule.count else None
-        
-        # Handle weekdays for weekly recurrence
-        byweekday = None
-        if rule.frequency == FrequencyType.WEEKLY and rule.weekdays:
-            weekday_mapping = RecurrenceService.get_weekday_mapping()
-            weekdays = [int(day) for day in rule.weekdays.split(',')]
-            byweekday = [weekday_mapping[day] for day in weekdays]
-        
-        # Handle month day for monthly recurrence
-        bymonthday = rule.month_day if rule.frequency == FrequencyType.MONTHLY and rule.month_day else None
-        
-        # Handle relative weekdays (e.g., 2nd Friday of the month)
-        if rule.frequency == FrequencyType.MONTHLY and rule.week_of_month and rule.weekday_of_month:
-            weekday_mapping = RecurrenceService.get_weekday_mapping()
-            byweekday = weekday_mapping[rule.weekday_of_month]
-            
-            if rule.week_of_month == MonthWeek.LAST:
-                occurrences = []
-                current_date = dtstart
-                while current_date <= until:
-                    # Find last weekday of month
-                    last_day = current_date.replace(day=28) + timedelta(days=4)
-                    last_day = last_day - timedelta(days=last_day.day)
-                    
-                    # Find the last occurrence of the weekday
-                    while last_day.weekday() != rule.weekday_of_month:
-                        last_day -= timedelta(days=1)
-                    
-                    if last_day >= current_date:
-                        occurrences.append(last_day)
-                    
-                    # Move to next month
-                    current_date = last_day + timedelta(days=1)
-                    current_date = current_date.replace(day=1)
-                
-                return [{
-                    'start_time': dt,
-                    'end_time': dt + (event.end_time - event.start_time),
-                    'event_id': event.id,
-                    'is_original': False
-                } for dt in occurrences]
+        if vectorized:
+            if zone is None:
+                starts = RecurrenceService.vectorized_starts(dtstart, until, start_date, end_date, params)
             else:
-                # For non-last week of month
-                bysetpos = rule.week_of_month
-        else:
-            bysetpos = None
+                # Wall-clock bounds are off by up to a DST shift; widen them and filter in UTC below
+                margin = timedelta(days=1)
+                starts = RecurrenceService.vectorized_starts(
+                    dtstart, until + margin,
+                    start_date - margin if start_date else None,
+                    end_date + margin if end_date else None,
+                    params
+                )
+                if starts is not None:
+                    starts = to_utc(starts, event.tzid)
+            if starts is not None:
+                # Offsets from an aware anchor avoid a costly replace(tzinfo=...) per datetime
+                anchor = (dtstart if zone is None else dtstart.astimezone(dt_timezone.utc)).replace(microsecond=0)
+                offsets = (starts - np.datetime64(anchor.replace(tzinfo=None), 'us')).tolist()
+                upper = min(until, end_date) if end_date else until
+                for dt in (anchor + offset for offset in offsets):
+                    if zone is not None and ((start_date and dt < start_date) or dt > upper):
+                        continue
+                    yield {
+                        'start_time': dt,
+                        'end_time': dt + duration,
+                        'event_id': event.id,
+                        'is_original': dt == dtstart
+                    }
+                return
         
-        # Handle yearly recurrence with specific month
-        bymonth = rule.month if rule.frequency == FrequencyType.YEARLY and rule.month else None
+        # Start iterating at the period holding start_date rather than at dtstart
+        rr_start = dtstart
+        if seek and start_date:
+            rr_start, params = RecurrenceService.seek(dtstart, start_date, params)
+            if rr_start is None:
+                return
         
         # Generate occurrences using rrule
-        rr = rrule(
-            freq=freq,
-            interval=interval,
-            dtstart=dtstart,
-            until=until,
-            count=count,
-            byweekday=byweekday,
-            bymonthday=bymonthday,
-            bysetpos=bysetpos,
-            bymonth=bymonth
-        )
+        rr = rrule(dtstart=rr_start, until=until, **params)
         
-        occurrences = []
         for dt in rr:
             if start_date and dt < start_date:
                 continue
             if end_date and dt > end_date:
                 break
+            if zone is not None:
+                dt = dt.astimezone(dt_timezone.utc)
                 
-            occurrences.append({
+            yield {
                 'start_time': dt,
-                'end_time': dt + (event.end_time - event.start_time),
+                'end_time': dt + duration,
                 'event_id': event.id,
                 'is_original': dt == dtstart
-            })
+            }
+
+    @staticmethod
+    def merge_occurrences(events, start_date, end_date):
+        """
+        Merge the occurrences of many events into one stream ordered by start
+        time, expanding each series lazily with a heap-based k-way merge.
+        """
+        return heapq.merge(
+            *(
+                RecurrenceService.iter_occurrences(event, start_date, end_date, vectorized=False)
+                for event in events
+            ),
+            key=lambda occurrence: (occurrence['start_time'], occurrence['event_id'])
+        )
+
+    @staticmethod
+    def vectorized_starts(dtstart, until, start_date, end_date, params):
+        """
+        Compute every occurrence start in the window as one ``datetime64[us]``
+        array of wall-clock times in ``dtstart``'s zone; ``to_utc`` converts
+        them when that zone has DST.
+
+        Handles plain DAILY/WEEKLY rules, WEEKLY with a weekday set and MONTHLY
+        by day of month, matching rrule exactly (including ``count``, ``until``
+        and the first period being clipped at ``dtstart``). Returns ``None``
+        for anything else, or when NumPy is unavailable, so callers fall back
+        to dateutil.
+        """
+        freq = params['freq']
+        if np is None or params['bysetpos'] is not None or params['bymonth'] is not None:
+            return None
+        if freq not in (DAILY, WEEKLY, MONTHLY):
+            return None
+        if freq == MONTHLY and params['byweekday'] is not None:
+            return None
+        tzinfo = dtstart.tzinfo
+
+        def wall_time(value):
+            if tzinfo is not None:
+                value = value.astimezone(tzinfo)
+            return np.datetime64(value.replace(tzinfo=None), 'us')
+
+        base = dtstart.replace(tzinfo=None, microsecond=0)
+        first = np.datetime64(base, 'us')
+        upper = wall_time(min(until, end_date) if end_date else until)
+        lower = wall_time(start_date) if start_date else first
+        lower = max(lower, first)
+        if lower > upper:
+            return np.array([], dtype='datetime64[us]')
+
+        interval = params['interval']
+        count = params['count']
+        day = np.timedelta64(1, 'D')
+        time_of_day = first - first.astype('datetime64[D]')
+
+        if freq == DAILY:
+            step = np.timedelta64(interval, 'D')
+            low = -((first - lower) // step)
+            high = (upper - first) // step
+            if count:
+                high = min(high, count - 1)
+            return first + np.arange(low, high + 1) * step
+
+        if freq == WEEKLY:
+            byweekday = params['byweekday']
+            if byweekday is None:
+                weekdays = [base.weekday()]
+            else:
+                if not isinstance(byweekday, (list, tuple)):
+                    byweekday = [byweekday]
+                weekdays = sorted({getattr(weekday, 'weekday', weekday) for weekday in byweekday})
+            week_start = first.astype('datetime64[D]') - base.weekday() * day
+            step = np.timedelta64(7 * interval, 'D')
+            low = max(0, int((lower.astype('datetime64[D]') - week_start) // step))
+            high = int((upper.astype('datetime64[D]') - week_start) // step)
+            periods = np.arange(low, high + 1)
+            days = week_start + periods[:, None] * step + np.array(weekdays)[None, :] * day
+            starts = (days + time_of_day).ravel()
+            # Ordinal of each candidate within the series, counting from dtstart
+            skipped = sum(1 for weekday in weekdays if weekday < base.weekday())
+            ordinals = (periods[:, None] * len(weekdays) + np.arange(len(weekdays))[None, :]).ravel() - skipped
+        else:
+            month_day = params['bymonthday'] or base.day
+            first_month = first.astype('datetime64[M]')
+            months = np.arange(0, (upper.astype('datetime64[M]') - first_month).astype(int) // interval + 1)
+            month_starts = first_month + months * interval
+            month_lengths = (month_starts + 1).astype('datetime64[D]') - month_starts.astype('datetime64[D]')
+            valid = month_lengths >= np.timedelta64(month_day, 'D')
+            starts = month_starts.astype('datetime64[D]') + (month_day - 1) * day + time_of_day
+            valid &= starts >= first
+            starts = starts[valid]
+            ordinals = np.arange(len(starts))
+
+        keep = (starts >= lower) & (starts <= upper) & (ordinals >= 0)
+        if count:
+            keep &= ordinals < count
+        return starts[keep]
+
+    @staticmethod
+    def seek(dtstart, start_date, params):
+        """
+        Move an rrule's ``dtstart`` forward to the period containing ``start_date``.
+
+        Every period after the first expands identically wherever the series
+        started, so shifting ``dtstart`` by whole periods - with the by-rules
+        rrule would otherwise infer from ``dtstart`` spelled out - yields exactly
+        the tail of the original series. ``count`` is reduced by the number of
+        occurrences in the skipped periods. Returns ``(None, None)`` when the
+        series is exhausted before ``start_date``.
+        """
+        freq = params['freq']
+        interval = params['interval']
+        if dtstart.tzinfo is not None:
+            start_date = start_date.astimezone(dtstart.tzinfo)
+        first_day = dtstart.date()
+        target_day = start_date.date()
+        
+        if freq == DAILY:
+            periods = (target_day - first_day).days // interval
+        elif freq == WEEKLY:
+            week_start = first_day - timedelta(days=first_day.weekday())
+            periods = (target_day - week_start).days // 7 // interval
+        elif freq == MONTHLY:
+            periods = ((target_day.year - first_day.year) * 12 + target_day.month - first_day.month) // interval
+        else:
+            periods = (target_day.year - first_day.year) // interval
+        
+        if periods <= 0:
+            return dtstart, params
+        
+        seek_params = dict(params)
+        if params['byweekday'] is None and params['bymonthday'] is None:
+            if freq == YEARLY:
+                seek_params['bymonth'] = params['bymonth'] or dtstart.month
+                seek_params['bymonthday'] = dtstart.day
+            elif freq == MONTHLY:
+                seek_params['bymonthday'] = dtstart.day
+            elif freq == WEEKLY:
+                seek_params['byweekday'] = dtstart.weekday()
+
+        if params['count']:
+            skipped = RecurrenceService.count_before(dtstart, seek_params, periods)
+            if skipped is None:
+                # No closed form for this combination; iterate from dtstart
+                return dtstart, params
+            if skipped >= params['count']:
+                return None, None
+            seek_params['count'] = params['count'] - skipped
+
+        if freq == DAILY:
+            shifted = dtstart + timedelta(days=periods * interval)
+        elif freq == WEEKLY:
+            shifted = dtstart + timedelta(days=periods * interval * 7 - dtstart.weekday())
+        elif freq == MONTHLY:
+            shifted = dtstart.replace(day=1) + relativedelta(months=periods * interval)
+        else:
+            shifted = dtstart.replace(year=dtstart.year + periods * interval, month=1, day=1)
+        return shifted, seek_params
+
+    @staticmethod
+    def count_before(dtstart, params, periods):
+        """
+        Number of occurrences in the first ``periods`` periods of a series, or
+        ``None`` when the by-rule combination has no cheap closed form.
+        """
+        freq = params['freq']
+        interval = params['interval']
+        byweekday = params['byweekday']
+        bymonthday = params['bymonthday']
+
+        if freq == DAILY:
+            return periods
+
+        if freq == WEEKLY:
+            if not isinstance(byweekday, (list, tuple)):
+                byweekday = [byweekday]
+            weekdays = {getattr(day, 'weekday', day) for day in byweekday}
+            first_week = sum(1 for day in weekdays if day >= dtstart.weekday())
+            return first_week + (periods - 1) * len(weekdays)
+
+        if freq == MONTHLY and byweekday is None:
+            total = 0
+            for index in range(periods):
+                year, month = divmod(dtstart.year * 12 + dtstart.month - 1 + index * interval, 12)
+                if bymonthday <= calendar.monthrange(year, month + 1)[1] and (index or bymonthday >= dtstart.day):
+                    total += 1
+            return total
+
+        if freq == MONTHLY and bymonthday is None and params['bysetpos'] in (1, 2, 3, 4, -1):
+            # The n-th (n <= 4) and the last weekday exist in every month
+            first_of_month = dtstart.date().replace(day=1)
+            if params['bysetpos'] > 0:
+                day = 1 + (byweekday.weekday - first_of_month.weekday()) % 7 + (params['bysetpos'] - 1) * 7
+            else:
+                last_day = calendar.monthrange(dtstart.year, dtstart.month)[1]
+                day = last_day - (first_of_month.replace(day=last_day).weekday() - byweekday.weekday) % 7
+            return periods - (1 if day < dtstart.day else 0)
+
+        if freq == YEARLY and byweekday is None:
+            total = 0
+            for index in range(periods):
+                year = dtstart.year + index * interval
+                if bymonthday <= calendar.monthrange(year, params['bymonth'])[1] and (
+                    index or (params['bymonth'], bymonthday) >= (dtstart.month, dtstart.day)
+                ):
+                    total += 1
+            return total
+
+        return None
+
+    @staticmethod
+    def cancel_occurrence(event, occurrence_start):
+        """
+        Record the occurrence of ``event`` starting at ``occurrence_start`` as
+        cancelled. Returns ``False`` when the series has no such occurrence.
+        """
+        if not any(RecurrenceService.iter_series(event, occurrence_start, occurrence_start)):
+            return False
+        with transaction.atomic():
+            OccurrenceException.objects.update_or_create(
+                event=event,
+                original_start=occurrence_start,
+                defaults={'is_cancelled': True, 'start_time': None, 'end_time': None, 'title': None}
+            )
+            # Bump updated_at and the change sequence so cached windows and client copies see the change
+            event.save(update_fields=['updated_at'])
+            Tombstone.objects.create(
+                user_id=event.user_id,
+                event_id=event.pk,
+                original_start=occurrence_start,
+                sequence=event.sequence
+            )
+        RecurrenceService.refresh_occurrence_index(event)
+        return True
+
+    @staticmethod
+    def override_occurrence(event, original_start, start_time=None, end_time=None, title=None):
+        """
+        Move or retitle the occurrence of ``event`` starting at
+        ``original_start``; when the rule generates no occurrence there, the
+        override adds an extra one (an RDATE). Times left out keep the
+        original start and the series' duration.
+        """
+        with transaction.atomic():
+            OccurrenceException.objects.update_or_create(
+                event=event,
+                original_start=original_start,
+                defaults={'is_cancelled': False, 'start_time': start_time, 'end_time': end_time, 'title': title}
+            )
+            event.save(update_fields=['updated_at'])
+        RecurrenceService.refresh_occurrence_index(event)
+
+    @staticmethod
+    def occurrence_horizon():
+        return timezone.now() + timedelta(days=settings.EVENT_OCCURRENCE_HORIZON_DAYS)
+
+    @staticmethod
+    def compute_series_end(event):
+        """Start of the last occurrence of ``event``, or ``None`` for an open-ended series."""
+        if not event.is_recurring:
+            return event.start_time
+        
+        rule = event.recurrence_rule
+        if not rule.count:
+            # The last occurrence cannot start after until; that bound is enough for filtering
+            return rule.until
         
-        return occurrences
\ No newline at end of file
+        horizon = rule.until or event.start_time + timedelta(days=settings.EVENT_SERIES_SCAN_DAYS)
+        last = None
+        produced = 0
+        for produced, occurrence in enumerate(RecurrenceService.iter_occurrences(event, end_date=horizon), 1):
+            last = occurrence['start_time']
+        if produced < rule.count and not rule.until:
+            # The series outlives the scan horizon; treat it as open-ended
+            return None
+        return last
+
+    @staticmethod
+    def refresh_series_end(event):
+        event.series_end = RecurrenceService.compute_series_end(event)
+        Event.objects.filter(pk=event.pk).update(series_end=event.series_end)
+
+    @staticmethod
+    def refresh_occurrence_index(event):
+        """Drop and re-materialize the indexed occurrences of a single event."""
+        # Exceptions prefetched before they were just changed would be stale
+        getattr(event, '_prefetched_objects_cache', {}).pop('exceptions', None)
+        Occurrence.objects.filter(event=event).delete()
+        event.indexed_until = None
+        if event.is_recurring:
+            RecurrenceService.materialize_occurrences(event, RecurrenceService.occurrence_horizon())
+        else:
+            Event.objects.filter(pk=event.pk).update(indexed_until=None)
+
+    @staticmethod
+    def materialize_occurrences(event, until):
+        """
+        Index the occurrences of ``event`` between its current horizon and
+        ``until``. Rows another request already wrote for the same series are
+        skipped, so concurrent extensions cannot index an occurrence twice.
+        """
+        start = event.indexed_until + timedelta(microseconds=1) if event.indexed_until else None
+        Occurrence.objects.bulk_create([
+            Occurrence(
+                event=event,
+                user_id=event.user_id,
+                start_time=occurrence['start_time'],
+                end_time=occurrence['end_time']
+            )
+            for occurrence in RecurrenceService.iter_occurrences(event, start, until)
+            if start is None or occurrence['start_time'] >= start
+        ], ignore_conflicts=True)
+        event.indexed_until = until
+        # Bypass save() so moving the horizon does not touch updated_at
+        Event.objects.filter(pk=event.pk).update(indexed_until=until)
+
+    @staticmethod
+    def index_many(events, apply_exceptions=True):
+        """
+        Materialize the occurrence index of many just-written events with a
+        single insert, replacing nothing: callers drop stale rows first. New
+        events have no exceptions, so creators pass ``apply_exceptions=False``
+        to skip looking them up.
+        """
+        horizon = RecurrenceService.occurrence_horizon()
+        expand = RecurrenceService.iter_occurrences if apply_exceptions else RecurrenceService.iter_series
+        rows = []
+        for event in events:
+            event.indexed_until = horizon if event.is_recurring else None
+            if event.is_recurring:
+                rows.extend(
+                    Occurrence(
+                        event=event,
+                        user_id=event.user_id,
+                        start_time=occurrence['start_time'],
+                        end_time=occurrence['end_time']
+                    )
+                    for occurrence in expand(event, None, horizon)
+                )
+        Occurrence.objects.bulk_create(rows, batch_size=1000, ignore_conflicts=True)
+        for indexed_until in (horizon, None):
+            ids = [event.pk for event in events if event.indexed_until == indexed_until]
+            if ids:
+                Event.objects.filter(pk__in=ids).update(indexed_until=indexed_until)
+
+    @staticmethod
+    def stale_series(user, until):
+        """Open series of ``user`` whose occurrence index stops before ``until``."""
+        return Event.objects.filter(
+            models.Q(indexed_until__isnull=True) | models.Q(indexed_until__lt=until),
+            user=user,
+            is_recurring=True,
+            recurrence_rule__isnull=False
+        ).exclude(
+            series_end__lte=models.F('indexed_until')
+        ).select_related('recurrence_rule').prefetch_related('exceptions')
+
+    @staticmethod
+    def extension_bound(until):
+        """
+        How far a window ending at ``until`` needs the occurrence index to
+        reach: never past the occurrence horizon, less a day of slack so the
+        moving horizon does not re-extend every series on every request.
+        """
+        return min(until, RecurrenceService.occurrence_horizon() - INDEX_EXTENSION_SLACK)
+
+    @staticmethod
+    def extend_occurrence_index(user, until):
+        """
+        Lazily push the occurrence index of every open series of ``user``
+        towards ``until``, but never past the occurrence horizon: later
+        occurrences are expanded on the fly instead (see
+        ``unindexed_series``), so a far window cannot write rows without bound.
+        """
+        horizon = RecurrenceService.occurrence_horizon()
+        for event in RecurrenceService.stale_series(user, RecurrenceService.extension_bound(until)):
+            RecurrenceService.materialize_occurrences(event, horizon)
+
+    @staticmethod
+    async def aextend_occurrence_index(user, until):
+        """
+        ``extend_occurrence_index`` for async views: the check goes through the
+        async ORM, and only the rare extension itself runs in a sync thread.
+        """
+        if await RecurrenceService.stale_series(user, RecurrenceService.extension_bound(until)).aexists():
+            await sync_to_async(RecurrenceService.extend_occurrence_index)(user, until)
+
+    @staticmethod
+    def unindexed_occurrences(event, start_date, end_date, overlapping=False):
+        """
+        Occurrences of ``event`` starting in the window, or ``overlapping`` it,
+        that its occurrence index does not reach.
+        """
+        first_start = start_date - (event.end_time - event.start_time) if overlapping else start_date
+        if event.indexed_until is not None:
+            first_start = max(first_start, event.indexed_until + MICROSECOND)
+        return (
+            occurrence for occurrence in RecurrenceService.iter_occurrences(event, first_start, end_date)
+            if occurrence['start_time'] >= first_start and (not overlapping or occurrence['end_time'] > start_date)
+        )
+
+    @staticmethod
+    def unindexed_series(user, start_date, end_date, overlapping=False):
+        """
+        Open series of ``user`` with an occurrence in the window past the end
+        of their index, which only happens for windows reaching beyond the
+        extension bound. Each candidate is only expanded up to its first such
+        occurrence.
+        """
+        if end_date <= RecurrenceService.occurrence_horizon() - INDEX_EXTENSION_SLACK:
+            return []
+        candidates = RecurrenceService.stale_series(user, end_date).filter(
+            models.Q(series_end__isnull=True) | models.Q(series_end__gte=start_date),
+            start_time__lte=end_date
+        )
+        return [
+            event for event in candidates
+            if next(RecurrenceService.unindexed_occurrences(event, start_date, end_date, overlapping), None)
+            is not None
+        ]
+
+    @staticmethod
+    def prepare_window(user, start_date, end_date):
+        """
+        Get the occurrence index of ``user`` ready for a window query: extend
+        it as far as the window needs, and return the ids of the series only
+        found by expanding past the end of their index.
+        """
+        RecurrenceService.extend_occurrence_index(user, end_date)
+        return [event.pk for event in RecurrenceService.unindexed_series(user, start_date, end_date)]
+
+    @staticmethod
+    async def aprepare_window(user, start_date, end_date):
+        """``prepare_window`` for async views."""
+        await RecurrenceService.aextend_occurrence_index(user, end_date)
+        if end_date <= RecurrenceService.occurrence_horizon() - INDEX_EXTENSION_SLACK:
+            return []
+        return await sync_to_async(RecurrenceService.prepare_window)(user, start_date, end_date)
+
+    @staticmethod
+    def indexed_event_ids(user, start_date, end_date):
+        """
+        Ids of the recurring events of ``user`` with an indexed occurrence in
+        the window; callers extend the index first with ``prepare_window``.
+        """
+        return Occurrence.objects.filter(
+            user=user,
+            start_time__gte=start_date,
+            start_time__lte=end_date
+        ).values('event_id')
+
+    @staticmethod
+    def build_candidate(user, start_time, end_time, is_recurring=False, recurrence_rule=None, tzid='UTC'):
+        """An unsaved event (with its rule attached) to check before it is written."""
+        event = Event(user=user, start_time=start_time, end_time=end_time, is_recurring=is_recurring, tzid=tzid)
+        if is_recurring and recurrence_rule:
+            RecurrenceRule(event=event, **recurrence_rule)
+        return event
+
+    @staticmethod
+    def build_interval_index(user, start_date, end_date, exclude_event_id=None):
+        """
+        Interval index over the occurrences of ``user`` overlapping the window.
+        Series are read from the materialized occurrence index rather than
+        expanded, so building it costs two queries, plus the expansion of any
+        series the window reaches past the end of the index.
+        """
+        RecurrenceService.extend_occurrence_index(user, end_date)
+        unindexed = [
+            (occurrence['start_time'], occurrence['end_time'], (event.pk, event.title))
+            for event in RecurrenceService.unindexed_series(user, start_date, end_date, overlapping=True)
+            if event.pk != exclude_event_id
+            for occurrence in RecurrenceService.unindexed_occurrences(event, start_date, end_date, overlapping=True)
+        ]
+        series = Occurrence.objects.filter(
+            user=user,
+            start_time__lt=end_date,
+            end_time__gt=start_date
+        ).values_list('start_time', 'end_time', 'event_id', 'event__title')
+        one_offs = Event.objects.filter(
+            user=user,
+            is_recurring=False,
+            start_time__lt=end_date,
+            end_time__gt=start_date
+        ).values_list('start_time', 'end_time', 'id', 'title')
+        if exclude_event_id is not None:
+            series = series.exclude(event_id=exclude_event_id)
+            one_offs = one_offs.exclude(id=exclude_event_id)
+        return IntervalIndex([
+            (start, end, (event_id, title))
+            for start, end, event_id, title in chain(series, one_offs)
+        ] + unindexed)
+
+    @staticmethod
+    def iter_conflicts(candidate, start_date=None, end_date=None, exclude_event_id=None):
+        """
+        Lazily yield the existing occurrences that overlap an occurrence of
+        ``candidate``. A recurring candidate is checked between ``start_date``
+        and ``end_date`` (its start and the occurrence horizon by default),
+        one occurrence at a time, so callers that only need the first few
+        conflicts stop early; a one-off candidate only checks its own span.
+        """
+        if candidate.is_recurring:
+            start_date = start_date or candidate.start_time
+            end_date = end_date or RecurrenceService.occurrence_horizon()
+        else:
+            start_date, end_date = candidate.start_time, candidate.end_time
+        if start_date >= end_date:
+            return
+
+        index = RecurrenceService.build_interval_index(candidate.user, start_date, end_date, exclude_event_id)
+        if not index:
+            return
+        for occurrence in RecurrenceService.iter_occurrences(candidate, start_date, end_date):
+            for start, end, (event_id, title) in index.overlapping(occurrence['start_time'], occurrence['end_time']):
+                yield {
+                    'event_id': event_id,
+                    'title': title,
+                    'start_time': start,
+                    'end_time': end,
+                    'candidate_start_time': occurrence['start_time'],
+                    'candidate_end_time': occurrence['end_time']
+                }
+
+    @staticmethod
+    def merge_intervals(intervals):
+        """Coalesce ``(start, end)`` pairs sorted by start into disjoint busy blocks."""
+        current_start = current_end = None
+        for start, end in intervals:
+            if current_end is not None and start <= current_end:
+                current_end = max(current_end, end)
+                continue
+            if current_end is not None:
+                yield current_start, current_end
+            current_start, current_end = start, end
+        if current_end is not None:
+            yield current_start, current_end
+
+    @staticmethod
+    def busy_intervals(user_ids, start_date, end_date, workers=None):
+        """
+        Merged busy blocks of every user in ``user_ids`` within the window,
+        clipped to it. The number of queries does not depend on the number of
+        users: one-off events are read as plain tuples and every series is
+        loaded at once and expanded as a batch through ``generate_many``.
+        """
+        one_offs = Event.objects.filter(
+            user_id__in=user_ids,
+            is_recurring=False,
+            start_time__lt=end_date,
+            end_time__gt=start_date
+        ).values_list('user_id', 'start_time', 'end_time').order_by('start_time')
+        series = list(
+            Event.objects.filter(
+                models.Q(series_end__isnull=True) |
+                models.Q(series_end__gt=start_date - (models.F('end_time') - models.F('start_time'))),
+                user_id__in=user_ids,
+                is_recurring=True,
+                start_time__lt=end_date
+            ).select_related('recurrence_rule').prefetch_related('exceptions')
+        )
+        # Start the expansion early enough to catch occurrences already running at start_date
+        longest = max((event.end_time - event.start_time for event in series), default=timedelta(0))
+        expanded = RecurrenceService.generate_many(series, start_date - longest, end_date, workers)
+
+        per_user = {user_id: [[]] for user_id in user_ids}
+        for user_id, start, end in one_offs:
+            per_user[user_id][0].append((max(start, start_date), min(end, end_date)))
+        for event, occurrences in zip(series, expanded):
+            per_user[event.user_id].append(
+                (max(occurrence['start_time'], start_date), min(occurrence['end_time'], end_date))
+                for occurrence in occurrences
+                if occurrence['end_time'] > start_date and occurrence['start_time'] < end_date
+            )
+        return {
+            user_id: list(RecurrenceService.merge_intervals(heapq.merge(*streams)))
+            for user_id, streams in per_user.items()
+        }
+
+    @staticmethod
+    def free_slots(busy, start_date, end_date, min_duration=None):
+        """Gaps in the window not covered by any of the per-user busy lists."""
+        min_duration = min_duration or timedelta(0)
+        slots = []
+        cursor = start_date
+        # An empty block at end_date closes the trailing gap
+        for start, end in RecurrenceService.merge_intervals(heapq.merge(*busy, [(end_date, end_date)])):
+            gap = start - cursor
+            if gap > timedelta(0) and gap >= min_duration:
+                slots.append((cursor, start))
+            cursor = max(cursor, end)
+        return slots
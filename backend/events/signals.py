@@ -0,0 +1,16 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import occurrence_cache
+from .models import Event, OccurrenceException, RecurrenceRule
+
+
+@receiver([post_save, post_delete], sender=Event)
+def invalidate_event_occurrences(sender, instance, **kwargs):
+    occurrence_cache.invalidate(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=RecurrenceRule)
+@receiver([post_save, post_delete], sender=OccurrenceException)
+def invalidate_rule_occurrences(sender, instance, **kwargs):
+    occurrence_cache.invalidate(instance.event_id)
@@ -0,0 +1,122 @@
+"""
+Delta sync of a user's events.
+
+Every write to a user's events takes the next number of a per-user sequence
+(``ChangeSequence``): saved events carry it in ``Event.sequence``, while
+deleted events and cancelled occurrences leave a ``Tombstone`` holding it. A
+change token is the last sequence number a client has seen, so catching up
+reads only the events and tombstones above it through the ``(user,
+sequence)`` indexes, and costs the same whatever the size of the calendar.
+"""
+from heapq import merge
+
+from django.db import models, transaction
+
+from .models import ChangeSequence, Event, Tombstone
+
+
+class ChangeTokenError(ValueError):
+    """A change token that is malformed or belongs to no sequence of this user."""
+
+
+class ChangeTokenExpired(Exception):
+    """A change token older than the tombstones still kept; the client must resync."""
+
+
+def parse_token(token):
+    if token is None:
+        return None
+    try:
+        since = int(token)
+    except ValueError:
+        raise ChangeTokenError(token)
+    if since < 0:
+        raise ChangeTokenError(token)
+    return since
+
+
+def counter(user):
+    """``(value, pruned_through, changed_at)`` of the user's change sequence."""
+    return ChangeSequence.objects.filter(user=user).values_list(
+        'value', 'pruned_through', 'changed_at'
+    ).first() or (0, 0, None)
+
+
+async def acounter(user):
+    return await ChangeSequence.objects.filter(user=user).values_list(
+        'value', 'pruned_through', 'changed_at'
+    ).afirst() or (0, 0, None)
+
+
+def changes_since(user, since=None, limit=1000):
+    """
+    The user's changes after the ``since`` token, at most ``limit`` of them
+    (more when one bulk write shares a sequence number, as a page never splits
+    one). Without a token every event is returned and nothing is deleted.
+
+    Returns a dict with the changed ``events`` queryset, the ids of
+    ``deleted`` events, the ``cancelled`` occurrences as ``(event_id,
+    original_start)`` pairs, the ``token`` to send next time and whether the
+    client should ask again right away (``has_more``).
+    """
+    # Read first: every change numbered up to here has been committed
+    current, pruned_through, _ = counter(user)
+    if since is not None and since > current:
+        raise ChangeTokenError(since)
+    if since is not None and since < pruned_through:
+        raise ChangeTokenExpired(since)
+
+    events = Event.objects.filter(user=user, sequence__lte=current)
+    tombstones = Tombstone.objects.filter(user=user, sequence__lte=current)
+    if since is None:
+        # A first sync gets every event and has nothing to delete
+        since = -1
+        tombstones = tombstones.none()
+    events = events.filter(sequence__gt=since)
+    tombstones = tombstones.filter(sequence__gt=since)
+
+    sequences = list(merge(
+        events.order_by('sequence').values_list('sequence', flat=True)[:limit + 1],
+        tombstones.order_by('sequence').values_list('sequence', flat=True)[:limit + 1]
+    ))
+    until = sequences[limit - 1] if len(sequences) > limit else current
+
+    tombstones = list(tombstones.filter(sequence__lte=until).values_list('event_id', 'original_start'))
+    return {
+        'events': events.filter(sequence__lte=until).select_related('recurrence_rule')
+                        .prefetch_related('exceptions').order_by('sequence', 'id'),
+        'deleted': [event_id for event_id, original_start in tombstones if original_start is None],
+        'cancelled': [
+            (event_id, original_start) for event_id, original_start in tombstones if original_start is not None
+        ],
+        'token': str(max(until, since, 0)),
+        'has_more': until < current,
+    }
+
+
+def delete_events(user, events):
+    """Delete ``events`` of ``user``, leaving a tombstone for each under one sequence number."""
+    with transaction.atomic():
+        sequence = ChangeSequence.allocate(user.pk)
+        Tombstone.objects.bulk_create(
+            [Tombstone(user=user, event_id=event_id, sequence=sequence)
+             for event_id in events.values_list('pk', flat=True)],
+            batch_size=1000
+        )
+        events.delete()
+
+
+def prune_tombstones(older_than):
+    """
+    Drop tombstones created before ``older_than``. Tokens from before the
+    newest pruned tombstone of a user are refused from then on, as they
+    would silently miss its deletion.
+    """
+    stale = Tombstone.objects.filter(created_at__lt=older_than)
+    with transaction.atomic():
+        pruned = stale.order_by().values('user').annotate(through=models.Max('sequence'))
+        for row in pruned:
+            ChangeSequence.objects.filter(
+                user_id=row['user'], pruned_through__lt=row['through']
+            ).update(pruned_through=row['through'])
+        return stale.delete()[0]
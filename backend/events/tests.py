@@ -1,3 +1,1476 @@
-from django.test import TestCase
+import base64
+import json
+import random
+import unittest
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from zoneinfo import ZoneInfo
 
-# Create your tests here.
+from dateutil.rrule import rrule, MONTHLY
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Permission
+from django.db import connection
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import AsyncClient, SimpleTestCase, TestCase, override_settings
+from unittest import mock
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .cache import DjangoCacheBackend, LRUBackend, occurrence_cache
+from .ical import ICalendarError, component_to_event, fold, parse_datetime, parse_duration, recurrence_rule_data, unfold
+from .intervals import IntervalIndex
+from .models import Event, Occurrence, OccurrenceException, RecurrenceRule, FrequencyType, MonthWeek
+from .renderers import FastJSONRenderer
+from .rules import WEEKDAYS
+from .serializers import EventRowSerializer, EventSerializer
+from .services import RecurrenceService, expansion_pool, np
+from .sync import prune_tombstones
+from .views import stream_json_array
+
+
+def build_event(start_time, duration=timedelta(hours=1), **rule_fields):
+    event = Event(
+        title="Series",
+        start_time=start_time,
+        end_time=start_time + duration,
+        is_recurring=True
+    )
+    RecurrenceRule(event=event, **rule_fields)
+    return event
+
+
+@unittest.skipIf(np is None, "NumPy is not installed")
+class VectorizedExpansionTests(SimpleTestCase):
+    """The NumPy backend must reproduce dateutil's output exactly."""
+
+    def random_case(self, rnd):
+        start_time = datetime(2016, 1, 1, tzinfo=dt_timezone.utc) + timedelta(
+            days=rnd.randint(0, 3000),
+            hours=rnd.randint(0, 23),
+            minutes=rnd.choice([0, 15, 30]),
+            microseconds=rnd.choice([0, 0, 250])
+        )
+        frequency = rnd.choice([FrequencyType.DAILY, FrequencyType.WEEKLY, FrequencyType.MONTHLY])
+        rule_fields = {
+            'frequency': frequency,
+            'interval': rnd.randint(1, 4),
+            'count': rnd.choice([None, None, rnd.randint(1, 500)]),
+            'until': rnd.choice([None, start_time + timedelta(days=rnd.randint(0, 4000), seconds=rnd.randint(0, 86400))]),
+        }
+        if frequency == FrequencyType.WEEKLY and rnd.random() < 0.6:
+            rule_fields['weekdays'] = ','.join(str(day) for day in rnd.sample(range(7), rnd.randint(1, 5)))
+        if frequency == FrequencyType.MONTHLY and rnd.random() < 0.6:
+            rule_fields['month_day'] = rnd.randint(1, 31)
+        event = build_event(start_time, timedelta(minutes=rnd.randint(1, 600)), **rule_fields)
+
+        window_start = start_time + timedelta(days=rnd.randint(-60, 4000), hours=rnd.randint(0, 23))
+        window_end = window_start + timedelta(days=rnd.randint(0, 1500))
+        if rnd.random() < 0.1:
+            window_start = None
+        return event, window_start, window_end
+
+    def test_matches_dateutil_for_random_rules(self):
+        rnd = random.Random(20240601)
+        for _ in range(1500):
+            event, window_start, window_end = self.random_case(rnd)
+            expected = RecurrenceService.generate_occurrences(
+                event, window_start, window_end, seek=False, vectorized=False
+            )
+            with self.subTest(rule=vars(event.recurrence_rule), window=(window_start, window_end)):
+                self.assertEqual(RecurrenceService.generate_occurrences(event, window_start, window_end), expected)
+
+    def test_weekly_series_across_dst_transitions(self):
+        zone = ZoneInfo('America/New_York')
+        event = build_event(datetime(2024, 1, 1, 14, tzinfo=dt_timezone.utc), frequency=FrequencyType.WEEKLY)
+        event.tzid = 'America/New_York'
+        window_start = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+        window_end = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+        occurrences = RecurrenceService.generate_occurrences(event, window_start, window_end)
+        self.assertEqual(
+            occurrences,
+            RecurrenceService.generate_occurrences(event, window_start, window_end, seek=False, vectorized=False)
+        )
+
+        local = [occurrence['start_time'].astimezone(zone) for occurrence in occurrences]
+        self.assertEqual(len(local), 53)
+        self.assertEqual({start.time() for start in local}, {time(9)})
+        # Clocks spring forward on March 10 and fall back on November 3
+        offsets = [(start.date(), start.utcoffset()) for start in local]
+        self.assertEqual(offsets[9:11], [
+            (date(2024, 3, 4), timedelta(hours=-5)), (date(2024, 3, 11), timedelta(hours=-4))
+        ])
+        self.assertEqual(offsets[43:45], [
+            (date(2024, 10, 28), timedelta(hours=-4)), (date(2024, 11, 4), timedelta(hours=-5))
+        ])
+
+    def test_unsupported_rules_fall_back_to_dateutil(self):
+        event = build_event(
+            datetime(2024, 1, 1, 9, tzinfo=dt_timezone.utc),
+            frequency=FrequencyType.MONTHLY,
+            week_of_month=2,
+            weekday_of_month=4
+        )
+        window_start = datetime(2024, 3, 1, tzinfo=dt_timezone.utc)
+        window_end = datetime(2024, 12, 31, tzinfo=dt_timezone.utc)
+        self.assertEqual(
+            RecurrenceService.generate_occurrences(event, window_start, window_end),
+            RecurrenceService.generate_occurrences(event, window_start, window_end, seek=False, vectorized=False)
+        )
+
+
+class RelativeWeekdayTests(SimpleTestCase):
+    """
+    "n-th/last <weekday> of the month" rules must match dateutil's own
+    ordinal weekdays (e.g. FR(-1)) for every weekday and starting month,
+    across leap and non-leap years, with windows, intervals and counts.
+    """
+
+    def expected(self, start_time, week, weekday, interval, count, window_start, window_end):
+        reference = rrule(
+            MONTHLY, dtstart=start_time, interval=interval, count=count,
+            byweekday=WEEKDAYS[weekday](week), until=window_end
+        )
+        return [dt for dt in reference if dt >= window_start]
+
+    def test_matches_dateutil_ordinal_weekdays(self):
+        rnd = random.Random(20240229)
+        for year in (2023, 2024, 2099, 2100):
+            for month in range(1, 13):
+                for weekday in range(7):
+                    for week in MonthWeek.values:
+                        start_time = datetime(year, month, rnd.randint(1, 28), 9, 30, tzinfo=dt_timezone.utc)
+                        interval = rnd.choice([1, 1, 2, 5])
+                        count = rnd.choice([None, rnd.randint(1, 30)])
+                        event = build_event(
+                            start_time, frequency=FrequencyType.MONTHLY, interval=interval, count=count,
+                            week_of_month=week, weekday_of_month=weekday
+                        )
+                        window_start = start_time + timedelta(days=rnd.randint(-40, 900))
+                        window_end = window_start + timedelta(days=rnd.choice([6, 45, 800]))
+                        with self.subTest(start=start_time, week=week, weekday=weekday, interval=interval, count=count):
+                            self.assertEqual(
+                                [occurrence['start_time'] for occurrence in
+                                 RecurrenceService.generate_occurrences(event, window_start, window_end)],
+                                self.expected(start_time, week, weekday, interval, count, window_start, window_end)
+                            )
+
+    def test_monday_is_not_ignored(self):
+        event = build_event(
+            datetime(2024, 1, 1, 9, tzinfo=dt_timezone.utc),
+            frequency=FrequencyType.MONTHLY, week_of_month=MonthWeek.LAST, weekday_of_month=0
+        )
+        occurrences = RecurrenceService.generate_occurrences(
+            event, datetime(2024, 2, 1, tzinfo=dt_timezone.utc), datetime(2024, 3, 1, tzinfo=dt_timezone.utc)
+        )
+        self.assertEqual([occurrence['start_time'] for occurrence in occurrences],
+                         [datetime(2024, 2, 26, 9, tzinfo=dt_timezone.utc)])
+
+
+class WeekdayValidationTests(APITestCase):
+    """Weekly rules only accept weekdays 0 (Monday) through 6."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='weekdays@example.com', username='weekdays', password='secret'
+        )
+        self.client.force_authenticate(self.user)
+
+    def create(self, weekdays):
+        start_time = datetime(2024, 3, 4, 9, 0, tzinfo=dt_timezone.utc)
+        return self.client.post('/api/events/', {
+            'title': 'Weekly',
+            'start_time': start_time,
+            'end_time': start_time + timedelta(hours=1),
+            'is_recurring': True,
+            'recurrence_rule': {'frequency': 'WEEKLY', 'weekdays': weekdays, 'count': 4}
+        }, format='json')
+
+    def test_valid_weekdays(self):
+        response = self.create('0, 6')
+        self.assertEqual(response.status_code, 201)
+        rule = RecurrenceRule.objects.get(event_id=response.data['id'])
+        self.assertEqual(
+            (rule.weekdays, rule.weekday_mask, rule.rrule), ('0,6', 0b1000001, 'FREQ=WEEKLY;COUNT=4;BYDAY=MO,SU')
+        )
+
+    def test_invalid_weekdays(self):
+        for weekdays in ('abc', '9', '7', '-1', '0,,2', '1.5'):
+            with self.subTest(weekdays=weekdays):
+                response = self.create(weekdays)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('weekdays', response.data['recurrence_rule'])
+        self.assertFalse(Event.objects.exists())
+        with self.assertRaises(ValueError):
+            RecurrenceRule.mask_for('0,9')
+
+
+class QueryCountTests(APITestCase):
+    """List-style requests must cost a constant number of queries."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='counter@example.com', username='counter', password='secret'
+        )
+        self.client.force_authenticate(self.user)
+        self.today = timezone.now().date()
+
+    def create_events(self, count):
+        start_time = timezone.now().replace(hour=9, minute=0, second=0, microsecond=0)
+        for _ in range(count):
+            self.client.post('/api/events/', {
+                'title': 'Standup',
+                'start_time': start_time,
+                'end_time': start_time + timedelta(minutes=15),
+                'is_recurring': True,
+                'recurrence_rule': {'frequency': 'WEEKLY', 'weekdays': '0,2,4'}
+            }, format='json')
+            self.client.post('/api/events/', {
+                'title': 'Review',
+                'start_time': start_time + timedelta(days=3),
+                'end_time': start_time + timedelta(days=3, hours=1),
+                'is_recurring': False
+            }, format='json')
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            b''.join(getattr(response, 'streaming_content', []))
+        return len(context.captured_queries)
+
+    def urls(self):
+        window = f'start_date={self.today}&end_date={self.today + timedelta(days=30)}'
+        # The collection version for the ETag, events, plus one prefetch of all
+        # their exceptions, plus the index extension check for windows; plain
+        # lists read events with their rules in one query and need no exceptions
+        return {
+            '/api/events/': 2,
+            f'/api/events/?{window}': 3,
+            f'/api/events/?show_occurrences=true&{window}': 4,
+            '/api/events/?page_size=5': 2,
+            '/api/events/upcoming/': 4,
+            f'/api/events/occurrences/?{window}': 4,
+            f'/api/events/occurrences/?page_size=5&{window}': 4,
+        }
+
+    def test_query_count_does_not_grow_with_event_count(self):
+        self.create_events(2)
+        small = {url: self.count_queries(url) for url in self.urls()}
+        self.create_events(20)
+        for url, queries in small.items():
+            with self.subTest(url=url):
+                self.assertEqual(self.count_queries(url), queries)
+
+    def test_query_counts(self):
+        self.create_events(10)
+        for url, queries in self.urls().items():
+            with self.subTest(url=url), self.assertNumQueries(queries):
+                response = self.client.get(url)
+                b''.join(getattr(response, 'streaming_content', []))
+
+
+class BulkTests(APITestCase):
+    """Bulk writes apply all items or none, reporting errors per item."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='bulk@example.com', username='bulk', password='secret'
+        )
+        self.client.force_authenticate(self.user)
+        self.start_time = timezone.now().replace(second=0, microsecond=0) + timedelta(days=1)
+        response = self.client.post('/api/events/bulk/', [
+            {
+                'title': 'One-off',
+                'start_time': self.start_time,
+                'end_time': self.start_time + timedelta(hours=1),
+                'is_recurring': False
+            },
+            {
+                'title': 'Daily',
+                'start_time': self.start_time,
+                'end_time': self.start_time + timedelta(minutes=30),
+                'is_recurring': True,
+                'recurrence_rule': {'frequency': 'DAILY', 'count': 5}
+            },
+        ], format='json')
+        self.assertEqual(response.status_code, 201)
+        self.ids = [event['id'] for event in response.data]
+
+    def test_create(self):
+        self.assertEqual(list(Event.objects.order_by('pk').values_list('title', flat=True)), ['One-off', 'Daily'])
+        self.assertEqual(Occurrence.objects.filter(event_id=self.ids[1]).count(), 5)
+
+        response = self.client.post('/api/events/bulk/', [
+            {'title': 'Fine', 'start_time': self.start_time, 'end_time': self.start_time + timedelta(hours=1)},
+            {'title': 'Backwards', 'start_time': self.start_time, 'end_time': self.start_time - timedelta(hours=1)},
+        ], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data[0], {})
+        self.assertTrue(response.data[1])
+        self.assertEqual(Event.objects.count(), 2)
+
+    def test_update(self):
+        response = self.client.patch('/api/events/bulk/', [
+            {'id': self.ids[0], 'title': 'Renamed'},
+            {'id': str(self.ids[1]), 'recurrence_rule': {'frequency': 'DAILY', 'count': 3}},
+        ], format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([event['id'] for event in response.data], self.ids)
+        self.assertEqual(Event.objects.get(pk=self.ids[0]).title, 'Renamed')
+        self.assertEqual(Occurrence.objects.filter(event_id=self.ids[1]).count(), 3)
+
+    def test_update_rejects_bad_and_duplicate_ids(self):
+        response = self.client.patch('/api/events/bulk/', [
+            {'id': self.ids[0], 'title': 'First'},
+            {'id': 'abc', 'title': 'Bad'},
+            {'title': 'Missing'},
+            {'id': 999999, 'title': 'Unknown'},
+            {'id': self.ids[0], 'title': 'Again'},
+        ], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data[0], {})
+        self.assertIn('id', response.data[1])
+        self.assertIn('id', response.data[2])
+        self.assertEqual(response.data[3], {'id': ['Event not found.']})
+        self.assertEqual(response.data[4], {'id': [f'Duplicate id {self.ids[0]}.']})
+        self.assertEqual(Event.objects.get(pk=self.ids[0]).title, 'One-off')
+
+    def test_destroy(self):
+        for ids, errors in (
+            (['abc', self.ids[0]], [{'id': ['A valid integer is required.']}, {}]),
+            ([self.ids[0], 999999], [{}, {'id': ['Event not found.']}]),
+            ([self.ids[0], str(self.ids[0])], [{}, {'id': [f'Duplicate id {self.ids[0]}.']}]),
+        ):
+            with self.subTest(ids=ids):
+                response = self.client.delete('/api/events/bulk/', {'ids': ids}, format='json')
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.data, errors)
+        self.assertEqual(Event.objects.count(), 2)
+        self.assertEqual(self.client.delete('/api/events/bulk/', {'ids': []}, format='json').status_code, 400)
+
+        response = self.client.delete('/api/events/bulk/', {'ids': [str(pk) for pk in self.ids]}, format='json')
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(Event.objects.exists())
+        self.assertFalse(Occurrence.objects.exists())
+
+
+class EventRowSerializerTests(APITestCase):
+    """The fast list path renders exactly what EventSerializer and JSONRenderer would."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='lister@example.com', username='lister', password='secret'
+        )
+        self.client.force_authenticate(self.user)
+        start_time = datetime(2026, 3, 29, 0, 30, 15, 250, tzinfo=dt_timezone.utc)
+        self.client.post('/api/events/bulk/', [
+            {
+                'title': 'Caf\u00e9 \u2028 "quoted"',
+                'description': 'Line\nbreak \U0001f600',
+                'start_time': start_time,
+                'end_time': start_time + timedelta(hours=1),
+                'is_recurring': False
+            },
+            {
+                'title': 'Standup',
+                'start_time': start_time + timedelta(days=1),
+                'end_time': start_time + timedelta(days=1, minutes=15),
+                'is_recurring': True,
+                'tzid': 'Europe/Berlin',
+                'recurrence_rule': {
+                    'frequency': 'MONTHLY', 'interval': 2, 'until': start_time + timedelta(days=400),
+                    'week_of_month': -1, 'weekday_of_month': 4
+                }
+            },
+            {
+                'title': 'Gym',
+                'start_time': start_time + timedelta(days=2),
+                'end_time': start_time + timedelta(days=2, hours=1),
+                'is_recurring': True,
+                'recurrence_rule': {'frequency': 'WEEKLY', 'weekdays': '0,3', 'count': 10}
+            },
+        ], format='json')
+
+    def test_output_matches_event_serializer(self):
+        queryset = Event.objects.filter(user=self.user).select_related('recurrence_rule').order_by('start_time')
+        expected = JSONRenderer().render(EventSerializer(queryset, many=True).data)
+        rows = EventRowSerializer.to_representation(EventRowSerializer.values(queryset))
+        self.assertEqual(FastJSONRenderer().render(rows), expected)
+        self.assertEqual(self.client.get('/api/events/').content, expected)
+        page = self.client.get('/api/events/?page_size=2').json()['results']
+        self.assertEqual(JSONRenderer().render(page), JSONRenderer().render(json.loads(expected)[:2]))
+
+    def test_invalid_occurrence_window(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        for url in ('/api/events/', '/api/async/events/'):
+            for query in ('start_date=2024-13-01&end_date=2024-12-31', 'start_date=2024-01-01&end_date=tomorrow'):
+                with self.subTest(url=url, query=query):
+                    response = self.client.get(f'{url}?show_occurrences=true&{query}')
+                    self.assertEqual(response.status_code, 400)
+                    self.assertEqual(response.json(), {'error': 'Invalid date format. Use YYYY-MM-DD'})
+
+
+class FieldsetTests(APITestCase):
+    """Sparse fieldsets trim the output and the columns read alike."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='grid@example.com', username='grid', password='secret'
+        )
+        self.client.force_authenticate(self.user)
+        self.start_time = timezone.now().replace(second=0, microsecond=0) + timedelta(days=1)
+        response = self.client.post('/api/events/', {
+            'title': 'Standup',
+            'description': 'Long notes',
+            'start_time': self.start_time,
+            'end_time': self.start_time + timedelta(minutes=15),
+            'is_recurring': True,
+            'recurrence_rule': {'frequency': 'DAILY'}
+        }, format='json')
+        self.event_id = response.data['id']
+        today = timezone.now().date()
+        self.window = f'start_date={today}&end_date={today + timedelta(days=7)}'
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json(), ' '.join(query['sql'] for query in context.captured_queries)
+
+    def test_fields_trim_output_and_columns(self):
+        grid = 'fields=id,title,start_time,end_time'
+        for url in (f'/api/events/?{grid}', f'/api/events/{self.event_id}/?{grid}', f'/api/async/events/?{grid}'):
+            with self.subTest(url=url):
+                if url.startswith('/api/async/'):
+                    self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+                data, sql = self.get(url)
+                item = data if isinstance(data, dict) else data[0]
+                self.assertEqual(list(item), ['id', 'title', 'start_time', 'end_time'])
+                self.assertNotIn('"description"', sql)
+                self.assertNotIn('events_recurrencerule', sql)
+
+    def test_expand(self):
+        data, _ = self.get('/api/events/?fields=id&expand=recurrence_rule')
+        self.assertEqual(list(data[0]), ['id', 'recurrence_rule'])
+        self.assertEqual(data[0]['recurrence_rule']['frequency'], 'DAILY')
+
+        url = f'/api/events/?fields=id,title&expand=occurrences&{self.window}'
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as context:
+            data = self.client.get(url).json()
+        self.assertEqual(list(data[0]), ['id', 'title', 'occurrences'])
+        self.assertEqual(len(data[0]['occurrences']), 7)
+        # The list itself, as opposed to the occurrence index upkeep
+        listing = [query['sql'] for query in context.captured_queries if '"events_occurrence" U0' in query['sql']]
+        self.assertEqual(len(listing), 1)
+        self.assertNotIn('"description"', listing[0])
+
+        data, _ = self.get('/api/events/?expand=recurrence_rule')
+        self.assertEqual(
+            list(data[0]),
+            ['id', 'title', 'description', 'start_time', 'end_time', 'is_recurring', 'tzid',
+             'recurrence_rule', 'created_at', 'updated_at']
+        )
+
+    def test_invalid_fieldsets(self):
+        for query in ('fields=id,secret', 'expand=exceptions', 'fields=recurrence_rule', 'expand=occurrences'):
+            with self.subTest(query=query):
+                response = self.client.get(f'/api/events/?{query}')
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.data)
+
+
+class OccurrenceCacheTests(TestCase):
+    """Saving an event, its rule or its exceptions drops its cached windows."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='cache@example.com', username='cache', password='secret'
+        )
+        start_time = datetime(2024, 3, 1, 9, tzinfo=dt_timezone.utc)
+        self.event = Event.objects.create(
+            user=self.user, title='Daily', start_time=start_time, end_time=start_time + timedelta(hours=1),
+            is_recurring=True
+        )
+        RecurrenceRule.objects.create(event=self.event, frequency=FrequencyType.DAILY)
+        self.window = (start_time, start_time + timedelta(days=30))
+
+    def assertInvalidatedBy(self, change):
+        event = Event.objects.prefetch_related('exceptions').get(pk=self.event.pk)
+        expanded = RecurrenceService.generate_occurrences(event, *self.window)
+        self.assertEqual(occurrence_cache.get(event, *self.window), expanded)
+        change()
+        self.assertIsNone(occurrence_cache.get(event, *self.window))
+
+    def test_signals_invalidate_cached_windows(self):
+        for backend in (LRUBackend(), DjangoCacheBackend()):
+            with self.subTest(backend=type(backend).__name__), mock.patch.object(occurrence_cache, 'backend', backend):
+                self.assertInvalidatedBy(lambda: self.event.recurrence_rule.save())
+                self.assertInvalidatedBy(lambda: OccurrenceException.objects.create(
+                    event=self.event, original_start=self.window[0] + timedelta(days=1), is_cancelled=True
+                ))
+                self.assertInvalidatedBy(lambda: OccurrenceException.objects.filter(event=self.event).delete())
+                self.assertInvalidatedBy(lambda: Event.objects.get(pk=self.event.pk).save())
+                backend.clear()
+
+    def test_shared_cache_keys(self):
+        backend = DjangoCacheBackend()
+        key = occurrence_cache.make_key(self.event, *self.window)
+        self.assertFalse(any(character.isspace() for character in backend._entry_key(self.event.pk, key)))
+        backend.set(self.event.pk, key, ['cached'])
+        with mock.patch.object(backend.cache, 'get_many', wraps=backend.cache.get_many) as get_many:
+            self.assertEqual(backend.get(self.event.pk, key), ['cached'])
+        get_many.assert_called_once()
+        backend.invalidate(self.event.pk)
+        self.assertIsNone(backend.get(self.event.pk, key))
+        backend.clear()
+
+
+class ParallelExpansionTests(TestCase):
+    """Expanding on the process pool gives exactly the serial result."""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = get_user_model().objects.create_user(email='pool@example.com', username='pool', password='secret')
+        start_time = datetime(2024, 1, 1, 9, tzinfo=dt_timezone.utc)
+        rules = [
+            {'frequency': FrequencyType.DAILY, 'interval': 2},
+            {'frequency': FrequencyType.WEEKLY, 'weekdays': '0,2,4', 'count': 40},
+            {'frequency': FrequencyType.MONTHLY, 'week_of_month': MonthWeek.LAST, 'weekday_of_month': 4},
+            {'frequency': FrequencyType.MONTHLY, 'month_day': 31},
+            {'frequency': FrequencyType.YEARLY, 'until': datetime(2030, 1, 1, tzinfo=dt_timezone.utc)},
+        ]
+        for number, rule in enumerate(rules * 2):
+            event = Event.objects.create(
+                user=user, title=f'Series {number}', is_recurring=True,
+                start_time=start_time + timedelta(hours=number), end_time=start_time + timedelta(hours=number + 1),
+                tzid='America/New_York' if number % 2 else 'UTC'
+            )
+            RecurrenceRule.objects.create(event=event, **rule)
+        Event.objects.create(
+            user=user, title='One-off', start_time=start_time, end_time=start_time + timedelta(hours=1)
+        )
+        series = Event.objects.filter(title='Series 0').get()
+        OccurrenceException.objects.create(
+            event=series, original_start=start_time + timedelta(days=2), is_cancelled=True
+        )
+        OccurrenceException.objects.create(
+            event=series, original_start=start_time + timedelta(days=4),
+            start_time=start_time + timedelta(days=4, hours=5), title='Moved'
+        )
+
+    def setUp(self):
+        occurrence_cache.clear()
+        self.events = list(Event.objects.select_related('recurrence_rule').prefetch_related('exceptions'))
+        self.window = (datetime(2024, 1, 1, tzinfo=dt_timezone.utc), datetime(2025, 6, 30, tzinfo=dt_timezone.utc))
+
+    def serial(self):
+        occurrence_cache.clear()
+        return [RecurrenceService.generate_occurrences(event, *self.window) for event in self.events]
+
+    @override_settings(EVENT_PARALLEL_MIN_SERIES=2)
+    def test_pool_matches_serial_expansion(self):
+        with mock.patch('events.services.expansion_pool', wraps=expansion_pool) as pool:
+            pooled = RecurrenceService.generate_many(self.events, *self.window, workers=2)
+        pool.assert_called_once_with(2)
+        self.assertEqual(pooled, self.serial())
+        self.assertTrue(all(pooled))
+        # The pooled windows were cached on the way out
+        self.assertEqual(occurrence_cache.get(self.events[0], *self.window), pooled[0])
+
+    def test_small_batches_expand_serially(self):
+        for workers, minimum in ((2, len(self.events)), (1, 1), (0, 1)):
+            with self.subTest(workers=workers), override_settings(EVENT_PARALLEL_MIN_SERIES=minimum), \
+                    mock.patch('events.services.expansion_pool', side_effect=AssertionError) as pool:
+                occurrence_cache.clear()
+                expanded = RecurrenceService.generate_many(self.events, *self.window, workers=workers)
+                self.assertEqual(expanded, self.serial())
+                pool.assert_not_called()
+
+
+class ConditionalGetTests(APITestCase):
+    """Unchanged polls are answered with a 304 after the version query alone."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='poller@example.com', username='poller', password='secret'
+        )
+        self.client.force_authenticate(self.user)
+        self.start_time = timezone.now().replace(second=0, microsecond=0) + timedelta(days=1)
+        response = self.client.post('/api/events/', {
+            'title': 'Standup',
+            'start_time': self.start_time,
+            'end_time': self.start_time + timedelta(minutes=15),
+            'is_recurring': True,
+            'recurrence_rule': {'frequency': 'DAILY'}
+        }, format='json')
+        self.event_id = response.data['id']
+        today = timezone.now().date()
+        self.urls = [
+            '/api/events/',
+            '/api/events/upcoming/',
+            f'/api/events/occurrences/?start_date={today}&end_date={today + timedelta(days=30)}',
+        ]
+
+    def etag(self, url):
+        response = self.client.get(url)
+        b''.join(getattr(response, 'streaming_content', []))
+        self.assertEqual(response.status_code, 200)
+        return response['ETag']
+
+    def test_unchanged_collection_is_not_modified(self):
+        for url in self.urls:
+            etag = self.etag(url)
+            with self.subTest(url=url), self.assertNumQueries(1):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+
+    def test_writes_change_the_etag(self):
+        etags = [{url: self.etag(url) for url in self.urls}]
+        self.client.patch(f'/api/events/{self.event_id}/', {'title': 'Daily'}, format='json')
+        etags.append({url: self.etag(url) for url in self.urls})
+        self.client.post(f'/api/events/{self.event_id}/delete_occurrence/', {
+            'occurrence_date': (self.start_time + timedelta(days=1)).strftime('%Y-%m-%dT%H:%M:%S')
+        }, format='json')
+        etags.append({url: self.etag(url) for url in self.urls})
+        self.client.delete(f'/api/events/{self.event_id}/')
+        etags.append({url: self.etag(url) for url in self.urls})
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.assertEqual(len({versions[url] for versions in etags}), len(etags))
+
+
+class StreamingTests(APITestCase):
+    """Streamed arrays are valid JSON identical to the rendered list."""
+
+    def test_chunk_boundaries(self):
+        start_time = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+        items = [
+            {'start_time': start_time + timedelta(hours=number), 'title': f'\u2028 {number}'} for number in range(401)
+        ]
+        for count in (0, 1, 199, 200, 201, 400, 401):
+            for source in (items[:count], iter(items[:count])):
+                with self.subTest(count=count, source=type(source).__name__):
+                    streamed = b''.join(stream_json_array(source, chunk_size=200))
+                    self.assertEqual(streamed, JSONRenderer().render(items[:count]))
+
+    def test_streamed_feed_matches_pages(self):
+        user = get_user_model().objects.create_user(
+            email='stream@example.com', username='stream', password='secret'
+        )
+        self.client.force_authenticate(user)
+        today = timezone.now().date()
+        window = f'start_date={today}&end_date={today + timedelta(days=60)}'
+
+        response = self.client.get(f'/api/events/occurrences/?{window}')
+        self.assertTrue(response.streaming)
+        self.assertEqual(b''.join(response.streaming_content), b'[]')
+
+        start_time = timezone.now().replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+        for number in range(8):
+            self.client.post('/api/events/', {
+                'title': f'Daily {number}',
+                'start_time': start_time + timedelta(minutes=number),
+                'end_time': start_time + timedelta(minutes=number + 30),
+                'is_recurring': True,
+                'recurrence_rule': {'frequency': 'DAILY'}
+            }, format='json')
+        streamed = json.loads(b''.join(self.client.get(f'/api/events/occurrences/?{window}').streaming_content))
+        # Several chunks of 200
+        self.assertGreater(len(streamed), 400)
+        page = self.client.get(f'/api/events/occurrences/?page_size=1000&{window}').json()
+        self.assertIsNone(page['next'])
+        self.assertEqual(streamed, page['results'])
+
+
+class CursorPaginationTests(APITestCase):
+    """Walking every page visits each item once, ties on start_time included."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='pager@example.com', username='pager', password='secret'
+        )
+        self.client.force_authenticate(self.user)
+        start_time = timezone.now().replace(hour=9, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        # Four series and two one-offs all starting at the same instant
+        for number in range(6):
+            self.client.post('/api/events/', {
+                'title': f'Event {number}',
+                'start_time': start_time,
+                'end_time': start_time + timedelta(minutes=30),
+                'is_recurring': number < 4,
+                **({'recurrence_rule': {'frequency': 'DAILY', 'count': 5}} if number < 4 else {})
+            }, format='json')
+        today = timezone.now().date()
+        self.window = f'start_date={today}&end_date={today + timedelta(days=14)}'
+
+    def walk(self, url):
+        items = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            page = response.json()
+            self.assertLessEqual(len(page['results']), 4)
+            items.extend(page['results'])
+            url = page['next']
+        return items
+
+    def test_occurrence_pages(self):
+        occurrences = json.loads(b''.join(
+            self.client.get(f'/api/events/occurrences/?{self.window}').streaming_content
+        ))
+        self.assertEqual(len(occurrences), 22)
+        walked = self.walk(f'/api/events/occurrences/?page_size=4&{self.window}')
+        self.assertEqual(walked, occurrences)
+
+    def test_event_pages(self):
+        events = self.walk('/api/events/?page_size=4')
+        self.assertEqual([event['id'] for event in events], sorted(Event.objects.values_list('pk', flat=True)))
+
+    def test_tampered_cursors(self):
+        for cursor in (
+            'garbage',
+            base64.urlsafe_b64encode(b'[1, 2]').decode(),
+            base64.urlsafe_b64encode(b'["2024-01-01T09:00:00", 1]').decode(),
+            base64.urlsafe_b64encode(b'["2024-01-01T09:00:00+00:00", "1"]').decode(),
+            base64.urlsafe_b64encode(b'{"start": 1}').decode(),
+        ):
+            for url in ('/api/events/?', f'/api/events/occurrences/?{self.window}&'):
+                with self.subTest(cursor=cursor, url=url):
+                    response = self.client.get(f'{url}cursor={cursor}')
+                    self.assertEqual(response.status_code, 400)
+                    self.assertEqual(response.data, {'error': 'Invalid cursor'})
+
+
+class AsyncParityTests(APITestCase):
+    """The async read endpoints answer exactly like the sync ones, errors included."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='parity@example.com', username='parity', password='secret'
+        )
+        self.client.force_authenticate(self.user)
+        start_time = timezone.now().replace(hour=9, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        for title, offset, fields in (
+            ('Review', timedelta(days=2, hours=3), {}),
+            ('Standup', timedelta(0), {'is_recurring': True, 'recurrence_rule': {'frequency': 'DAILY'}}),
+            ('Gym', timedelta(hours=9), {
+                'is_recurring': True, 'tzid': 'Europe/Berlin',
+                'recurrence_rule': {'frequency': 'WEEKLY', 'weekdays': '0,3'}
+            }),
+        ):
+            self.client.post('/api/events/', {
+                'title': title,
+                'start_time': start_time + offset,
+                'end_time': start_time + offset + timedelta(hours=1),
+                'is_recurring': False,
+                **fields
+            }, format='json')
+        self.client.force_authenticate(None)
+        self.headers = {'Authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+        today = timezone.now().date()
+        self.window = f'start_date={today}&end_date={today + timedelta(days=14)}'
+
+    def sync_get(self, url):
+        response = self.client.get(f'/api{url}', headers=self.headers)
+        if response.streaming:
+            return response.status_code, b''.join(response.streaming_content)
+        return response.status_code, response.content
+
+    async def async_get(self, url, headers=None):
+        response = await AsyncClient().get(f'/api/async{url}', headers=self.headers if headers is None else headers)
+        if response.streaming:
+            return response.status_code, b''.join([chunk async for chunk in response.streaming_content])
+        return response.status_code, response.content
+
+    async def assertParity(self, urls):
+        for url in urls:
+            with self.subTest(url=url):
+                sync_status, sync_content = await sync_to_async(self.sync_get)(url)
+                async_status, async_content = await self.async_get(url)
+                # Pagination links point back at the endpoint that was asked
+                async_content = async_content.replace(b'/api/async/', b'/api/')
+                self.assertEqual(async_status, sync_status)
+                self.assertEqual(json.loads(async_content), json.loads(sync_content))
+                if sync_status == 200:
+                    self.assertTrue(json.loads(sync_content))
+
+    async def test_reads_match(self):
+        await self.assertParity([
+            '/events/',
+            f'/events/?{self.window}',
+            f'/events/?show_occurrences=true&{self.window}',
+            f'/events/?fields=id,title&expand=occurrences&{self.window}',
+            '/events/?page_size=2',
+            f'/events/occurrences/?{self.window}',
+            f'/events/occurrences/?page_size=4&{self.window}',
+            '/events/upcoming/?limit=5',
+            '/events/upcoming/?days=3',
+        ])
+
+    async def test_errors_match(self):
+        await self.assertParity([
+            '/events/?start_date=2024-13-01&end_date=2024-12-31',
+            '/events/?fields=secret',
+            '/events/occurrences/',
+            '/events/occurrences/?start_date=2024-01-01&end_date=soon',
+            f'/events/occurrences/?cursor=garbage&{self.window}',
+            '/events/upcoming/?limit=0',
+            '/events/upcoming/?days=many',
+        ])
+        for headers in ({}, {'Authorization': 'Bearer not-a-token'}):
+            with self.subTest(headers=headers):
+                status, _ = await self.async_get('/events/', headers)
+                self.assertEqual(status, 401)
+
+
+class OccurrenceExceptionTests(APITestCase):
+    """Cancelled, moved and added occurrences show up in expansions and the index alike."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='editor@example.com', username='editor', password='secret'
+        )
+        self.client.force_authenticate(self.user)
+        self.start_time = timezone.now().replace(hour=9, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        self.series = self.client.post('/api/events/', {
+            'title': 'Standup',
+            'start_time': self.start_time,
+            'end_time': self.start_time + timedelta(minutes=30),
+            'is_recurring': True,
+            'recurrence_rule': {'frequency': 'DAILY', 'count': 5}
+        }, format='json').data['id']
+
+    def day(self, number, hours=0):
+        return self.start_time + timedelta(days=number, hours=hours)
+
+    def expanded(self):
+        event = Event.objects.prefetch_related('exceptions').get(pk=self.series)
+        occurrences = RecurrenceService.generate_occurrences(event, self.day(-1), self.day(30))
+        indexed = Occurrence.objects.filter(event_id=self.series).order_by('start_time')
+        self.assertEqual(
+            list(indexed.values_list('start_time', 'end_time')),
+            [(occurrence['start_time'], occurrence['end_time']) for occurrence in occurrences]
+        )
+        return [(occurrence['start_time'], occurrence.get('title')) for occurrence in occurrences]
+
+    def test_cancel_move_and_add(self):
+        response = self.client.post(f'/api/events/{self.series}/delete_occurrence/', {
+            'occurrence_date': self.day(1).strftime('%Y-%m-%dT%H:%M:%S')
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.expanded(), [(self.day(number), None) for number in (0, 2, 3, 4)])
+
+        event = Event.objects.prefetch_related('exceptions').get(pk=self.series)
+        RecurrenceService.override_occurrence(event, self.day(2), start_time=self.day(2, hours=5), title='Late')
+        # An override of a time the rule never generates adds an extra occurrence
+        RecurrenceService.override_occurrence(
+            event, self.day(6, hours=1), end_time=self.day(6, hours=3), title='Extra'
+        )
+        self.assertEqual(self.expanded(), [
+            (self.day(0), None), (self.day(2, hours=5), 'Late'), (self.day(3), None), (self.day(4), None),
+            (self.day(6, hours=1), 'Extra'),
+        ])
+        self.assertEqual(Occurrence.objects.get(start_time=self.day(6, hours=1)).end_time, self.day(6, hours=3))
+
+        # Listing the window finds the series through the moved occurrence alone
+        window = {'start_date': self.day(2).date(), 'end_date': self.day(2).date()}
+        self.assertEqual([event['id'] for event in self.client.get('/api/events/', window).data], [self.series])
+
+        response = self.client.post(f'/api/events/{self.series}/delete_occurrence/', {
+            'occurrence_date': self.day(5).strftime('%Y-%m-%dT%H:%M:%S')
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class UpcomingTests(APITestCase):
+    """``upcoming`` merges every series in start order within its day and limit caps."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='upcoming@example.com', username='upcoming', password='secret'
+        )
+        self.client.force_authenticate(self.user)
+        self.now = timezone.now().replace(second=0, microsecond=0)
+        soon = self.now + timedelta(hours=1)
+        later = soon + timedelta(hours=1)
+        for title, start, recurrence_rule in [
+            ('Daily', soon, {'frequency': 'DAILY'}),
+            ('Weekly', later, {'frequency': 'WEEKLY', 'weekdays': str(later.weekday())}),
+            ('Yesterday', soon - timedelta(days=1), None),
+            ('Once', soon + timedelta(days=2, minutes=30), None),
+            ('Far', soon + timedelta(days=40), None),
+        ]:
+            self.client.post('/api/events/', {
+                'title': title,
+                'start_time': start,
+                'end_time': start + timedelta(minutes=15),
+                'is_recurring': recurrence_rule is not None,
+                'recurrence_rule': recurrence_rule
+            }, format='json')
+
+    def upcoming(self, **params):
+        response = self.client.get('/api/events/upcoming/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_ordered_across_series(self):
+        occurrences = self.upcoming(days=8)
+        starts = [occurrence['start_time'] for occurrence in occurrences]
+        self.assertEqual(starts, sorted(starts))
+        titles = [occurrence['title'] for occurrence in occurrences]
+        self.assertEqual(titles[:5], ['Daily', 'Weekly', 'Daily', 'Daily', 'Once'])
+        self.assertEqual(sorted(titles), ['Daily'] * 8 + ['Once'] + ['Weekly'] * 2)
+        self.assertIn('Far', [occurrence['title'] for occurrence in self.upcoming(days=45, limit=1000)])
+
+    def test_limit_and_window_caps(self):
+        self.assertEqual(
+            [occurrence['title'] for occurrence in self.upcoming(limit=3)], ['Daily', 'Weekly', 'Daily']
+        )
+        self.assertEqual([occurrence['title'] for occurrence in self.upcoming(days=1)], ['Daily', 'Weekly'])
+        # Both caps are accepted at their maximum, where the window rather than the limit ends the list
+        days = settings.EVENT_OCCURRENCE_HORIZON_DAYS
+        self.assertEqual(len(self.upcoming(days=days, limit=1000)), days + (days - 1) // 7 + 1 + 2)
+        self.assertEqual(len(self.upcoming(days=60)), 50)
+
+    def test_invalid_params(self):
+        for params in [
+            {'days': 0}, {'days': settings.EVENT_OCCURRENCE_HORIZON_DAYS + 1}, {'days': -3},
+            {'limit': 0}, {'limit': 1001}, {'days': 'week'}, {'limit': '10.5'},
+        ]:
+            with self.subTest(params=params):
+                response = self.client.get('/api/events/upcoming/', params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.data)
+
+
+class ChangesTests(APITestCase):
+    """Delta sync returns exactly the changes after a token, deletions included."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='syncer@example.com', username='syncer', password='secret'
+        )
+        self.client.force_authenticate(self.user)
+        self.start_time = timezone.now().replace(second=0, microsecond=0) + timedelta(days=1)
+
+    def create_event(self, title, **fields):
+        response = self.client.post('/api/events/', {
+            'title': title,
+            'start_time': self.start_time,
+            'end_time': self.start_time + timedelta(hours=1),
+            'is_recurring': False,
+            **fields
+        }, format='json')
+        return response.data['id']
+
+    def changes(self, since=None, **params):
+        if since is not None:
+            params['since'] = since
+        response = self.client.get('/api/events/changes/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_changes_since_token(self):
+        kept = self.create_event('Kept')
+        dropped = self.create_event('Dropped')
+        series = self.create_event('Series', is_recurring=True, recurrence_rule={'frequency': 'DAILY'})
+        first = self.changes()
+        self.assertEqual({event['id'] for event in first['events']}, {kept, dropped, series})
+        self.assertEqual(first['deleted'], [])
+
+        self.client.patch(f'/api/events/{kept}/', {'title': 'Renamed'}, format='json')
+        self.client.delete(f'/api/events/{dropped}/')
+        cancelled = self.start_time + timedelta(days=2)
+        self.client.post(f'/api/events/{series}/delete_occurrence/', {
+            'occurrence_date': cancelled.strftime('%Y-%m-%dT%H:%M:%S')
+        }, format='json')
+        second = self.changes(first['token'])
+        self.assertEqual([event['id'] for event in second['events']], [kept, series])
+        self.assertEqual(second['deleted'], [dropped])
+        self.assertEqual(second['cancelled_occurrences'], [{'event_id': series, 'original_start': cancelled}])
+        self.assertFalse(second['has_more'])
+
+        third = self.changes(second['token'])
+        self.assertEqual((third['events'], third['deleted'], third['token']), ([], [], second['token']))
+
+    def test_pages_follow_the_sequence(self):
+        ids = [self.create_event(f'Event {number}') for number in range(5)]
+        seen, token, has_more = [], None, True
+        while has_more:
+            page = self.changes(token, limit=2)
+            seen.extend(event['id'] for event in page['events'])
+            token, has_more = page['token'], page['has_more']
+        self.assertEqual(seen, ids)
+
+    def test_invalid_and_expired_tokens(self):
+        self.client.delete(f'/api/events/{self.create_event("Gone")}/')
+        for token in ('abc', '-1', '99'):
+            with self.subTest(token=token):
+                response = self.client.get('/api/events/changes/', {'since': token})
+                self.assertEqual(response.status_code, 400)
+        prune_tombstones(timezone.now() + timedelta(seconds=1))
+        self.assertEqual(self.client.get('/api/events/changes/', {'since': 0}).status_code, 410)
+        self.assertEqual(self.client.get('/api/events/changes/', {'since': 2}).status_code, 200)
+
+
+class IntervalIndexTests(SimpleTestCase):
+    """Overlap queries match a linear scan over half-open intervals."""
+
+    def test_matches_linear_scan(self):
+        rng = random.Random(7)
+        intervals = []
+        for item in range(300):
+            start = rng.randrange(1000)
+            intervals.append((start, start + rng.randrange(0, 50), item))
+        index = IntervalIndex(intervals)
+        self.assertEqual(len(index), sum(1 for start, end, _ in intervals if start < end))
+        for _ in range(200):
+            start = rng.randrange(-20, 1050)
+            end = start + rng.randrange(1, 80)
+            with self.subTest(start=start, end=end):
+                self.assertEqual(
+                    sorted(item for _, _, item in index.overlapping(start, end)),
+                    sorted(item for s, e, item in intervals if s < e and s < end and start < e)
+                )
+
+    def test_touching_endpoints_do_not_overlap(self):
+        index = IntervalIndex([(10, 20, 'a'), (20, 30, 'b'), (15, 15, 'empty')])
+        self.assertEqual([item for _, _, item in index.overlapping(0, 10)], [])
+        self.assertEqual([item for _, _, item in index.overlapping(30, 40)], [])
+        self.assertEqual([item for _, _, item in index.overlapping(19, 20)], ['a'])
+        self.assertEqual(sorted(item for _, _, item in index.overlapping(15, 25)), ['a', 'b'])
+        self.assertFalse(IntervalIndex())
+
+
+class ConflictTests(APITestCase):
+    """Conflicts are found occurrence by occurrence and reported with their types."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='clash@example.com', username='clash', password='secret'
+        )
+        self.client.force_authenticate(self.user)
+        self.start_time = timezone.now().replace(hour=9, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        self.daily = self.create_event(
+            'Standup', self.start_time, timedelta(minutes=30),
+            is_recurring=True, recurrence_rule={'frequency': 'DAILY', 'count': 10}
+        ).data['id']
+        self.lunch = self.create_event(
+            'Lunch', self.start_time + timedelta(days=2, hours=3), timedelta(hours=1)
+        ).data['id']
+
+    def create_event(self, title, start_time, duration, **fields):
+        return self.client.post('/api/events/', {
+            'title': title,
+            'start_time': start_time,
+            'end_time': start_time + duration,
+            'is_recurring': False,
+            **fields
+        }, format='json')
+
+    def test_iter_conflicts(self):
+        weekly = RecurrenceService.build_candidate(
+            self.user, self.start_time + timedelta(minutes=15), self.start_time + timedelta(minutes=45),
+            is_recurring=True, recurrence_rule={'frequency': 'WEEKLY'}
+        )
+        conflicts = list(RecurrenceService.iter_conflicts(weekly, end_date=self.start_time + timedelta(days=30)))
+        self.assertEqual(
+            [(conflict['event_id'], conflict['start_time']) for conflict in conflicts],
+            [(self.daily, self.start_time), (self.daily, self.start_time + timedelta(days=7))]
+        )
+
+        # Back to back with the lunch and the standup, which is excluded
+        lunch_start = self.start_time + timedelta(days=2, hours=3)
+        for start_time, end_time, expected in (
+            (lunch_start + timedelta(hours=1), lunch_start + timedelta(hours=2), []),
+            (lunch_start - timedelta(hours=1), lunch_start, []),
+            (lunch_start + timedelta(minutes=59), lunch_start + timedelta(hours=2), [self.lunch]),
+        ):
+            with self.subTest(start_time=start_time):
+                candidate = RecurrenceService.build_candidate(self.user, start_time, end_time)
+                conflicts = RecurrenceService.iter_conflicts(candidate)
+                self.assertEqual([conflict['event_id'] for conflict in conflicts], expected)
+        candidate = RecurrenceService.build_candidate(
+            self.user, self.start_time, self.start_time + timedelta(hours=1)
+        )
+        self.assertEqual(list(RecurrenceService.iter_conflicts(candidate, exclude_event_id=self.daily)), [])
+
+    def test_check_conflicts(self):
+        response = self.client.post('/api/events/check_conflicts/', {
+            'start_time': self.start_time - timedelta(minutes=30),
+            'end_time': self.start_time + timedelta(minutes=15),
+            'is_recurring': True,
+            'recurrence_rule': {'frequency': 'DAILY'},
+            'limit': 3
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([conflict['event_id'] for conflict in response.data], [self.daily] * 3)
+        self.assertEqual(response.data[1]['title'], 'Standup')
+
+        response = self.client.post('/api/events/check_conflicts/', {
+            'start_time': self.start_time, 'end_time': self.start_time - timedelta(hours=1)
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_reject_conflicts(self):
+        response = self.create_event(
+            'Clash', self.start_time + timedelta(days=2, hours=3, minutes=30), timedelta(hours=1),
+            reject_conflicts=True
+        )
+        self.assertEqual(response.status_code, 400)
+        conflicts = response.json()['conflicts']
+        self.assertEqual(len(conflicts), 1)
+        self.assertIs(type(conflicts[0]['event_id']), int)
+        self.assertEqual(conflicts[0]['event_id'], self.lunch)
+        self.assertEqual(conflicts[0]['title'], 'Lunch')
+        self.assertFalse(Event.objects.filter(title='Clash').exists())
+
+        # Moving an event over its own old slot is no conflict
+        response = self.client.patch(f'/api/events/{self.lunch}/', {
+            'start_time': self.start_time + timedelta(days=2, hours=3, minutes=30),
+            'end_time': self.start_time + timedelta(days=2, hours=4, minutes=30),
+            'reject_conflicts': True
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.create_event('Clash', self.start_time, timedelta(hours=1)).status_code, 201)
+
+
+class FreeBusyTests(APITestCase):
+    """Free/busy merges every user's blocks and only exposes others with permission."""
+
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(email='busy@example.com', username='busy', password='secret')
+        self.other = User.objects.create_user(email='other@example.com', username='other', password='secret')
+        self.day = timezone.now().date() + timedelta(days=1)
+        self.midnight = datetime.combine(self.day, datetime.min.time(), tzinfo=dt_timezone.utc)
+        for user, title, start_hour, hours in (
+            (self.user, 'Overlapping', 9, 2),
+            (self.user, 'Inside', 10, 0.5),
+            (self.user, 'Back to back', 11, 1),
+            (self.other, 'Afternoon', 14, 1),
+        ):
+            self.create_event(user, title, self.midnight + timedelta(hours=start_hour), timedelta(hours=hours))
+        self.create_event(
+            self.other, 'Standup', self.midnight - timedelta(days=1, minutes=15), timedelta(minutes=30),
+            is_recurring=True, recurrence_rule={'frequency': 'DAILY'}
+        )
+        self.client.force_authenticate(self.user)
+
+    def create_event(self, user, title, start_time, duration, **fields):
+        self.client.force_authenticate(user)
+        self.client.post('/api/events/', {
+            'title': title,
+            'start_time': start_time,
+            'end_time': start_time + duration,
+            'is_recurring': False,
+            **fields
+        }, format='json')
+
+    def free_busy(self, **params):
+        return self.client.get('/api/events/free_busy/', {'start_date': self.day, 'end_date': self.day, **params})
+
+    def at(self, hours):
+        return self.midnight + timedelta(hours=hours)
+
+    def test_merges_own_busy_blocks_by_default(self):
+        response = self.free_busy()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.data['busy']), [self.user.pk])
+        self.assertEqual(response.data['busy'][self.user.pk], [{'start': self.at(9), 'end': self.at(12)}])
+        self.assertEqual([(slot['start'], slot['end']) for slot in response.data['free']], [
+            (self.at(0), self.at(9)), (self.at(12), response.data['end'])
+        ])
+
+    def test_free_slots_across_users(self):
+        self.user.user_permissions.add(Permission.objects.get(codename='view_free_busy'))
+        response = self.free_busy(users=f'{self.user.pk},{self.other.pk}', min_duration=90)
+        self.assertEqual(response.status_code, 200)
+        # The standup started the evening before and runs past midnight
+        self.assertEqual(response.data['busy'][self.other.pk], [
+            {'start': self.at(0), 'end': self.at(0.25)},
+            {'start': self.at(14), 'end': self.at(15)},
+            {'start': self.at(23.75), 'end': response.data['end']},
+        ])
+        self.assertEqual([(slot['start'], slot['end']) for slot in response.data['free']], [
+            (self.at(0.25), self.at(9)), (self.at(12), self.at(14)), (self.at(15), self.at(23.75))
+        ])
+
+    def test_other_users_need_permission(self):
+        for users in (str(self.other.pk), f'{self.user.pk},{self.other.pk}'):
+            with self.subTest(users=users):
+                self.assertEqual(self.free_busy(users=users).status_code, 403)
+        self.assertEqual(self.free_busy(users=str(self.user.pk)).status_code, 200)
+
+    def test_invalid_requests(self):
+        for params in (
+            {'users': 'abc'},
+            {'min_duration': 'long'},
+            {'users': ','.join(str(pk) for pk in range(1, 502))},
+            {'end_date': self.day + timedelta(days=400)},
+            {'start_date': '2024-13-01'},
+        ):
+            with self.subTest(params=params):
+                self.assertEqual(self.free_busy(**params).status_code, 400)
+
+
+class ICalendarTests(APITestCase):
+    """Exported calendars import back to the same occurrences; bad input is refused cleanly."""
+
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(email='ical@example.com', username='ical', password='secret')
+        self.other = User.objects.create_user(email='copy@example.com', username='copy', password='secret')
+        self.client.force_authenticate(self.user)
+
+    def import_calendar(self, content):
+        return self.client.post('/api/events/import.ics/', {
+            'file': SimpleUploadedFile('events.ics', content.encode() if isinstance(content, str) else content)
+        }, format='multipart')
+
+    def occurrences(self, user):
+        events = Event.objects.filter(user=user).order_by('start_time').prefetch_related('exceptions')
+        return [
+            {key: value for key, value in occurrence.items() if key != 'event_id'}
+            for event in events
+            for occurrence in RecurrenceService.generate_occurrences(
+                event, datetime(2024, 1, 1, tzinfo=dt_timezone.utc), datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+            )
+        ]
+
+    def test_round_trip(self):
+        start_time = datetime(2024, 3, 1, 14, 0, tzinfo=dt_timezone.utc)
+        self.client.post('/api/events/', {
+            'title': 'Caf\u00e9 planning \u2014 ' + 'long title ' * 8,
+            'description': 'Agenda, notes; and\na second line',
+            'start_time': start_time,
+            'end_time': start_time + timedelta(hours=1),
+            'is_recurring': False
+        }, format='json')
+        series = self.client.post('/api/events/', {
+            'title': 'Standup',
+            'start_time': start_time,
+            'end_time': start_time + timedelta(minutes=15),
+            'is_recurring': True,
+            'tzid': 'America/New_York',
+            'recurrence_rule': {'frequency': 'WEEKLY', 'weekdays': '0,4', 'count': 8}
+        }, format='json').data['id']
+        self.client.post(f'/api/events/{series}/delete_occurrence/', {
+            'occurrence_date': '2024-03-04T14:00:00'
+        }, format='json')
+        moved = OccurrenceException.objects.create(
+            event_id=series,
+            original_start=datetime(2024, 3, 8, 14, 0, tzinfo=dt_timezone.utc),
+            start_time=datetime(2024, 3, 8, 16, 0, tzinfo=dt_timezone.utc),
+            title='Moved standup'
+        )
+        RecurrenceService.refresh_occurrence_index(moved.event)
+
+        content = b''.join(self.client.get('/api/events/export.ics/').streaming_content)
+        lines = content.split(b'\r\n')
+        self.assertTrue(all(len(line) <= 75 for line in lines))
+        self.assertTrue(any(line.startswith(b' ') for line in lines))
+        self.assertIn(b'DTSTART;TZID=America/New_York:20240301T090000', lines)
+        self.assertIn(b'EXDATE;TZID=America/New_York:20240304T090000', lines)
+        self.assertIn(b'RECURRENCE-ID;TZID=America/New_York:20240308T090000', lines)
+
+        self.client.force_authenticate(self.other)
+        response = self.import_calendar(content)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'created': 2, 'exceptions': 2, 'failed': 0, 'errors': []})
+        self.assertEqual(
+            list(Event.objects.filter(user=self.other).values_list('title', 'description', 'tzid')),
+            list(Event.objects.filter(user=self.user).values_list('title', 'description', 'tzid'))
+        )
+        self.assertEqual(self.occurrences(self.other), self.occurrences(self.user))
+        self.assertEqual(len(self.occurrences(self.user)), 8)
+
+    def test_midnight_until_round_trip(self):
+        start_time = datetime(2024, 1, 1, 9, 0, tzinfo=dt_timezone.utc)
+        self.client.post('/api/events/', {
+            'title': 'Sprint',
+            'start_time': start_time,
+            'end_time': start_time + timedelta(hours=1),
+            'is_recurring': True,
+            'recurrence_rule': {'frequency': 'DAILY', 'until': datetime(2024, 1, 5, tzinfo=dt_timezone.utc)}
+        }, format='json')
+        content = b''.join(self.client.get('/api/events/export.ics/').streaming_content)
+        self.assertIn(b'RRULE:FREQ=DAILY;UNTIL=20240105T000000Z', content.split(b'\r\n'))
+
+        self.client.force_authenticate(self.other)
+        self.assertEqual(self.import_calendar(content).data['created'], 1)
+        self.assertEqual(len(self.occurrences(self.user)), 4)
+        self.assertEqual(self.occurrences(self.other), self.occurrences(self.user))
+
+    def test_folding(self):
+        line = 'DESCRIPTION:' + '\u00e9' * 100
+        folded = fold(line)
+        pieces = folded.encode().split(b'\r\n')
+        self.assertTrue(all(len(piece) <= 75 for piece in pieces))
+        self.assertEqual(list(unfold(folded.splitlines(keepends=True))), [line])
+        self.assertEqual(list(unfold([b'SUMMARY:Split ac\r\n', b' ross \r\n', b'\tlines\r\n', b'UID:1\r\n'])), [
+            'SUMMARY:Split across lines', 'UID:1'
+        ])
+
+    def test_value_parsing(self):
+        self.assertEqual(
+            parse_datetime('20240310T090000', {'TZID': 'America/New_York'}),
+            datetime(2024, 3, 10, 13, 0, tzinfo=dt_timezone.utc)
+        )
+        self.assertEqual(parse_datetime('20240310T090000Z', {}), datetime(2024, 3, 10, 9, 0, tzinfo=dt_timezone.utc))
+        self.assertEqual(
+            parse_datetime('20240310', {'VALUE': 'DATE'}),
+            timezone.make_aware(datetime(2024, 3, 10))
+        )
+        self.assertEqual(parse_duration('P1W2DT3H4M5S'), timedelta(weeks=1, days=2, hours=3, minutes=4, seconds=5))
+        self.assertEqual(parse_duration('-PT15M'), -timedelta(minutes=15))
+        for value, params in (('2024-03-10', {}), ('20240310T090000', {'TZID': 'Mars/Olympus'})):
+            with self.subTest(value=value), self.assertRaises(ICalendarError):
+                parse_datetime(value, params)
+        with self.assertRaises(ICalendarError):
+            parse_duration('1 hour')
+
+        _, event, _, _ = component_to_event({
+            'DTSTART': [({'TZID': 'Europe/Berlin'}, '20240310T090000')],
+            'DURATION': [({}, 'PT90M')],
+        })
+        self.assertEqual(event['end_time'] - event['start_time'], timedelta(minutes=90))
+        self.assertEqual(event['tzid'], 'Europe/Berlin')
+        _, event, _, _ = component_to_event({'DTSTART': [({'VALUE': 'DATE'}, '20240310')]})
+        self.assertEqual(event['end_time'] - event['start_time'], timedelta(days=1))
+
+    def test_recurrence_rules(self):
+        self.assertEqual(recurrence_rule_data('FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,FR'), {
+            'frequency': 'WEEKLY', 'interval': 2, 'weekdays': '0,4'
+        })
+        self.assertEqual(recurrence_rule_data('FREQ=MONTHLY;BYDAY=-1FR;COUNT=3'), {
+            'frequency': 'MONTHLY', 'count': 3, 'week_of_month': -1, 'weekday_of_month': 4
+        })
+        self.assertEqual(
+            recurrence_rule_data('FREQ=DAILY;UNTIL=20240105')['until'],
+            timezone.make_aware(datetime(2024, 1, 5, 23, 59, 59, 999999))
+        )
+        self.assertEqual(
+            recurrence_rule_data('FREQ=DAILY;UNTIL=20240105T000000Z')['until'],
+            datetime(2024, 1, 5, tzinfo=dt_timezone.utc)
+        )
+        for value in (
+            'FREQ=HOURLY', 'FREQ=DAILY;BYHOUR=9', 'FREQ=WEEKLY;WKST=SU', 'FREQ=MONTHLY;BYDAY=MO,TU',
+            'FREQ=MONTHLY;BYMONTHDAY=1,15', 'FREQ=WEEKLY;BYDAY=2MO', 'FREQ=DAILY;BYDAY=XX',
+        ):
+            with self.subTest(value=value), self.assertRaises(ICalendarError):
+                recurrence_rule_data(value)
+
+    def test_malformed_input(self):
+        for content in ('', 'hello', b'\x00\xff\xfe', 'BEGIN:VEVENT\r\nEND:VEVENT\r\n'):
+            with self.subTest(content=content):
+                response = self.import_calendar(content)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.data)
+        self.assertEqual(self.client.post('/api/events/import.ics/', {}, format='multipart').status_code, 400)
+
+        components = [
+            'DTSTART:not-a-date',
+            'DTSTART:20240310T090000Z\r\nRRULE:FREQ=DAILY;BYHOUR=9',
+            'DTSTART:20240310T090000Z\r\nRRULE:FREQ=DAILY;INTERVAL=x',
+            'DTSTART:20240310T090000Z\r\nDURATION:P99999999999W',
+            'DTSTART:99991231T000000Z\r\nDTEND:99991231T010000Z\r\nRRULE:FREQ=YEARLY;COUNT=3',
+            'DTSTART:20240310T090000Z\r\nDTEND:20240310T080000Z',
+            'DTSTART:20240310T090000Z\r\nRECURRENCE-ID:20240311T090000Z',
+            'DTSTART:20240310T090000Z\r\nDTEND:20240310T100000Z',
+        ]
+        response = self.import_calendar('BEGIN:VCALENDAR\r\n' + ''.join(
+            f'BEGIN:VEVENT\r\nUID:{index}\r\n{component}\r\nEND:VEVENT\r\n'
+            for index, component in enumerate(components)
+        ) + 'END:VCALENDAR\r\n')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual([error['uid'] for error in response.data['errors']], [str(index) for index in range(7)])
+
+
+class OccurrenceIndexTests(APITestCase):
+    """Windows past the horizon are expanded on the fly, never indexed."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='indexer@example.com', username='indexer', password='secret'
+        )
+        self.client.force_authenticate(self.user)
+        start_time = timezone.now().replace(hour=9, minute=0, second=0, microsecond=0)
+        self.series = self.client.post('/api/events/', {
+            'title': 'Daily',
+            'start_time': start_time,
+            'end_time': start_time + timedelta(hours=1),
+            'is_recurring': True,
+            'recurrence_rule': {'frequency': 'DAILY'}
+        }, format='json').data['id']
+
+    def test_far_window_does_not_grow_the_index(self):
+        indexed = Occurrence.objects.count()
+        start_date = timezone.now().date() + timedelta(days=3 * 365)
+        response = self.client.get('/api/events/', {
+            'start_date': start_date, 'end_date': start_date + timedelta(days=7)
+        })
+        self.assertEqual([event['id'] for event in response.data], [self.series])
+        self.assertEqual(Occurrence.objects.count(), indexed)
+        self.assertLessEqual(
+            Occurrence.objects.latest('start_time').start_time, RecurrenceService.occurrence_horizon()
+        )
+
+        start_time = Event.objects.get(pk=self.series).start_time + timedelta(days=3 * 365, minutes=30)
+        response = self.client.post('/api/events/check_conflicts/', {
+            'title': 'Clash', 'start_time': start_time, 'end_time': start_time + timedelta(hours=1)
+        }, format='json')
+        self.assertEqual([conflict['event_id'] for conflict in response.data], [self.series])
+        self.assertEqual(Occurrence.objects.count(), indexed)
+
+    def test_rematerializing_skips_indexed_rows(self):
+        indexed = Occurrence.objects.count()
+        event = Event.objects.get(pk=self.series)
+        event.indexed_until = None
+        RecurrenceService.materialize_occurrences(event, RecurrenceService.occurrence_horizon())
+        self.assertEqual(Occurrence.objects.count(), indexed)
+
+
+class IndexUsageTests(TestCase):
+    """The planner must serve per-user range queries from the composite indexes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            email='planner@example.com', username='planner', password='secret'
+        )
+
+    def explain(self, queryset):
+        if connection.vendor == 'postgresql':
+            # Tiny test tables would otherwise always be sequentially scanned
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        return queryset.explain()
+
+    def test_range_query_uses_user_start_index(self):
+        now = timezone.now()
+        plan = self.explain(Event.objects.filter(
+            user=self.user, start_time__gte=now, start_time__lte=now + timedelta(days=7)
+        ))
+        self.assertIn('event_user_start_idx', plan)
+
+    def test_changes_use_user_sequence_index(self):
+        plan = self.explain(Event.objects.filter(user=self.user, sequence__gt=10).order_by('sequence'))
+        self.assertIn('event_user_sequence_idx', plan)
+
+    def test_ordered_listing_needs_no_sort(self):
+        plan = self.explain(Event.objects.filter(user=self.user).order_by('start_time'))
+        self.assertIn('event_user_start_idx', plan)
+        self.assertNotIn('Sort' if connection.vendor == 'postgresql' else 'TEMP B-TREE', plan)
+
+    @unittest.skipUnless(connection.vendor == 'postgresql', "SQLite cannot seek a bare boolean column")
+    def test_recurring_lookup_uses_user_recurring_index(self):
+        plan = self.explain(Event.objects.filter(user=self.user, is_recurring=True).order_by())
+        self.assertIn('event_user_recurring_idx', plan)
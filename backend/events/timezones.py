@@ -0,0 +1,111 @@
+"""
+Time zones of recurring events.
+
+Series are expanded in their local wall time and converted to UTC. Zone
+objects are resolved once per ``tzid``, and for vectorized expansion each zone
+is flattened into a table of UTC offset transitions per year, so converting a
+whole array of wall times is one binary search instead of a zone lookup per
+occurrence.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+UTC_ZONE = 'UTC'
+
+
+@lru_cache(maxsize=None)
+def get_zone(tzid):
+    """
+    The ``ZoneInfo`` of ``tzid``, or ``None`` for UTC, whose events need no
+    conversion. Raises ``ZoneInfoNotFoundError`` for unknown zones.
+    """
+    if not tzid or tzid == UTC_ZONE:
+        return None
+    try:
+        return ZoneInfo(tzid)
+    except ValueError:
+        # Malformed keys such as absolute paths
+        raise ZoneInfoNotFoundError(f'No time zone found with key {tzid}')
+
+
+def is_valid_zone(tzid):
+    try:
+        get_zone(tzid)
+    except ZoneInfoNotFoundError:
+        return False
+    return True
+
+
+def _offset(zone, timestamp):
+    return datetime.fromtimestamp(timestamp, zone).utcoffset()
+
+
+@lru_cache(maxsize=4096)
+def transitions(tzid, year):
+    """
+    ``(utc_timestamp, offset_before, offset_after)`` of every offset change of
+    ``tzid`` in ``year``, found by sampling each day and bisecting to the
+    second. Zones changing twice within one day are not supported.
+    """
+    zone = get_zone(tzid)
+    found = []
+    day = int(datetime(year, 1, 1, tzinfo=dt_timezone.utc).timestamp())
+    end = int(datetime(year + 1, 1, 1, tzinfo=dt_timezone.utc).timestamp())
+    previous = _offset(zone, day)
+    while day < end:
+        following = min(day + 86400, end)
+        offset = _offset(zone, following)
+        if offset != previous:
+            low, high = day, following
+            while high - low > 1:
+                middle = (low + high) // 2
+                if _offset(zone, middle) == previous:
+                    low = middle
+                else:
+                    high = middle
+            found.append((high, previous, offset))
+        previous = offset
+        day = following
+    return tuple(found)
+
+
+@lru_cache(maxsize=1024)
+def wall_table(tzid, first_year, last_year):
+    """
+    Lookup table mapping wall times to UTC offsets from ``first_year`` to
+    ``last_year``: the wall times at which each offset starts applying to
+    every wall time, and the offsets themselves, one more than boundaries.
+    """
+    zone = get_zone(tzid)
+    start = datetime(first_year, 1, 1, tzinfo=dt_timezone.utc)
+    boundaries, offsets = [], [start.astimezone(zone).utcoffset()]
+    for year in range(first_year, last_year + 1):
+        for timestamp, before, after in transitions(tzid, year):
+            # Wall times in a gap or an overlap keep the earlier offset, like
+            # fold=0 does, until no reading with that offset remains
+            moment = datetime.fromtimestamp(timestamp, dt_timezone.utc).replace(tzinfo=None)
+            boundaries.append(moment + max(before, after))
+            offsets.append(after)
+    return (
+        np.array(boundaries, dtype='datetime64[us]'),
+        np.array([offset // timedelta(microseconds=1) for offset in offsets], dtype='timedelta64[us]'),
+    )
+
+
+def to_utc(wall_times, tzid):
+    """
+    Convert a ``datetime64[us]`` array of wall times in ``tzid`` to UTC,
+    resolving ambiguous and missing wall times like ``ZoneInfo`` with fold=0.
+    """
+    if not len(wall_times):
+        return wall_times
+    years = wall_times.astype('datetime64[Y]').astype(int) + 1970
+    # One year of margin either side covers offsets carried across new year
+    boundaries, offsets = wall_table(tzid, max(1, int(years.min()) - 1), min(9998, int(years.max()) + 1))
+    return wall_times - offsets[np.searchsorted(boundaries, wall_times, side='right')]
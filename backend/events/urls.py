@@ -1,5 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from .async_views import AsyncEventListView, AsyncOccurrenceFeedView, AsyncUpcomingView
 from .views import EventViewSet
 
 router = DefaultRouter()
@@ -7,4 +8,8 @@ router.register(r'events', EventViewSet, basename='event')
 
 urlpatterns = [
     path('', include(router.urls)),
-]
\ No newline at end of file
+    # Async read path, for deployments served over ASGI
+    path('async/events/', AsyncEventListView.as_view(), name='async-event-list'),
+    path('async/events/occurrences/', AsyncOccurrenceFeedView.as_view(), name='async-event-occurrences'),
+    path('async/events/upcoming/', AsyncUpcomingView.as_view(), name='async-event-upcoming'),
+]
@@ -1,14 +1,238 @@
-from drf_yasg.utils import swagger_auto_schema
+from drf_yasg.utils import swagger_auto_schema, no_body
 from drf_yasg import openapi
 from rest_framework import viewsets, permissions, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser
+from rest_framework.exceptions import ValidationError
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
 from django.utils import timezone
 from datetime import timedelta
 from django.db import models
+from itertools import islice
+import hashlib
+from .cache import occurrence_cache
+from .ical import ICalendarError, iter_calendar, import_calendar
 from .models import Event
-from .serializers import EventSerializer
+from .serializers import (
+    EventSerializer, EventRowSerializer, ConflictCheckSerializer, ConflictSerializer, parse_event_ids
+)
+from .pagination import KeysetPagination, OccurrenceCursorPagination
+from .renderers import FastJSONRenderer
 from .services import RecurrenceService
+from .sync import (
+    ChangeTokenError, ChangeTokenExpired, acounter, changes_since, counter, delete_events, parse_token
+)
+
+
+def parse_date_window(query_params):
+    """
+    Turn the ``start_date``/``end_date`` query parameters (YYYY-MM-DD) into an
+    aware ``(start, end)`` pair covering both days in full. Missing values
+    come back as ``None``.
+    """
+    start_date = query_params.get('start_date')
+    end_date = query_params.get('end_date')
+    try:
+        start_date = timezone.datetime.strptime(start_date, '%Y-%m-%d').date() if start_date else None
+        end_date = timezone.datetime.strptime(end_date, '%Y-%m-%d').date() if end_date else None
+    except ValueError:
+        raise ValidationError({'error': 'Invalid date format. Use YYYY-MM-DD'})
+    
+    if start_date:
+        start_date = timezone.make_aware(timezone.datetime.combine(start_date, timezone.datetime.min.time()))
+    if end_date:
+        end_date = timezone.make_aware(timezone.datetime.combine(end_date, timezone.datetime.max.time()))
+    return start_date, end_date
+
+
+def stream_json_array(items, chunk_size=200):
+    """Encode an iterable as a JSON array piece by piece for a streaming response."""
+    renderer = FastJSONRenderer()
+    items = iter(items)
+    yield b'['
+    first = True
+    while True:
+        chunk = list(islice(items, chunk_size))
+        if not chunk:
+            break
+        # Each chunk is rendered as one array, whose brackets are dropped
+        body = renderer.render(chunk)[1:-1]
+        yield body if first else b',' + body
+        first = False
+    yield b']'
+
+
+def parse_upcoming_window(query_params):
+    """
+    Turn the ``days``/``limit`` query parameters of ``upcoming`` into a
+    ``(start, end, limit)`` triple starting now.
+    """
+    try:
+        days = int(query_params.get('days', 30))
+        limit = int(query_params.get('limit', 50))
+    except ValueError:
+        raise ValidationError({'error': 'days and limit must be integers'})
+    if not 1 <= days <= settings.EVENT_OCCURRENCE_HORIZON_DAYS or not 1 <= limit <= 1000:
+        raise ValidationError({
+            'error': f'days must be between 1 and {settings.EVENT_OCCURRENCE_HORIZON_DAYS}, '
+                     'limit between 1 and 1000'
+        })
+    
+    # Whole minutes keep the window (and the response) stable between polls
+    now = timezone.now().replace(second=0, microsecond=0)
+    return now, now + timedelta(days=days), limit
+
+
+def collection_version(user):
+    """
+    The user's change sequence number, which moves on every create, update
+    and delete, and when it last moved; one primary-key lookup.
+    """
+    value, _, changed_at = counter(user)
+    return {'sequence': value, 'changed_at': changed_at}
+
+
+async def acollection_version(user):
+    value, _, changed_at = await acounter(user)
+    return {'sequence': value, 'changed_at': changed_at}
+
+
+def collection_validators(user, version, *parts, as_of=None):
+    """
+    Strong ETag of a representation of the user's events, keyed by
+    ``parts``, and its Last-Modified timestamp. Representations that also
+    change with the clock pass the time they were computed for as ``as_of``.
+    """
+    payload = repr((user.pk, version['sequence'], *parts))
+    moments = [moment for moment in (version['changed_at'], as_of) if moment is not None]
+    return {
+        'etag': '"%s"' % hashlib.sha1(payload.encode()).hexdigest(),
+        'last_modified': int(max(moments).timestamp()) if moments else None,
+    }
+
+
+def set_validators(response, validators):
+    response['ETag'] = validators['etag']
+    if validators['last_modified'] is not None:
+        response['Last-Modified'] = http_date(validators['last_modified'])
+    # Per-user data: no shared caches, and clients revalidate every poll
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def occurrence_rows(events, start_date, end_date):
+    """Lazily merge the occurrences of ``events`` in the window into response rows."""
+    titles = {event.id: event.title for event in events}
+    return (
+        {
+            'event_id': occurrence['event_id'],
+            'title': occurrence.get('title', titles[occurrence['event_id']]),
+            'start_time': occurrence['start_time'],
+            'end_time': occurrence['end_time'],
+            'is_original': occurrence['is_original']
+        }
+        for occurrence in RecurrenceService.merge_occurrences(events, start_date, end_date)
+    )
+
+
+def parse_fieldset(query_params):
+    """
+    The output fields selected with ``fields`` and ``expand``, or ``None``
+    for the full representation. ``fields`` picks among the event's own
+    fields (all of them when absent) and ``expand`` adds the nested
+    ``recurrence_rule`` and ``occurrences``.
+    """
+    fields = query_params.get('fields')
+    expand = query_params.get('expand')
+    if fields is None and expand is None:
+        return None
+    own_fields = [field for field in EventRowSerializer.fields if field not in EXPANDABLE_FIELDS]
+    selected = {field.strip() for field in fields.split(',') if field.strip()} if fields is not None else set(own_fields)
+    expanded = {field.strip() for field in (expand or '').split(',') if field.strip()}
+    unknown = sorted((selected - set(own_fields)) | (expanded - set(EXPANDABLE_FIELDS)))
+    if unknown:
+        raise ValidationError({
+            'error': f"Unknown fields: {', '.join(unknown)}. fields takes {', '.join(own_fields)}; "
+                     f"expand takes {', '.join(EXPANDABLE_FIELDS)}"
+        })
+    if 'occurrences' in expanded and None in parse_date_window(query_params):
+        raise ValidationError({'error': 'expand=occurrences requires start_date and end_date'})
+    return selected | expanded
+
+
+def occurrence_window(query_params, fieldset=None):
+    """
+    The ``(start, end)`` window to expand occurrences in when they are
+    requested, with ``show_occurrences`` or with ``expand=occurrences`` in a
+    sparse fieldset, or ``None``.
+    """
+    if fieldset is None and query_params.get('show_occurrences') != 'true':
+        return None
+    if fieldset is not None and 'occurrences' not in fieldset:
+        return None
+    return parse_date_window(query_params)
+
+
+def defer_unselected(queryset, fieldset):
+    """
+    Push a sparse fieldset down into an event queryset: unselected text and
+    timestamp columns are deferred, and the rule join and the exceptions
+    prefetch are dropped unless the rule or the occurrences are expanded.
+    Columns occurrence expansion reads are never deferred, as each access
+    would cost a query per event.
+    """
+    if fieldset is None:
+        return queryset
+    if 'occurrences' not in fieldset:
+        queryset = queryset.prefetch_related(None)
+        if 'recurrence_rule' not in fieldset:
+            queryset = queryset.select_related(None)
+    deferred = [field for field in DEFERRABLE_FIELDS if field not in fieldset]
+    return queryset.defer(*deferred) if deferred else queryset
+
+
+# Nested fields only sent with ``expand``
+EXPANDABLE_FIELDS = ['recurrence_rule', 'occurrences']
+# Event columns a sparse fieldset may leave unread; expansion needs all the others
+DEFERRABLE_FIELDS = ['title', 'description', 'created_at']
+
+FIELDSET_PARAMETERS = [
+    openapi.Parameter(
+        'fields',
+        openapi.IN_QUERY,
+        description="Comma-separated event fields to return, e.g. id,title,start_time,end_time",
+        type=openapi.TYPE_STRING
+    ),
+    openapi.Parameter(
+        'expand',
+        openapi.IN_QUERY,
+        description=(
+            "Nested fields to add to a sparse fieldset: recurrence_rule, occurrences "
+            "(occurrences needs start_date and end_date)"
+        ),
+        type=openapi.TYPE_STRING
+    ),
+]
+
+PAGINATION_PARAMETERS = [
+    openapi.Parameter(
+        'page_size',
+        openapi.IN_QUERY,
+        description="Enables keyset pagination with this many items per page",
+        type=openapi.TYPE_INTEGER
+    ),
+    openapi.Parameter(
+        'cursor',
+        openapi.IN_QUERY,
+        description="Opaque cursor from the previous page's 'next' link",
+        type=openapi.TYPE_STRING
+    ),
+]
+
 
 class EventViewSet(viewsets.ModelViewSet):
     """
@@ -17,29 +241,80 @@ class EventViewSet(viewsets.ModelViewSet):
     serializer_class = EventSerializer
     permission_classes = [permissions.IsAuthenticated]
     
-    def get_queryset(self):
-        queryset = Event.objects.filter(user=self.request.user)
+    pagination_class = KeysetPagination
+    
+    def check_not_modified(self, *parts, as_of=None):
+        """
+        The validators of the requested representation and, when the client's
+        copy is current, the 304 to answer with. Costs one primary-key lookup;
+        nothing is serialized or expanded.
+        """
+        request = self.request
+        validators = collection_validators(
+            request.user,
+            collection_version(request.user),
+            request.get_full_path(),
+            request.accepted_renderer.format,
+            *parts,
+            as_of=as_of
+        )
+        return validators, get_conditional_response(request._request, **validators)
+    
+    def get_fieldset(self):
+        return parse_fieldset(self.request.query_params)
+    
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        fieldset = None
+        if self.action in ('list', 'retrieve'):
+            context['fieldset'] = fieldset = self.get_fieldset()
+        context['occurrence_window'] = occurrence_window(self.request.query_params, fieldset)
+        return context
+    
+    def get_base_queryset(self):
+        return Event.objects.filter(
+            user=self.request.user
+        ).select_related('recurrence_rule').prefetch_related('exceptions')
+    
+    def get_queryset(self, past_horizon_ids=None):
+        queryset = self.get_base_queryset()
         
-        start_date = self.request.query_params.get('start_date')
-        end_date = self.request.query_params.get('end_date')
+        start_datetime, end_datetime = parse_date_window(self.request.query_params)
         
-        if start_date and end_date:
-            start_date = timezone.datetime.strptime(start_date, '%Y-%m-%d').date()
-            end_date = timezone.datetime.strptime(end_date, '%Y-%m-%d').date()
-            
-            start_datetime = timezone.make_aware(timezone.datetime.combine(start_date, timezone.datetime.min.time()))
-            end_datetime = timezone.make_aware(timezone.datetime.combine(end_date, timezone.datetime.max.time()))
-            
-            queryset = queryset.filter(
-                models.Q(is_recurring=False, start_time__gte=start_datetime, start_time__lte=end_datetime) |
-                models.Q(is_recurring=True)
-            )
+        if start_datetime and end_datetime:
+            queryset = self.filter_window(queryset, start_datetime, end_datetime, past_horizon_ids)
+        
+        if self.action in ('list', 'retrieve'):
+            # Only read, so deferred columns never cut a later save() short
+            queryset = defer_unselected(queryset, self.get_fieldset())
         
         return queryset.order_by('start_time')
     
+    def filter_window(self, queryset, start_datetime, end_datetime, past_horizon_ids=None):
+        """
+        Keep one-off events starting in the window and series with an
+        occurrence in it, found in the occurrence index up to the horizon and
+        by expansion beyond it. Async callers run ``aprepare_window`` first
+        and pass the ids it returns, as building the queryset then does no
+        database access.
+        """
+        if past_horizon_ids is None:
+            past_horizon_ids = RecurrenceService.prepare_window(self.request.user, start_datetime, end_datetime)
+        return queryset.filter(
+            models.Q(is_recurring=False, start_time__gte=start_datetime, start_time__lte=end_datetime) |
+            models.Q(
+                models.Q(series_end__isnull=True) | models.Q(series_end__gte=start_datetime),
+                models.Q(id__in=RecurrenceService.indexed_event_ids(
+                    self.request.user, start_datetime, end_datetime
+                )) | models.Q(id__in=past_horizon_ids),
+                is_recurring=True,
+                start_time__lte=end_datetime
+            )
+        )
+    
     @swagger_auto_schema(
         operation_description="List all events",
-        manual_parameters=[
+        manual_parameters=PAGINATION_PARAMETERS + FIELDSET_PARAMETERS + [
             openapi.Parameter(
                 'start_date',
                 openapi.IN_QUERY,
@@ -55,7 +330,21 @@ class EventViewSet(viewsets.ModelViewSet):
         ]
     )
     def list(self, request, *args, **kwargs):
-        return super().list(request, *args, **kwargs)
+        validators, not_modified = self.check_not_modified()
+        if not_modified is not None:
+            return not_modified
+        if self.get_serializer_context()['occurrence_window'] is not None:
+            return set_validators(super().list(request, *args, **kwargs), validators)
+        
+        # Without occurrences, rows are rendered straight from .values(), skipping model instances
+        fieldset = self.get_fieldset()
+        queryset = EventRowSerializer.values(self.filter_queryset(self.get_queryset()), fieldset)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            response = self.get_paginated_response(EventRowSerializer.to_representation(page, fieldset))
+        else:
+            response = Response(EventRowSerializer.to_representation(queryset, fieldset))
+        return set_validators(response, validators)
     
     @swagger_auto_schema(
         operation_description="Create a new event",
@@ -70,6 +359,7 @@ class EventViewSet(viewsets.ModelViewSet):
     
     @swagger_auto_schema(
         operation_description="Retrieve an event",
+        manual_parameters=FIELDSET_PARAMETERS,
         responses={
             200: EventSerializer,
             404: "Not Found"
@@ -100,25 +390,441 @@ class EventViewSet(viewsets.ModelViewSet):
     def destroy(self, request, *args, **kwargs):
         return super().destroy(request, *args, **kwargs)
     
+    def perform_destroy(self, instance):
+        delete_events(self.request.user, Event.objects.filter(pk=instance.pk))
+    
+    def window_occurrences(self, start_date, end_date):
+        """Occurrences of the user's events in the window, merged in start-time order."""
+        events = list(self.filter_window(self.get_base_queryset(), start_date, end_date))
+        return occurrence_rows(events, start_date, end_date)
+    
     @swagger_auto_schema(
-        operation_description="List upcoming events (next 30 days)",
+        operation_description="List the next occurrences of all events, soonest first",
+        manual_parameters=[
+            openapi.Parameter(
+                'days',
+                openapi.IN_QUERY,
+                description="Size of the look-ahead window in days (default 30)",
+                type=openapi.TYPE_INTEGER
+            ),
+            openapi.Parameter(
+                'limit',
+                openapi.IN_QUERY,
+                description="Maximum number of occurrences to return (default 50)",
+                type=openapi.TYPE_INTEGER
+            ),
+        ],
         responses={
-            200: EventSerializer(many=True),
+            200: "JSON array of occurrences",
+            400: "Bad Request",
             401: "Unauthorized"
         }
     )
     @action(detail=False, methods=['get'])
     def upcoming(self, request):
-        now = timezone.now()
-        end_date = now + timedelta(days=30)
+        now, end_date, limit = parse_upcoming_window(request.query_params)
+        # The window moves with the clock, so the minute is part of the version
+        validators, not_modified = self.check_not_modified(now.isoformat(), as_of=now)
+        if not_modified is not None:
+            return not_modified
+        
+        # The merge is lazy, so only the first ``limit`` occurrences are ever expanded
+        occurrences = list(islice(self.window_occurrences(now, end_date), limit))
+        return set_validators(Response(occurrences), validators)
+    
+    @swagger_auto_schema(
+        operation_description=(
+            "Stream the occurrences of all events in a date range, ordered by start time. "
+            "Passing page_size or cursor returns cursor-paginated pages instead of a stream."
+        ),
+        manual_parameters=PAGINATION_PARAMETERS + [
+            openapi.Parameter(
+                'start_date',
+                openapi.IN_QUERY,
+                description="Start date of the window (YYYY-MM-DD)",
+                type=openapi.TYPE_STRING,
+                required=True
+            ),
+            openapi.Parameter(
+                'end_date',
+                openapi.IN_QUERY,
+                description="End date of the window (YYYY-MM-DD)",
+                type=openapi.TYPE_STRING,
+                required=True
+            ),
+        ],
+        responses={
+            200: "JSON array of occurrences",
+            400: "Bad Request"
+        }
+    )
+    @action(detail=False, methods=['get'])
+    def occurrences(self, request):
+        start_date, end_date = parse_date_window(request.query_params)
+        if not start_date or not end_date:
+            return Response(
+                {'error': 'start_date and end_date are required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        validators, not_modified = self.check_not_modified()
+        if not_modified is not None:
+            return not_modified
+        
+        paginator = OccurrenceCursorPagination()
+        paginated = paginator.is_requested(request)
+        if paginated:
+            start_date = paginator.get_window_start(request, start_date)
+        
+        occurrences = self.window_occurrences(start_date, end_date)
+        if paginated:
+            page = paginator.paginate_occurrences(occurrences, request)
+            return set_validators(paginator.get_paginated_response(page), validators)
+        return set_validators(
+            StreamingHttpResponse(stream_json_array(occurrences), content_type='application/json'),
+            validators
+        )
+    
+    @swagger_auto_schema(
+        method='post',
+        operation_description="Create many events in one transaction. Nothing is written if any item is invalid.",
+        request_body=EventSerializer(many=True),
+        responses={
+            201: EventSerializer(many=True),
+            400: "Per-item validation errors, in request order"
+        }
+    )
+    @swagger_auto_schema(
+        method='patch',
+        operation_description=(
+            "Partially update many events in one transaction. Every item must carry the id "
+            "of one of the user's events. Nothing is written if any item is invalid."
+        ),
+        request_body=EventSerializer(many=True),
+        responses={
+            200: EventSerializer(many=True),
+            400: "Per-item validation errors, in request order"
+        }
+    )
+    @swagger_auto_schema(
+        method='delete',
+        operation_description="Delete many events by id. Nothing is deleted if any id is unknown.",
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={
+                'ids': openapi.Schema(
+                    type=openapi.TYPE_ARRAY,
+                    items=openapi.Schema(type=openapi.TYPE_INTEGER)
+                )
+            }
+        ),
+        responses={
+            204: "No Content",
+            400: "Per-item errors, in request order"
+        }
+    )
+    @action(detail=False, methods=['post', 'patch', 'delete'])
+    def bulk(self, request):
+        if request.method == 'DELETE':
+            return self.bulk_destroy(request)
+        
+        instances = None
+        if request.method == 'PATCH':
+            ids, _ = parse_event_ids(
+                item.get('id') for item in request.data if isinstance(item, dict)
+            ) if isinstance(request.data, list) else ([], [])
+            instances = {event.pk: event for event in self.get_base_queryset().filter(pk__in=ids)}
         
-        events = self.get_queryset().filter(
-            models.Q(is_recurring=False, start_time__gte=now, start_time__lte=end_date) |
-            models.Q(is_recurring=True)
+        serializer = self.get_serializer(
+            instances,
+            data=request.data,
+            many=True,
+            partial=instances is not None,
+            max_length=settings.EVENT_BULK_MAX_ITEMS
         )
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(
+            serializer.data,
+            status=status.HTTP_200_OK if instances is not None else status.HTTP_201_CREATED
+        )
+    
+    def bulk_destroy(self, request):
+        ids = request.data.get('ids') if isinstance(request.data, dict) else None
+        if not isinstance(ids, list) or not ids:
+            return Response(
+                {'error': 'ids must be a non-empty list'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(ids) > settings.EVENT_BULK_MAX_ITEMS:
+            return Response(
+                {'error': f'At most {settings.EVENT_BULK_MAX_ITEMS} events can be deleted at once'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        ids, errors = parse_event_ids(ids)
+        events = self.get_base_queryset().filter(pk__in=ids)
+        found = set(events.values_list('pk', flat=True))
+        errors = [
+            error or ({} if pk in found else {'id': ["Event not found."]})
+            for pk, error in zip(ids, errors)
+        ]
+        if any(errors):
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
         
-        serializer = self.get_serializer(events, many=True)
-        return Response(serializer.data)
+        delete_events(request.user, events)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    
+    @swagger_auto_schema(
+        operation_description=(
+            "Changes to the user's events since a change token: the events created or updated, "
+            "the ids of deleted events and the cancelled occurrences. Without a token every event "
+            "is returned. Send back the returned token next time; when has_more is true, ask again "
+            "right away. A 410 means the token is too old and the client must sync from scratch."
+        ),
+        manual_parameters=[
+            openapi.Parameter(
+                'since',
+                openapi.IN_QUERY,
+                description="Change token from the previous response",
+                type=openapi.TYPE_STRING
+            ),
+            openapi.Parameter(
+                'limit',
+                openapi.IN_QUERY,
+                description=f"Most changes to return (default and maximum {settings.EVENT_SYNC_PAGE_SIZE})",
+                type=openapi.TYPE_INTEGER
+            ),
+        ],
+        responses={
+            200: "token, has_more, events, deleted and cancelled_occurrences",
+            400: "Bad Request",
+            410: "Change token expired"
+        }
+    )
+    @action(detail=False, methods=['get'])
+    def changes(self, request):
+        try:
+            since = parse_token(request.query_params.get('since'))
+            limit = int(request.query_params.get('limit', settings.EVENT_SYNC_PAGE_SIZE))
+            if limit < 1:
+                raise ValueError
+        except ChangeTokenError:
+            return Response({'error': 'Invalid change token'}, status=status.HTTP_400_BAD_REQUEST)
+        except ValueError:
+            return Response({'error': 'limit must be a positive integer'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            changes = changes_since(request.user, since, min(limit, settings.EVENT_SYNC_PAGE_SIZE))
+        except ChangeTokenError:
+            return Response({'error': 'Invalid change token'}, status=status.HTTP_400_BAD_REQUEST)
+        except ChangeTokenExpired:
+            return Response(
+                {'error': 'Change token expired; sync again without one'},
+                status=status.HTTP_410_GONE
+            )
+        return Response({
+            'token': changes['token'],
+            'has_more': changes['has_more'],
+            'events': self.get_serializer(changes['events'], many=True).data,
+            'deleted': changes['deleted'],
+            'cancelled_occurrences': [
+                {'event_id': event_id, 'original_start': original_start}
+                for event_id, original_start in changes['cancelled']
+            ],
+        })
+    
+    @swagger_auto_schema(
+        operation_description=(
+            "Export all events as an iCalendar file. Recurring events are written as "
+            "RRULEs with their cancelled and overridden occurrences, never expanded."
+        ),
+        responses={
+            200: "text/calendar stream"
+        }
+    )
+    @action(detail=False, methods=['get'], url_path='export.ics')
+    def export_ics(self, request):
+        events = self.get_base_queryset().order_by('pk').iterator(chunk_size=500)
+        response = StreamingHttpResponse(
+            iter_calendar(events, uid_domain=request.get_host()),
+            content_type='text/calendar; charset=utf-8'
+        )
+        response['Content-Disposition'] = 'attachment; filename="events.ics"'
+        return response
+    
+    @swagger_auto_schema(
+        operation_description=(
+            "Import the VEVENTs of an uploaded iCalendar file. The file is read line by line "
+            "and written in bulk batches; components that cannot be imported are skipped "
+            "and reported."
+        ),
+        request_body=no_body,
+        manual_parameters=[
+            openapi.Parameter(
+                'file',
+                openapi.IN_FORM,
+                description="The .ics file",
+                type=openapi.TYPE_FILE,
+                required=True
+            ),
+        ],
+        responses={
+            200: "Import summary with per-component errors",
+            400: "Bad Request"
+        }
+    )
+    @action(detail=False, methods=['post'], url_path='import.ics', parser_classes=[MultiPartParser])
+    def import_ics(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response(
+                {'error': 'file is required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            summary = import_calendar(upload, self.get_serializer_context())
+        except ICalendarError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(summary)
+    
+    @swagger_auto_schema(
+        operation_description=(
+            "Merged busy intervals of several users in a date range and the slots "
+            "where all of them are free. Event details are not exposed. Only users "
+            "with the events.view_free_busy permission may ask about other users."
+        ),
+        manual_parameters=[
+            openapi.Parameter(
+                'users',
+                openapi.IN_QUERY,
+                description="Comma-separated user ids (default: the current user)",
+                type=openapi.TYPE_STRING
+            ),
+            openapi.Parameter(
+                'start_date',
+                openapi.IN_QUERY,
+                description="Start date of the window (YYYY-MM-DD)",
+                type=openapi.TYPE_STRING,
+                required=True
+            ),
+            openapi.Parameter(
+                'end_date',
+                openapi.IN_QUERY,
+                description="End date of the window (YYYY-MM-DD)",
+                type=openapi.TYPE_STRING,
+                required=True
+            ),
+            openapi.Parameter(
+                'min_duration',
+                openapi.IN_QUERY,
+                description="Only report free slots at least this many minutes long",
+                type=openapi.TYPE_INTEGER
+            ),
+        ],
+        responses={
+            200: "Busy intervals per user and common free slots",
+            400: "Bad Request",
+            403: "Forbidden"
+        }
+    )
+    @action(detail=False, methods=['get'])
+    def free_busy(self, request):
+        start_date, end_date = parse_date_window(request.query_params)
+        if not start_date or not end_date:
+            return Response(
+                {'error': 'start_date and end_date are required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            user_ids = sorted({
+                int(user_id) for user_id in request.query_params.get('users', str(request.user.pk)).split(',')
+                if user_id
+            })
+            min_duration = timedelta(minutes=int(request.query_params.get('min_duration', 0)))
+        except ValueError:
+            return Response(
+                {'error': 'users must be a comma-separated list of ids and min_duration an integer'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not 1 <= len(user_ids) <= 500:
+            return Response(
+                {'error': 'Between 1 and 500 users are required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if end_date - start_date > timedelta(days=settings.EVENT_OCCURRENCE_HORIZON_DAYS):
+            return Response(
+                {'error': f'The window cannot exceed {settings.EVENT_OCCURRENCE_HORIZON_DAYS} days'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if user_ids != [request.user.pk] and not request.user.has_perm('events.view_free_busy'):
+            return Response(
+                {'error': "You do not have permission to view other users' free/busy times"},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        busy = RecurrenceService.busy_intervals(
+            user_ids, start_date, end_date, workers=settings.EVENT_EXPANSION_WORKERS
+        )
+        free = RecurrenceService.free_slots(busy.values(), start_date, end_date, min_duration)
+        return Response({
+            'start': start_date,
+            'end': end_date,
+            'busy': {
+                user_id: [{'start': start, 'end': end} for start, end in intervals]
+                for user_id, intervals in busy.items()
+            },
+            'free': [{'start': start, 'end': end} for start, end in free]
+        })
+    
+    @swagger_auto_schema(
+        operation_description=(
+            "Check a candidate event against the user's existing events and list the "
+            "occurrences it would overlap. Recurring candidates are checked occurrence "
+            "by occurrence up to the occurrence horizon unless end_date is given."
+        ),
+        request_body=ConflictCheckSerializer,
+        responses={
+            200: ConflictSerializer(many=True),
+            400: "Bad Request"
+        }
+    )
+    @action(detail=False, methods=['post'])
+    def check_conflicts(self, request):
+        serializer = ConflictCheckSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        
+        candidate = RecurrenceService.build_candidate(
+            request.user,
+            data['start_time'],
+            data['end_time'],
+            data['is_recurring'],
+            data.get('recurrence_rule'),
+            data['tzid']
+        )
+        conflicts = islice(
+            RecurrenceService.iter_conflicts(
+                candidate,
+                data.get('start_date'),
+                data.get('end_date'),
+                exclude_event_id=data.get('exclude_event')
+            ),
+            data['limit']
+        )
+        return Response(ConflictSerializer(conflicts, many=True).data)
+    
+    @swagger_auto_schema(
+        operation_description="Hit/miss/eviction counters of this worker's occurrence cache (staff only)",
+        responses={
+            200: "Cache statistics",
+            403: "Forbidden"
+        }
+    )
+    @action(detail=False, methods=['get'], permission_classes=[permissions.IsAdminUser])
+    def cache_stats(self, request):
+        return Response(occurrence_cache.stats())
     
     @swagger_auto_schema(
         operation_description="Delete a specific occurrence of a recurring event",
@@ -157,6 +863,11 @@ class EventViewSet(viewsets.ModelViewSet):
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
+            if not RecurrenceService.cancel_occurrence(event, timezone.make_aware(occurrence_date)):
+                return Response(
+                    {'error': 'Event has no occurrence at this date and time'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
             return Response({'status': 'Occurrence marked for deletion'})
         except ValueError:
             return Response(
@@ -0,0 +1,104 @@
+"""
+JWT authentication resolving users through a short-lived in-process cache.
+
+simplejwt's ``JWTAuthentication`` looks the user up by id on every request.
+``CachedJWTAuthentication`` serves recently seen users from memory instead,
+for ``AUTH_USER_CACHE_TTL`` seconds. Tokens are still decoded and verified on
+every request, so expiry and blacklisting work as before, and the active and
+password checks run against the cached row. The handlers in ``users.signals``
+evict a user as soon as it is saved or deleted; other processes notice such a
+change within the TTL.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+
+class UserCache:
+    """
+    Bounded LRU of user rows keyed by the token's user id, each entry
+    expiring ``AUTH_USER_CACHE_TTL`` seconds after it was stored. Rows rather
+    than instances are kept, so every request gets a user of its own.
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            expires, db, field_names, values = entry
+            if expires <= time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+        return get_user_model().from_db(db, field_names, values)
+
+    def set(self, user_id, user):
+        ttl = settings.AUTH_USER_CACHE_TTL
+        if ttl <= 0:
+            return
+        field_names = [field.attname for field in user._meta.concrete_fields]
+        values = tuple(getattr(user, name) for name in field_names)
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + ttl, user._state.db, field_names, values)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > settings.AUTH_USER_CACHE_MAX_ENTRIES:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+user_cache = UserCache()
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """``JWTAuthentication`` looking the user up in ``user_cache`` before the database."""
+
+    def get_user_id(self, validated_token):
+        try:
+            return validated_token[jwt_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+    def get_user(self, validated_token):
+        user_id = self.get_user_id(validated_token)
+        user = user_cache.get(user_id)
+        if user is None:
+            try:
+                user = self.user_model.objects.get(**{jwt_settings.USER_ID_FIELD: user_id})
+            except self.user_model.DoesNotExist:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found")
+            user_cache.set(user_id, user)
+        return self.check_user(user, validated_token)
+
+    def check_user(self, user, validated_token):
+        """The checks ``JWTAuthentication.get_user`` makes once the user is found."""
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if jwt_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(jwt_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+        return user
@@ -0,0 +1,15 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from .authentication import user_cache
+from .models import User
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    user_id = getattr(instance, jwt_settings.USER_ID_FIELD)
+    user_cache.invalidate(user_id)
+    # A request may cache the old row again before the change commits
+    transaction.on_commit(lambda: user_cache.invalidate(user_id))
@@ -1,3 +1,45 @@
-from django.test import TestCase
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
 
-# Create your tests here.
+from .authentication import user_cache
+from .models import User
+
+
+class CachedJWTAuthenticationTests(APITestCase):
+    """Authenticated requests resolve a recently seen user without a query."""
+
+    def setUp(self):
+        user_cache.clear()
+        self.user = User.objects.create_user(email='cached@example.com', username='cached', password='secret')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    def profile_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/auth/profile/')
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def test_user_lookup_is_cached(self):
+        self.assertEqual(self.profile_queries(), 1)
+        self.assertEqual(self.profile_queries(), 0)
+
+    @override_settings(AUTH_USER_CACHE_TTL=0)
+    def test_cache_can_be_disabled(self):
+        self.assertEqual(self.profile_queries(), 1)
+        self.assertEqual(self.profile_queries(), 1)
+
+    def test_changes_evict_the_user(self):
+        self.profile_queries()
+        self.user.username = 'renamed'
+        self.user.save()
+        self.assertEqual(self.client.get('/api/auth/profile/').data['username'], 'renamed')
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/auth/profile/').status_code, 401)
+
+        self.user.delete()
+        self.assertEqual(self.client.get('/api/auth/profile/').status_code, 401)